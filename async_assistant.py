@@ -0,0 +1,185 @@
+# async_assistant.py
+import asyncio
+
+from config import DIALOG_STREAMING, ELEVEN_TTS_STREAMING, TTS_CHUNK_MAX_CHARS
+from npl.async_dialog import AsyncDialogManager
+from npl.sentence_splitter import split_long_text
+from services.initial_test.initial_test_flow import WELCOME_TEXT
+from stt.async_recognizer import AsyncSpeechRecognizer
+from stt.audio_source import MicrophoneSource
+from tts.async_speaker import AsyncSpeaker
+from tts.eleven_tts import ElevenLabsTTS
+from tts.playback_engine import PlaybackEngine
+
+
+class AsyncVoiceAssistant:
+    """
+    Núcleo asyncio del asistente: un solo event loop coordina el reconocimiento
+    (SpeechAsyncClient), el diálogo (AsyncOpenAI) y el TTS (astream_pcm) sin un hilo por
+    llamada de red. El único hilo ajeno es el callback de sounddevice, que entra al loop por
+    el AudioBridge del reconocedor.
+
+    Cada respuesta es una tarea (reply_task): generar con el LLM, sintetizar y reproducir.
+    cancel_reply() la corta en cualquiera de esas etapas; cerrar el stream de OpenAI,
+    abortar la petición de TTS y sacar su audio del motor es parte de la misma cancelación.
+    Se usa en el barge-in y cuando el alumno vuelve a hablar antes de recibir la respuesta.
+    """
+
+    def __init__(self, language_code="en-US", streaming_replies=DIALOG_STREAMING,
+                 recognizer=None, dialog_manager=None, tts=None, player=None, source=None):
+        """
+        streaming_replies: cada oración suena mientras el modelo sigue generando las siguientes
+        recognizer, dialog_manager, tts, player, source: componentes a usar en lugar de los
+        predeterminados (micrófono, ElevenLabs y el PlaybackEngine del proceso)
+        """
+        self.language_code = language_code
+        self.streaming_replies = streaming_replies
+        self.stt = recognizer or AsyncSpeechRecognizer(language_code=language_code)
+        self.dialog_manager = dialog_manager or AsyncDialogManager()
+        self.player = player or PlaybackEngine.instance()
+        self.tts = tts or ElevenLabsTTS(streaming=ELEVEN_TTS_STREAMING, player=self.player)
+        self.speaker = AsyncSpeaker(self.tts, self.player)
+        self.source = source if source is not None else MicrophoneSource()
+        self.pending_target = None
+        self.reply_task = None
+        self.stats = {"replies": 0, "cancelled": 0}
+        self._stop = asyncio.Event()
+        if self.stt.barge_in:
+            self.stt.barge_in_callback = self.on_barge_in
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def start(self):
+        """Corre el asistente en un event loop propio hasta 'salir' o Ctrl+C."""
+        print("🔊 Iniciando asistente de voz (asyncio)...")
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            pass
+        print("🛑 Asistente detenido.")
+
+    async def run(self):
+        """Reconocimiento y diálogo como tareas del loop; vuelve al llamar stop()."""
+        self.stt.audio.bind()
+        capture = self.source.open(self.stt.sink) if self.source else None
+        recognition = asyncio.create_task(self.stt.run(), name="stt")
+        dialog = asyncio.create_task(self._process_transcripts(), name="dialog")
+        try:
+            await self._stop.wait()
+        finally:
+            self.cancel_reply()
+            self.stt.stop()
+            dialog.cancel()
+            await asyncio.gather(recognition, dialog, return_exceptions=True)
+            if capture is not None:
+                capture.stop()
+                capture.close()
+            self.report()
+
+    def stop(self):
+        """Pide detener el asistente (desde el loop)."""
+        self._stop.set()
+
+    def cancel_reply(self):
+        """Corta la respuesta en curso (LLM, TTS o audio). Devuelve True si había una."""
+        task = self.reply_task
+        if task is None or task.done():
+            return False
+        task.cancel()
+        self.stats["cancelled"] += 1
+        return True
+
+    def on_barge_in(self):
+        """
+        Callback del reconocedor cuando el alumno habla encima del asistente: cancela la
+        respuesta y deja de descartar audio del micrófono de inmediato.
+        """
+        self.stt.pause_processing = False
+        self.player.interrupt()  # silencio en el próximo bloque, sin esperar a que la tarea se cancele
+        if self.cancel_reply():
+            print("✋ Asistente interrumpido")
+
+    async def on_user_speech(self, text):
+        """Procesa un transcript final del alumno y lanza la respuesta como tarea cancelable."""
+        text = text.strip().lower()
+        if not text:
+            return
+
+        print(f"👤 Usuario: {text}")
+        if self.cancel_reply():
+            # El alumno volvió a hablar antes de oír la respuesta: se responde a lo nuevo
+            print("⏭️ Respuesta anterior cancelada")
+
+        if text in ["salir", "exit", "quit"]:
+            self.stop()
+            return
+
+        if text in ("start listening test", "empezar test inicial", "prueba inicial"):
+            print("Iniciando prueba de listening...")
+            self.reply_task = asyncio.create_task(self._say(WELCOME_TEXT, es_larga=True), name="reply")
+            return
+
+        self.reply_task = asyncio.create_task(self._reply(text), name="reply")
+
+    def report(self):
+        print(f"📊 Respuestas: {self.stats['replies']} | canceladas {self.stats['cancelled']}")
+        self.dialog_manager.context.report()
+        if self.stt.barge_in:
+            self.player.report_interruptions()
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    async def _process_transcripts(self):
+        """Tarea de diálogo: consume los finales del reconocedor, uno a uno."""
+        while True:
+            transcript = await self.stt.transcripts.get()
+            await self.on_user_speech(transcript.text)
+
+    async def _reply(self, text):
+        """Una respuesta completa; cancelarla la corta en la etapa en que esté."""
+        if self.streaming_replies:
+            sentences = asyncio.Queue()
+            speaking = asyncio.create_task(self._say_stream(sentences))
+            try:
+                reply, frase_objetivo, _ = await self.dialog_manager.generate_response_stream(
+                    text, on_sentence=sentences.put_nowait)
+                sentences.put_nowait(None)
+                await speaking
+            finally:
+                speaking.cancel()
+        else:
+            reply, frase_objetivo, es_larga = await self.dialog_manager.generate_response(text)
+            await self._say(reply, es_larga)
+        self.pending_target = frase_objetivo if frase_objetivo else None
+        self.stats["replies"] += 1
+
+    async def _say(self, text, es_larga=False):
+        """Habla una respuesta; las largas se parten en trozos que se sintetizan en paralelo."""
+        print(f"🤖 Asistente: {text}")
+        chunks = split_long_text(text, max_chars=TTS_CHUNK_MAX_CHARS) if es_larga else [text]
+        await self._speaking(self.speaker.speak_all(chunks))
+
+    async def _say_stream(self, sentences):
+        async def until_closed():
+            while (sentence := await sentences.get()) is not None:
+                # El STT se pausa con la primera oración, no mientras el modelo empieza a generar
+                self.stt.pause_processing = True
+                yield sentence
+
+        await self._speaking(self.speaker.speak_all(until_closed()), pause=False)
+
+    async def _speaking(self, playback, pause=True):
+        """Con el STT en pausa mientras suena la respuesta (salvo para detectar barge-in)."""
+        self.player.resume()
+        if pause:
+            self.stt.pause_processing = True
+        try:
+            await playback
+        finally:
+            self.stt.pause_processing = False
+
+
+if __name__ == "__main__":
+    AsyncVoiceAssistant(language_code="es-419").start()
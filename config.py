@@ -24,6 +24,48 @@ FIREBASE_CREDENTIALS_PATH = os.path.join(BASE_DIR, FIREBASE_CREDENTIALS)
 # ===========================
 AUDIO_RATE = 16000
 AUDIO_CHUNK = 1024
+PLAYBACK_RATE = 22050      # Frecuencia del stream de salida (igual al PCM que entrega ElevenLabs)
+PLAYBACK_BLOCKSIZE = 256   # Frames por callback de salida (~12 ms)
+AUDIO_RING_SECONDS = 10    # Capacidad del buffer circular de captura (si el STT se atrasa, se pierde lo más viejo)
+# Captura en el formato nativo del dispositivo (p. ej. 48 kHz estéreo) y remuestreo propio a 16 kHz mono
+AUDIO_CAPTURE_NATIVE = os.getenv("AUDIO_CAPTURE_NATIVE", "true").lower() == "true"
+AUDIO_INPUT_DEVICE = os.getenv("AUDIO_INPUT_DEVICE") or None   # Nombre o índice de sounddevice (None = predeterminado)
+RESAMPLER_BLOCK_BUDGET_MS = 0.5   # CPU máxima del remuestreo por cada 10 ms de audio (5% de un núcleo)
+
+# Bus de mensajes (utils/message_bus.py): capacidad de cada canal
+BUS_AUDIO_CAPACITY = 50          # Frames de audio (~5 s en chunks de 100 ms); descarta lo más viejo
+BUS_TRANSCRIPTS_CAPACITY = 16    # Transcripts finales pendientes de procesar
+BUS_REPLIES_CAPACITY = 4         # Respuestas pendientes de reproducir; el productor espera si se llena
+BUS_CONTROL_CAPACITY = 16
+
+# VAD (webrtcvad) antes de enviar audio a Google STT: solo se envía la voz y su relleno
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+VAD_AGGRESSIVENESS = int(os.getenv("VAD_AGGRESSIVENESS", "2"))  # 0 (permisivo) a 3 (estricto)
+VAD_FRAME_MS = 20            # 10, 20 o 30 ms (20 ms divide exacto los chunks de 100 ms)
+VAD_PRE_PADDING_MS = 300     # Audio previo a la voz que también se envía
+VAD_POST_PADDING_MS = 500    # Audio que se sigue enviando después de la última voz
+VAD_KEEPALIVE_MS = 1000      # Frame de silencio cada tanto para que Google no cierre el stream
+
+# Fin de turno local (endpointing): cerrar el turno sin esperar el is_final de Google
+ENDPOINTING_ENABLED = os.getenv("ENDPOINTING_ENABLED", "false").lower() == "true"
+ENDPOINT_SILENCE_MS = int(os.getenv("ENDPOINT_SILENCE_MS", "600"))  # Silencio final necesario
+ENDPOINT_STABLE_MS = 300          # Tiempo sin cambios en el transcript intermedio
+ENDPOINT_ENERGY_THRESHOLD = 500   # RMS bajo el cual un chunk cuenta como silencio
+
+# Cancelación de eco (stt/echo_canceller.py): resta del micrófono lo que suena por el parlante
+AEC_ENABLED = os.getenv("AEC_ENABLED", "false").lower() == "true"
+AEC_BLOCK_MS = 10            # Bloque del filtro adaptativo
+AEC_FILTER_MS = 200          # Cola de eco modelada (largo del filtro)
+AEC_STEP = 0.5               # Paso de adaptación NLMS
+AEC_BLOCK_BUDGET_MS = 1.0    # Presupuesto de CPU por bloque (10% de tiempo real en un núcleo)
+
+# Barge-in: el alumno puede interrumpir al asistente mientras habla.
+# Sin cancelación de eco conviene usarlo con auriculares (el parlante dispara la detección),
+# por eso por defecto se activa solo junto con AEC_ENABLED.
+BARGE_IN_ENABLED = os.getenv("BARGE_IN_ENABLED", str(AEC_ENABLED)).lower() == "true"
+BARGE_IN_CONFIDENCE = float(os.getenv("BARGE_IN_CONFIDENCE", "0.7"))  # Fracción de frames con voz en la ventana
+BARGE_IN_WINDOW_MS = 300     # Ventana analizada (también acota la demora en detectar)
+BARGE_IN_MIN_RMS = 800       # Energía mínima de un frame para contarlo como voz
 
 # ===========================
 # CONFIGURACIÓN DE GOOGLE APIs
@@ -31,9 +73,66 @@ AUDIO_CHUNK = 1024
 GOOGLE_STT_LANGUAGE = "es-CL"   # Idioma para Speech-to-Text
 GOOGLE_TTS_LANGUAGE = "es-CL"   # Idioma para Text-to-Speech
 GOOGLE_TTS_VOICE = "es-CL-Standard-B"  # Voz predeterminada
+GOOGLE_TTS_ENCODING = os.getenv("GOOGLE_TTS_ENCODING", "OGG_OPUS")  # LINEAR16 | OGG_OPUS | MP3
+
+# Streams de Google STT (stt/stream_manager.py). Google corta cada stream a los ~305 s:
+# se rota antes a un stream ya abierto, reenviando el audio más reciente en la costura.
+STT_STREAM_MAX_SECONDS = int(os.getenv("STT_STREAM_MAX_SECONDS", "280"))  # Rotar en el próximo silencio
+STT_STREAM_HARD_SECONDS = 295      # Rotar aunque el alumno esté hablando
+STT_STREAM_REPLAY_MS = 300         # Audio reciente que se reenvía al stream nuevo
+STT_STREAM_PREWARM = os.getenv("STT_STREAM_PREWARM", "true").lower() == "true"  # Tener siempre un stream abierto de reserva
+STT_RECONNECT_BASE_MS = 250        # Espera antes del primer reintento (luego se duplica)
+STT_RECONNECT_MAX_MS = 8000        # Espera máxima entre reintentos
+
+# Audio comprimido hacia Google STT (stt/audio_encoder.py, necesita ffmpeg para FLAC y OGG_OPUS).
+# LINEAR16 son 256 kbit/s por alumno; FLAC es sin pérdida (~50-60%) y OGG_OPUS ~24 kbit/s.
+STT_ENCODING = os.getenv("STT_ENCODING", "LINEAR16").upper()  # LINEAR16 | FLAC | OGG_OPUS
+STT_OPUS_BITRATE = int(os.getenv("STT_OPUS_BITRATE", "24000"))  # bit/s de Opus
+
+# ===========================
+# CONFIGURACIÓN DE TTS (ElevenLabs)
+# ===========================
+ELEVEN_TTS_STREAMING = os.getenv("ELEVEN_TTS_STREAMING", "false").lower() == "true"  # Reproducir mientras llega el audio
+ELEVEN_COST_PER_1K_CHARS = float(os.getenv("ELEVEN_COST_PER_1K_CHARS", "0.30"))  # USD estimado (prewarm)
+
+# Hedging ElevenLabs -> Google: si no llega audio en el deadline se lanza el secundario
+TTS_HEDGING = os.getenv("TTS_HEDGING", "false").lower() == "true"
+TTS_HEDGE_DEADLINE_MS = float(os.getenv("TTS_HEDGE_DEADLINE_MS", "800"))  # Inicial, luego se adapta al p95
+TTS_HEDGE_MIN_DEADLINE_MS = 250
+TTS_HEDGE_MAX_DEADLINE_MS = 2000
+
+# Respuestas largas (es_larga): se parten en trozos que se sintetizan en paralelo
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "180"))  # Largo máximo de cada trozo
+TTS_CHUNK_WORKERS = int(os.getenv("TTS_CHUNK_WORKERS", "3"))        # Síntesis concurrentes por respuesta
+
+# ===========================
+# CACHÉ DE AUDIO (TTS)
+# ===========================
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "500"))      # Presupuesto en disco (LRU)
+TTS_CACHE_HOT_ITEMS = int(os.getenv("TTS_CACHE_HOT_ITEMS", "32"))  # Clips más reproducidos en memoria
 
 # ===========================
 # CONFIGURACIÓN DE IA (GPT)
 # ===========================
 OPENAI_MODEL = "gpt-4o-mini"
 OPENAI_TEMPERATURE = 0.7
+DIALOG_STREAMING = os.getenv("DIALOG_STREAMING", "false").lower() == "true"  # Hablar cada oración apenas se genera
+# Contexto acotado (npl/dialog_context.py): turnos recientes completos y un resumen de los anteriores
+DIALOG_KEEP_TURNS = int(os.getenv("DIALOG_KEEP_TURNS", "6"))                   # Turnos que van tal cual
+DIALOG_SUMMARY_EVERY = int(os.getenv("DIALOG_SUMMARY_EVERY", "4"))             # Turnos viejos por cada resumen nuevo
+DIALOG_SUMMARY_MAX_TOKENS = int(os.getenv("DIALOG_SUMMARY_MAX_TOKENS", "200"))  # Largo máximo del resumen
+DIALOG_MAX_PROMPT_TOKENS = int(os.getenv("DIALOG_MAX_PROMPT_TOKENS", "3000"))   # Tope duro por petición
+# Núcleo asyncio (async_assistant.py): clientes async de OpenAI, Google STT y TTS en un solo event loop
+ASSISTANT_ASYNC = os.getenv("ASSISTANT_ASYNC", "false").lower() == "true"
+
+# Servidor multi-sesión (services/session_server.py): alumnos remotos por WebSocket
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8765"))
+SERVER_MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "200"))  # Sesiones simultáneas por proceso
+SERVER_AUDIO_BLOCK_MS = 100     # Audio de respuesta enviado en bloques de 100 ms, al ritmo de reproducción
+
+# Generación especulativa a partir de transcripts intermedios estables
+SPECULATIVE_DIALOG = os.getenv("SPECULATIVE_DIALOG", "false").lower() == "true"
+SPECULATION_STABLE_MS = int(os.getenv("SPECULATION_STABLE_MS", "250"))  # Intermedio sin cambios antes de especular
+SPECULATION_PREPARE_TTS = os.getenv("SPECULATION_PREPARE_TTS", "false").lower() == "true"  # Sintetizar también el audio
@@ -63,8 +63,8 @@ class FirebaseDB:
             print(f"❌ Error al obtener colección: {e}")
             return []
         
-    def get_listening_phrases(self, n):
-        """Devuelve n frases aleatorias del conjunto global de listening."""
+    def get_all_listening_phrases(self):
+        """Devuelve todas las frases del conjunto global de listening."""
         # Obtiene todos los documentos de listening_phrases
         docs = self.db.collection("global_listening_phrases").stream()
         all_phrases = []
@@ -72,6 +72,11 @@ class FirebaseDB:
             data = doc.to_dict()
             phrases = data.get("phrases", [])
             all_phrases.extend(phrases)
+        return all_phrases
+
+    def get_listening_phrases(self, n):
+        """Devuelve n frases aleatorias del conjunto global de listening."""
+        all_phrases = self.get_all_listening_phrases()
 
         if len(all_phrases) < n:
             raise ValueError(f"No hay suficientes frases en Firestore ({len(all_phrases)})")
@@ -8,6 +8,8 @@ import sys
 
 from utils.audio_utils import AudioUtils
 from voice_assistant import VoiceAssistant
+from async_assistant import AsyncVoiceAssistant
+from config import ASSISTANT_ASYNC
 from db.firebase_db import FirebaseDB
 from db.firebase_service import FirebaseService
 from npl.gpt_client import GPTClient
@@ -27,10 +29,13 @@ audio_utils = AudioUtils(rate=RATE, chunk=CHUNK)
 firestore = FirebaseDB()
 gpt = GPTClient()
 
-assistant = VoiceAssistant(
-    language_code="es-419",
-    firestore=firestore
-)
+if ASSISTANT_ASYNC:
+    assistant = AsyncVoiceAssistant(language_code="es-419")
+else:
+    assistant = VoiceAssistant(
+        language_code="es-419",
+        firestore=firestore
+    )
 
 # =========================
 # MANEJO DE CTRL+C
@@ -0,0 +1,162 @@
+# npl/async_dialog.py
+import asyncio
+import inspect
+
+import openai
+
+from config import DIALOG_SUMMARY_MAX_TOKENS, OPENAI_API_KEY
+from npl.dialog_manager import DialogManager, estimate_tokens
+from npl.sentence_splitter import SentenceSplitter
+from npl.reply_stream_parser import ReplyStreamParser
+
+
+class AsyncDialogManager(DialogManager):
+    """
+    DialogManager para el núcleo asyncio: mismas respuestas, prompts y contexto, pero con
+    openai.AsyncOpenAI, así que esperar al modelo no ocupa un hilo.
+    La cancelación es parte del contrato: si se cancela la tarea a mitad de una respuesta,
+    se cierra el stream HTTP (OpenAI deja de generar y de cobrar tokens) y el turno se
+    deshace, de modo que el contexto queda como antes de la pregunta.
+    """
+
+    def __init__(self, model="gpt-4o-mini", client=None):
+        """client: AsyncOpenAI compartido (p. ej. entre las sesiones de un servidor)"""
+        super().__init__(model)
+        self.client = client or openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+        self._summary_task = None
+
+    async def generate_response(self, user_input):
+        """Versión async de DialogManager.generate_response (mismo valor de retorno)."""
+        print("🤖 Generando respuesta...")
+
+        system_prompt = self._build_system_prompt(user_input)
+        message = {"role": "user", "content": user_input}
+        self.context.append(message)
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self.context.request(system_prompt),
+                temperature=0.7
+            )
+        except BaseException:
+            self._rollback(message)
+            raise
+
+        raw_reply = response.choices[0].message.content.strip()
+        reply, frase_objetivo = self._parse_reply(raw_reply)
+        return self._finish_turn(reply, frase_objetivo)
+
+    async def generate_response_stream(self, user_input, on_sentence):
+        """
+        Versión async de DialogManager.generate_response_stream. on_sentence puede ser una
+        función o una corrutina; se llama con cada oración del 'reply' apenas se completa.
+        """
+        print("🤖 Generando respuesta (streaming)...")
+
+        system_prompt = self._build_system_prompt(user_input)
+        message = {"role": "user", "content": user_input}
+        self.context.append(message)
+
+        stream = None
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self.context.request(system_prompt),
+                temperature=0.7,
+                stream=True
+            )
+
+            splitter = SentenceSplitter()
+            parser = ReplyStreamParser()
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                for sentence in splitter.feed(parser.feed(delta)):
+                    await _call(on_sentence, sentence)
+
+            reply, frase_objetivo = parser.finish()
+            # Lo que quedó sin emitir (normalmente la última oración)
+            emitted = parser.reply.strip()
+            if len(reply) > len(emitted) and reply.startswith(emitted):
+                splitter.feed(reply[len(emitted):])
+            for sentence in splitter.flush():
+                await _call(on_sentence, sentence)
+        except BaseException:
+            self._rollback(message)
+            raise
+        finally:
+            if stream is not None:
+                await stream.close()
+
+        return self._finish_turn(reply, frase_objetivo)
+
+    async def draft_response(self, user_input):
+        """
+        Versión async de DialogManager.draft_response: no toca el contexto y se cancela
+        cancelando la tarea (en vez de con un cancel_event). Devuelve (texto crudo, tokens).
+        """
+        messages = self.context.request(self._build_system_prompt(user_input),
+                                        pending={"role": "user", "content": user_input})
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0.7,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        parts = []
+        usage = None
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = {"prompt": chunk.usage.prompt_tokens, "completion": chunk.usage.completion_tokens}
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+        finally:
+            await stream.close()
+
+        if usage is None:
+            usage = {"prompt": sum(estimate_tokens(m["content"]) for m in messages),
+                     "completion": estimate_tokens("".join(parts))}
+        return "".join(parts).strip(), usage
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _rollback(self, message):
+        """Quita del contexto el mensaje del usuario de un turno cancelado o fallido."""
+        # Por identidad: el alumno pudo haber dicho lo mismo en un turno anterior
+        if self.context.remove(message):
+            print("↩️ Respuesta cancelada: el turno no queda en el contexto")
+
+    def _schedule_summary(self):
+        """Como en DialogManager, pero el resumen es una tarea del loop con el cliente async."""
+        fold = self.context.begin_fold()
+        if fold is not None:
+            self._summary_task = asyncio.create_task(self._summarize(*fold), name="dialog-summary")
+
+    async def _summarize(self, summary, messages):
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self._summary_request(summary, messages),
+                temperature=0.3,
+                max_tokens=DIALOG_SUMMARY_MAX_TOKENS
+            )
+            self.context.finish_fold(response.choices[0].message.content)
+        except asyncio.CancelledError:
+            self.context.abort_fold(failed=False)
+            raise
+        except Exception as e:
+            print(f"⚠️ No se pudo resumir el contexto: {e}")
+            self.context.abort_fold()
+
+
+async def _call(callback, *args):
+    result = callback(*args)
+    if inspect.isawaitable(result):
+        await result
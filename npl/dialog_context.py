@@ -0,0 +1,169 @@
+# npl/dialog_context.py
+import threading
+import time
+
+from config import DIALOG_KEEP_TURNS, DIALOG_MAX_PROMPT_TOKENS, DIALOG_SUMMARY_EVERY
+from utils.latency_tracker import LatencyTracker
+
+MESSAGE_OVERHEAD_TOKENS = 4   # rol y separadores que agrega el formato de chat por mensaje
+
+
+def estimate_tokens(text):
+    """Estimación rápida de tokens (~4 caracteres por token) cuando la API no informa el uso."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def message_tokens(message):
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class DialogContext:
+    """
+    Historial del diálogo con tamaño acotado, en lugar de una lista que crece para siempre:
+    - Los últimos keep_turns turnos (usuario + asistente) van tal cual.
+    - Los anteriores se pliegan en un resumen que se actualiza fuera del turno (un hilo o una
+      tarea del loop, ver DialogManager._schedule_summary) cada summary_every turnos viejos;
+      mientras tanto siguen yendo tal cual.
+    - request() arma los mensajes de una petición sin pasar de max_tokens: si no entran, se
+      omiten los mensajes más viejos (nunca el del usuario en curso).
+    Cada mensaje guarda su estimación de tokens al entrar, así armar la petición no recorre textos.
+    Los mensajes son los dicts {"role", "content"} de siempre: remove() los busca por identidad.
+    """
+
+    def __init__(self, keep_turns=DIALOG_KEEP_TURNS, max_tokens=DIALOG_MAX_PROMPT_TOKENS,
+                 summary_every=DIALOG_SUMMARY_EVERY):
+        """
+        keep_turns: turnos recientes que siempre van completos
+        max_tokens: presupuesto duro de cada petición (prompt de sistema y resumen incluidos)
+        summary_every: turnos viejos acumulados antes de pedir un resumen nuevo
+        """
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+        self.summary_every = summary_every
+        self.summary = ""
+        self.summary_tokens = 0
+        self.stats = {"requests": 0, "trimmed": 0, "summaries": 0, "summary_failures": 0, "folded": 0}
+        self.prompt_tokens = LatencyTracker()      # tokens estimados por petición (misma ventana con percentiles)
+        self.summary_latency = LatencyTracker()    # ms por resumen
+        self.last_prompt_tokens = 0
+        self._recent = []    # [(mensaje, tokens)] en orden
+        self._folding = []   # mensajes de un resumen en curso: siguen yendo tal cual hasta que llegue
+        self._summarizing = False
+        self._started_at = None
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def append(self, message):
+        with self._lock:
+            self._recent.append((message, message_tokens(message)))
+
+    def remove(self, message):
+        """Quita un mensaje por identidad (turno cancelado o fallido). Devuelve True si estaba."""
+        with self._lock:
+            for entries in (self._recent, self._folding):
+                for i in range(len(entries) - 1, -1, -1):
+                    if entries[i][0] is message:
+                        del entries[i]
+                        return True
+        return False
+
+    def request(self, system_prompt, pending=None):
+        """
+        Mensajes para chat.completions: sistema, resumen, historial y pending (un mensaje del
+        usuario que no está en el contexto, como en draft_response), dentro de max_tokens.
+        """
+        system = {"role": "system", "content": system_prompt}
+        with self._lock:
+            history = self._folding + self._recent
+            if pending is not None:
+                history = history + [(pending, message_tokens(pending))]
+            head = [system]
+            budget = self.max_tokens - message_tokens(system)
+            if self.summary:
+                head.append({"role": "system", "content": f"Resumen de la conversación anterior: {self.summary}"})
+                budget -= self.summary_tokens + MESSAGE_OVERHEAD_TOKENS
+
+            # De atrás hacia adelante: lo más reciente tiene prioridad; el último mensaje siempre va
+            kept, used = [], 0
+            for i in range(len(history) - 1, -1, -1):
+                message, tokens = history[i]
+                if kept and used + tokens > budget:
+                    break
+                kept.append(message)
+                used += tokens
+            trimmed = len(history) - len(kept)
+            self.stats["requests"] += 1
+            self.stats["trimmed"] += trimmed
+
+        self.last_prompt_tokens = self.max_tokens - budget + used
+        self.prompt_tokens.add(self.last_prompt_tokens)
+        return head + kept[::-1]
+
+    def begin_fold(self):
+        """
+        Si hay summary_every turnos fuera de los keep_turns recientes y no hay un resumen en
+        curso, los separa y devuelve (resumen actual, mensajes a plegar); si no, None.
+        """
+        with self._lock:
+            if self._summarizing:
+                return None
+            # Solo turnos completos: el mensaje pendiente del usuario nunca se pliega
+            excess = len(self._recent) - self.keep_turns * 2
+            if excess < self.summary_every * 2:
+                return None
+            excess -= excess % 2
+            self._folding = self._recent[:excess]
+            del self._recent[:excess]
+            self._summarizing = True
+            self._started_at = time.perf_counter()
+            return self.summary, [message for message, _ in self._folding]
+
+    def finish_fold(self, summary):
+        """Reemplaza el resumen por el nuevo (que ya incluye los mensajes plegados)."""
+        with self._lock:
+            self.summary = summary.strip()
+            self.summary_tokens = estimate_tokens(self.summary)
+            self.stats["summaries"] += 1
+            self.stats["folded"] += len(self._folding)
+            self._folding = []
+            self._summarizing = False
+        self.summary_latency.add((time.perf_counter() - self._started_at) * 1000)
+
+    def abort_fold(self, failed=True):
+        """El resumen falló (o se canceló): los mensajes vuelven al historial y se reintenta con el próximo turno."""
+        with self._lock:
+            self._recent = self._folding + self._recent
+            self._folding = []
+            self._summarizing = False
+            if failed:
+                self.stats["summary_failures"] += 1
+
+    def tokens(self):
+        """Tokens estimados que ocupa el contexto completo (sin el prompt de sistema)."""
+        with self._lock:
+            return self.summary_tokens + sum(tokens for _, tokens in self._folding + self._recent)
+
+    def report(self):
+        summary = self.prompt_tokens.summary()
+        if not summary["count"]:
+            return
+        summary_ms = self.summary_latency.summary()
+        summary_text = f", p50 {summary_ms['p50']:.0f} ms" if summary_ms["count"] else ""
+        print(f"📊 Contexto: {self.stats['requests']} peticiones, prompt p50 {summary['p50']:.0f} / "
+              f"p95 {summary['p95']:.0f} tokens (tope {self.max_tokens}) | {self.stats['summaries']} resúmenes"
+              f"{summary_text}, {self.stats['folded']} mensajes plegados, {self.stats['trimmed']} omitidos "
+              f"por presupuesto")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._folding) + len(self._recent)
+
+    def __iter__(self):
+        with self._lock:
+            messages = [message for message, _ in self._folding + self._recent]
+        return iter(messages)
+
+    def __getitem__(self, index):
+        return list(self)[index]
@@ -1,7 +1,18 @@
-import json
+import threading
+
 import openai
-import re
-from config import OPENAI_API_KEY
+from config import OPENAI_API_KEY, DIALOG_SUMMARY_MAX_TOKENS
+from npl.dialog_context import DialogContext, estimate_tokens
+from npl.sentence_splitter import SentenceSplitter
+from npl.reply_stream_parser import ReplyStreamParser, parse_reply
+
+
+SUMMARY_PROMPT = (
+    "Resume la conversación entre un alumno y su tutor de inglés para que el tutor pueda seguirla "
+    "sin el historial: nivel del alumno, temas tratados, errores frecuentes y frases objetivo. "
+    "Integra el resumen anterior si lo hay. Máximo {max_words} palabras, en español, sin introducción."
+)
+
 
 class DialogManager:
     def __init__(self, model="gpt-4o-mini"):
@@ -11,20 +22,15 @@ class DialogManager:
         """
         openai.api_key = OPENAI_API_KEY
         self.model = model
-        self.context = []
-
-    def generate_response(self, user_input):
-        """
-        Genera una respuesta en función del input del usuario manteniendo el contexto.
-        Devuelve: respuesta del asistente, frase objetivo, y si la respuesta es larga.
-        """
-        print("🤖 Generando respuesta...")
+        self.context = DialogContext()
 
+    def _build_system_prompt(self, user_input):
+        """Elige el prompt de sistema según si el usuario pide una explicación extendida."""
         keywords_expansion = ["explica", "explícame", "detallado", "dame un ejemplo", "más detalle", "más largo"]
         breve = not any(kw in user_input.lower() for kw in keywords_expansion)
 
         # Sistema prompt para GPT
-        system_prompt = (
+        return (
             "Eres un asistente de inglés y español. Da respuestas claras y breves (máx. 40 palabras). "
             "Usa vocabulario adecuado al nivel A2-B1. "
             "Genera una frase objetivo en inglés solo si la frase del usuario es educativa, práctica o un ejemplo útil. "
@@ -37,39 +43,153 @@ class DialogManager:
             "Responde siempre en JSON con 'reply' y opcional 'frase_objetivo'."
         )
 
+    def _parse_reply(self, raw_reply):
+        """Extrae reply y frase objetivo del texto completo devuelto por el modelo."""
+        return parse_reply(raw_reply)
+
+    def _finish_turn(self, reply, frase_objetivo):
+        """Registra la respuesta en el contexto y calcula si es larga."""
+        # Chequeo de longitud
+        word_count = len(reply.split())
+        es_larga = word_count > 50
+
+        self.context.append({"role": "assistant", "content": reply})
+        self._schedule_summary()
+
+        print(f"🤖 Asistente: {reply} (palabras: {word_count})")
+        print(f"🎯 Frase objetivo: {frase_objetivo}")
+
+        return reply, frase_objetivo, es_larga
+
+    def _schedule_summary(self):
+        """Si hay turnos viejos para plegar, actualiza el resumen en un hilo: el turno no lo espera."""
+        fold = self.context.begin_fold()
+        if fold is not None:
+            threading.Thread(target=self._summarize, args=fold, daemon=True, name="dialog-summary").start()
+
+    def _summarize(self, summary, messages):
+        try:
+            response = openai.chat.completions.create(
+                model=self.model,
+                messages=self._summary_request(summary, messages),
+                temperature=0.3,
+                max_tokens=DIALOG_SUMMARY_MAX_TOKENS
+            )
+            self.context.finish_fold(response.choices[0].message.content)
+        except Exception as e:
+            print(f"⚠️ No se pudo resumir el contexto: {e}")
+            self.context.abort_fold()
+
+    def _summary_request(self, summary, messages):
+        """Mensajes de la petición de resumen: resumen anterior más los turnos a plegar."""
+        transcript = "\n".join(f"{'Alumno' if m['role'] == 'user' else 'Tutor'}: {m['content']}" for m in messages)
+        if summary:
+            transcript = f"Resumen anterior: {summary}\n\n{transcript}"
+        max_words = int(DIALOG_SUMMARY_MAX_TOKENS * 0.75)
+        return [{"role": "system", "content": SUMMARY_PROMPT.format(max_words=max_words)},
+                {"role": "user", "content": transcript}]
+
+    def generate_response(self, user_input):
+        """
+        Genera una respuesta en función del input del usuario manteniendo el contexto.
+        Devuelve: respuesta del asistente, frase objetivo, y si la respuesta es larga.
+        """
+        print("🤖 Generando respuesta...")
+
+        system_prompt = self._build_system_prompt(user_input)
         self.context.append({"role": "user", "content": user_input})
 
         response = openai.chat.completions.create(
             model=self.model,
-            messages=[{"role": "system", "content": system_prompt}] + self.context,
+            messages=self.context.request(system_prompt),
             temperature=0.7
         )
 
         raw_reply = response.choices[0].message.content.strip()
-        # Limpiar posibles bloques de código ```json ... ```
-        raw_reply_clean = re.sub(r"^```json\s*|\s*```$", "", raw_reply, flags=re.IGNORECASE)
+        reply, frase_objetivo = self._parse_reply(raw_reply)
+        return self._finish_turn(reply, frase_objetivo)
 
-        # Intentamos parsear JSON
-        try:
-            data = json.loads(raw_reply_clean)
-            reply = data.get("reply", "").strip()
-            frase_objetivo = data.get("frase_objetivo", "").strip() or None
-        except Exception:
-            # fallback si el modelo no devuelve JSON válido
-            reply = raw_reply_clean
-            frase_objetivo = reply.split(".")[0]  # tomar primera frase como target
-
-        # Chequeo de longitud
-        word_count = len(reply.split())
-        es_larga = word_count > 50
+    def generate_response_stream(self, user_input, on_sentence):
+        """
+        Igual que generate_response, pero pide la respuesta en streaming y llama a
+        on_sentence(oracion) con cada oración del 'reply' apenas termina de generarse,
+        mientras el modelo sigue escribiendo el resto.
+        Devuelve lo mismo que generate_response al terminar el stream.
+        """
+        print("🤖 Generando respuesta (streaming)...")
 
-        self.context.append({"role": "assistant", "content": reply})
+        system_prompt = self._build_system_prompt(user_input)
+        self.context.append({"role": "user", "content": user_input})
 
-        print(f"🤖 Asistente: {reply} (palabras: {word_count})")
-        print(f"🎯 Frase objetivo: {frase_objetivo}")
+        stream = openai.chat.completions.create(
+            model=self.model,
+            messages=self.context.request(system_prompt),
+            temperature=0.7,
+            stream=True
+        )
 
-        return reply, frase_objetivo, es_larga
+        splitter = SentenceSplitter()
+        parser = ReplyStreamParser()
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            for sentence in splitter.feed(parser.feed(delta)):
+                on_sentence(sentence)
+
+        reply, frase_objetivo = parser.finish()
+        # Lo que quedó sin emitir (normalmente la última oración)
+        emitted = parser.reply.strip()
+        if len(reply) > len(emitted) and reply.startswith(emitted):
+            splitter.feed(reply[len(emitted):])
+        for sentence in splitter.flush():
+            on_sentence(sentence)
+
+        return self._finish_turn(reply, frase_objetivo)
+
+    def draft_response(self, user_input, cancel_event=None):
+        """
+        Genera una respuesta sin tocar el contexto (para la generación especulativa).
+        Se puede cancelar a mitad con cancel_event. Devuelve (texto crudo o None si se canceló,
+        tokens consumidos {"prompt", "completion"}); si la API no informa el uso, se estima.
+        """
+        messages = self.context.request(self._build_system_prompt(user_input),
+                                        pending={"role": "user", "content": user_input})
+        stream = openai.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0.7,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
 
+        parts = []
+        usage = None
+        try:
+            for chunk in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                if chunk.usage:
+                    usage = {"prompt": chunk.usage.prompt_tokens, "completion": chunk.usage.completion_tokens}
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+        finally:
+            stream.close()
+
+        if usage is None:
+            usage = {"prompt": sum(estimate_tokens(m["content"]) for m in messages),
+                     "completion": estimate_tokens("".join(parts))}
+        if cancel_event is not None and cancel_event.is_set():
+            return None, usage
+        return "".join(parts).strip(), usage
+
+    def commit_response(self, user_input, raw_reply):
+        """Incorpora al contexto un turno generado con draft_response. Devuelve lo mismo que generate_response."""
+        self.context.append({"role": "user", "content": user_input})
+        reply, frase_objetivo = self._parse_reply(raw_reply)
+        return self._finish_turn(reply, frase_objetivo)
 
     def get_target_phrases(self, user_input, num_phrases=3):
         """
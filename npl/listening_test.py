@@ -1,5 +1,4 @@
 # npl/listening_test.py
-import time
 import json
 import openai
 import random
@@ -48,6 +47,9 @@ Incorrecta o vacía => 0.0.
 0-30% -> A1, 31-50% -> A2, 51-70% -> B1-, 71-85% -> B1, 86-95% -> B2, 96-100% -> C1-C2.
 """
 
+# Instrucción hablada antes de cada frase del test de listening
+LISTENING_INSTRUCTIONS_TEMPLATE = "Listen carefully and repeat the following sentence: '{sentence}'"
+
 class ListeningTest:
     def __init__(self, tts, stt, firestore):
         """
@@ -74,9 +76,13 @@ class ListeningTest:
             if not sentence:
                 continue
             # 1️⃣ Dar instrucciones
-            instructions = f"Listen carefully and repeat the following sentence: '{sentence}'"
+            instructions = LISTENING_INSTRUCTIONS_TEMPLATE.format(sentence=sentence)
             print("📢 Instrucciones (Listening):", instructions)
-            self.tts.speak(instructions)
+            if hasattr(self.tts, "speak_template"):
+                # Prefijo fijo cacheado + solo la frase sintetizada en cada ítem
+                self.tts.speak_template(LISTENING_INSTRUCTIONS_TEMPLATE, sentence=sentence)
+            else:
+                self.tts.speak(instructions)
 
             # 2️⃣ Capturar la respuesta del usuario
             print("🎤 Tu turno...")
@@ -115,18 +121,10 @@ class ListeningTest:
     # -----------------------------
     def wait_for_final_transcript_once(self, timeout=30):
         """
-        Espera un único transcript final del recognizer (modo bloqueante)
+        Espera un único transcript final del recognizer (modo bloqueante, sin polling)
         """
-        start_time = time.time()
-        self.last_transcript = ""
-        while True:
-            if time.time() - start_time > timeout:
-                break
-            transcript = self.recognizer.get_final_transcript()  # debe devolver texto
-            if transcript and transcript != self.last_transcript:
-                self.last_transcript = transcript
-                break
-            time.sleep(0.1)
+        transcript = self.recognizer.await_next_final(timeout=timeout)
+        self.last_transcript = transcript or ""
         return self.last_transcript
 
     def clean_json_block(self, raw_text):
@@ -161,7 +159,7 @@ if __name__ == "__main__":
             print(f"(TTS): {text}")
 
     class DummyRecognizer:
-        def get_final_transcript(self):
+        def await_next_final(self, timeout=None):
             return "The weather is nice today"
 
     test = ListeningTest(DummyGPT(), DummyTTS(), DummyRecognizer())
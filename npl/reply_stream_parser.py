@@ -0,0 +1,240 @@
+# npl/reply_stream_parser.py
+import json
+import re
+
+_FENCE = "```json"
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _strip_fences(raw_reply):
+    """Limpia posibles bloques de código ```json ... ```"""
+    return re.sub(r"^```json\s*|\s*```$", "", raw_reply.strip(), flags=re.IGNORECASE)
+
+
+def parse_reply(raw_reply):
+    """
+    Extrae reply y frase objetivo del texto completo devuelto por el modelo.
+    Si no es JSON válido, usa el texto como reply y su primera frase como objetivo.
+    """
+    raw_reply_clean = _strip_fences(raw_reply)
+
+    # Intentamos parsear JSON
+    try:
+        data = json.loads(raw_reply_clean)
+        reply = data.get("reply", "").strip()
+        frase_objetivo = data.get("frase_objetivo", "").strip() or None
+    except Exception:
+        # fallback si el modelo no devuelve JSON válido
+        reply = raw_reply_clean
+        frase_objetivo = reply.split(".")[0]  # tomar primera frase como target
+    return reply, frase_objetivo
+
+
+class ReplyStreamParser:
+    """
+    Parser incremental y tolerante a fallos para la salida JSON del diálogo
+    ({"reply": "...", "frase_objetivo": "..."}), posiblemente envuelta en ```json.
+
+    feed(delta) recibe los fragmentos tal como llegan del stream y devuelve el texto
+    de 'reply' decodificado hasta ese momento (solo lo nuevo), incluyendo escapes
+    (\\", \\n, \\uXXXX y pares surrogate) aunque queden partidos entre fragmentos.
+    frase_objetivo queda disponible apenas se cierra su string.
+    Si la salida no es JSON, el texto se entrega tal cual (mismo fallback que parse_reply).
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.reply = ""             # reply decodificado hasta ahora
+        self.frase_objetivo = None
+        self.mode = None            # None (aún no se sabe), "json", "text" o "broken"
+        self._pending = ""          # texto del inicio retenido hasta decidir el modo
+        self._state = "key_start"
+        self._key = ""
+        self._value = ""
+        self._escape = None         # None, "\\" o "uXXXX" parcial
+        self._high_surrogate = None
+        self._depth = 0             # anidamiento dentro de valores que se ignoran
+        self._in_skip_string = False
+        self._skip_escape = False
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def feed(self, delta):
+        """Procesa un fragmento y devuelve el texto nuevo de 'reply'."""
+        if not delta:
+            return ""
+        self.raw += delta
+        if self.mode is None:
+            delta = self._detect_mode(delta)
+            if self.mode is None:
+                return ""
+        if self.mode == "text":
+            return self._feed_text(delta)
+        if self.mode == "json":
+            return self._feed_json(delta)
+        return ""
+
+    def finish(self):
+        """
+        Cierra el stream y devuelve (reply, frase_objetivo) definitivos.
+        Si el JSON completo es válido manda el parseo final; si quedó roto o truncado,
+        se conserva lo que ya se había decodificado del campo 'reply'.
+        """
+        reply, frase_objetivo = parse_reply(self.raw)
+        if self.mode in ("json", "broken") and reply == _strip_fences(self.raw) and self.reply.strip():
+            # JSON inválido: mejor el reply parcial que el JSON crudo
+            reply = self.reply.strip()
+            frase_objetivo = self.frase_objetivo or reply.split(".")[0]
+        return reply, frase_objetivo
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _detect_mode(self, delta):
+        """Decide si la salida es JSON o texto, saltando un posible bloque ```json."""
+        self._pending += delta
+        text = self._pending.lstrip()
+        if not text:
+            return ""
+        if text.startswith("`"):
+            if _FENCE.startswith(text.lower()):
+                return ""  # todavía puede ser el inicio de ```json
+            match = re.match(r"```(?:json)?[ \t]*\r?\n?", text, flags=re.IGNORECASE)
+            text = text[match.end():] if match else text
+            if not text.strip():
+                self._pending = text
+                return ""
+            text = text.lstrip()
+        self._pending = ""
+        if text.startswith("{"):
+            self.mode = "json"
+            return text[1:]
+        self.mode = "text"
+        return text
+
+    def _feed_text(self, delta):
+        """Modo texto plano: se emite todo salvo backticks finales (posible cierre de bloque)."""
+        text = self._pending + delta
+        stripped = text.rstrip("`")
+        self._pending = text[len(stripped):]
+        self.reply += stripped
+        return stripped
+
+    def _feed_json(self, delta):
+        out = []
+        for ch in delta:
+            if self.mode != "json":
+                break
+            self._step(ch, out)
+        new_text = "".join(out)
+        self.reply += new_text
+        return new_text
+
+    def _step(self, ch, out):
+        state = self._state
+        if state == "key_start":
+            if ch == '"':
+                self._key = ""
+                self._state = "key"
+            elif ch == "}":
+                self._state = "done"
+            elif not ch.isspace() and ch != ",":
+                self.mode = "broken"
+        elif state == "key":
+            if self._escape:
+                self._key += ch
+                self._escape = None
+            elif ch == "\\":
+                self._escape = "\\"
+            elif ch == '"':
+                self._state = "colon"
+            else:
+                self._key += ch
+        elif state == "colon":
+            if ch == ":":
+                self._state = "value_start"
+            elif not ch.isspace():
+                self.mode = "broken"
+        elif state == "value_start":
+            if ch == '"':
+                self._value = ""
+                self._state = "string"
+            elif ch in "{[":
+                self._depth = 1
+                self._state = "skip"
+            elif not ch.isspace():
+                self._state = "scalar"
+        elif state == "string":
+            self._step_string(ch, out)
+        elif state == "scalar":
+            if ch == ",":
+                self._state = "key_start"
+            elif ch == "}":
+                self._state = "done"
+        elif state == "skip":
+            self._step_skip(ch)
+        elif state == "after_value":
+            if ch == ",":
+                self._state = "key_start"
+            elif ch == "}":
+                self._state = "done"
+            elif not ch.isspace():
+                self.mode = "broken"
+        # "done": se ignora el resto (``` de cierre, espacios)
+
+    def _step_string(self, ch, out):
+        if self._escape == "\\":
+            if ch == "u":
+                self._escape = "u"
+                return
+            self._escape = None
+            self._emit(_ESCAPES.get(ch, ch), out)
+        elif self._escape:
+            self._escape += ch
+            if len(self._escape) < 5:
+                return
+            try:
+                code = int(self._escape[1:], 16)
+            except ValueError:
+                self._escape = None
+                return
+            self._escape = None
+            if 0xD800 <= code <= 0xDBFF:
+                self._high_surrogate = code
+                return
+            if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+                code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self._high_surrogate = None
+            self._emit(chr(code), out)
+        elif ch == "\\":
+            self._escape = "\\"
+        elif ch == '"':
+            if self._key == "frase_objetivo":
+                self.frase_objetivo = self._value.strip() or None
+            self._state = "after_value"
+        else:
+            self._emit(ch, out)
+
+    def _step_skip(self, ch):
+        """Salta objetos o listas anidadas respetando strings internos."""
+        if self._in_skip_string:
+            if self._skip_escape:
+                self._skip_escape = False
+            elif ch == "\\":
+                self._skip_escape = True
+            elif ch == '"':
+                self._in_skip_string = False
+        elif ch == '"':
+            self._in_skip_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._state = "after_value"
+
+    def _emit(self, text, out):
+        self._value += text
+        if self._key == "reply":
+            out.append(text)
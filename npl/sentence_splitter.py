@@ -0,0 +1,75 @@
+# npl/sentence_splitter.py
+import re
+
+# Fin de oración: . ! ? … (y variantes repetidas) seguido de espacio o comillas de cierre
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”)\]]*\s+")
+
+
+class SentenceSplitter:
+    """
+    Acumula texto que llega en fragmentos (tokens del LLM) y entrega oraciones completas
+    en cuanto se detecta su final, para poder sintetizarlas sin esperar la respuesta entera.
+    """
+
+    def __init__(self, min_chars=12):
+        """
+        min_chars: largo mínimo de una oración emitida; las más cortas se unen a la siguiente
+        para no generar audios de una sola palabra ("Sí.", "Ok.").
+        """
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        """Agrega texto y devuelve la lista de oraciones que quedaron completas."""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            if len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Devuelve lo que quede en el buffer como última oración."""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+
+def split_long_text(text, max_chars=180):
+    """
+    Divide un texto largo en trozos para sintetizar por separado: primero por oraciones
+    y, si alguna supera max_chars, por cláusulas (, ; :) y en último caso por palabras.
+    Cortar por oración mantiene la entonación natural y permite reutilizar la caché
+    cuando una oración se repite.
+    """
+    splitter = SentenceSplitter()
+    sentences = splitter.feed(text) + splitter.flush()
+    chunks = []
+    for sentence in sentences:
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        current = ""
+        for piece in _clauses(sentence, max_chars):
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}".strip()
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def _clauses(sentence, max_chars):
+    """Cláusulas de una oración; las que siguen siendo largas se devuelven palabra por palabra."""
+    for clause in re.split(r"(?<=[,;:])\s+", sentence):
+        if len(clause) <= max_chars:
+            yield clause
+        else:
+            yield from clause.split()
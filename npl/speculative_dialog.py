@@ -0,0 +1,171 @@
+# npl/speculative_dialog.py
+import re
+import threading
+import time
+
+from config import SPECULATION_STABLE_MS, SPECULATION_PREPARE_TTS
+
+
+def normalize_transcript(text):
+    """Forma comparable de un transcript: minúsculas, sin puntuación ni espacios extra."""
+    text = re.sub(r"[^\w\s']", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class Speculation:
+    """Una respuesta generada en segundo plano a partir de un transcript intermedio."""
+
+    def __init__(self, dialog_manager, transcript, tts=None):
+        self.transcript = transcript
+        self.key = normalize_transcript(transcript)
+        self.cancel = threading.Event()
+        self.done = threading.Event()
+        self.started_at = time.perf_counter()
+        self.ready_at = None
+        self.raw_reply = None
+        self.usage = {"prompt": 0, "completion": 0}
+        self.tts_chars = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._run, args=(dialog_manager, tts), daemon=True,
+                                        name="dialog-speculation")
+        self._thread.start()
+
+    def _run(self, dialog_manager, tts):
+        try:
+            self.raw_reply, self.usage = dialog_manager.draft_response(self.transcript, self.cancel)
+            self.ready_at = time.perf_counter()
+            if tts is not None and self.raw_reply and not self.cancel.is_set():
+                # Deja el audio en la caché de TTS: si se confirma, speak() no sintetiza nada
+                reply, _ = dialog_manager._parse_reply(self.raw_reply)
+                self.tts_chars = len(reply)
+                tts.prepare_audio(reply)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    @property
+    def tokens(self):
+        return self.usage["prompt"] + self.usage["completion"]
+
+
+class SpeculativeDialog:
+    """
+    Generación especulativa de respuestas: cuando el transcript intermedio de Google se mantiene
+    igual durante stable_ms, empieza a generar la respuesta (y opcionalmente el audio) sin esperar
+    al final. Si el final coincide, se usa lo ya generado; si no, se cancela y se descarta sin
+    tocar el contexto del diálogo. Lleva la tasa de aciertos y los tokens desperdiciados.
+    """
+
+    def __init__(self, dialog_manager, tts=None, stable_ms=SPECULATION_STABLE_MS,
+                 prepare_tts=SPECULATION_PREPARE_TTS):
+        """
+        dialog_manager: DialogManager (usa draft_response y commit_response)
+        tts: backend con prepare_audio(text), usado solo si prepare_tts es True
+        stable_ms: tiempo que el transcript intermedio debe quedar igual para especular
+        """
+        self.dialog_manager = dialog_manager
+        self.tts = tts if prepare_tts else None
+        self.stable_ms = stable_ms
+        self._lock = threading.Lock()
+        self._timer = None
+        self._current = None
+        self.stats = {"speculations": 0, "hits": 0, "misses": 0, "wasted_tokens": 0,
+                      "wasted_tts_chars": 0, "saved_ms": 0.0}
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def on_interim(self, transcript):
+        """Llamado con cada resultado intermedio; reinicia el temporizador de estabilidad."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            if not transcript.strip():
+                return
+            current = self._current
+            if current is not None and current.key == normalize_transcript(transcript):
+                return  # ya se está especulando con este mismo texto
+            self._timer = threading.Timer(self.stable_ms / 1000, self._speculate, args=(transcript,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def respond(self, final_transcript):
+        """
+        Devuelve (reply, frase_objetivo, es_larga) para el transcript final, usando la
+        especulación si coincide o generando la respuesta de forma normal si no.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            speculation, self._current = self._current, None
+
+        if speculation is not None:
+            if speculation.key == normalize_transcript(final_transcript):
+                result = self._commit(speculation, final_transcript)
+                if result is not None:
+                    return result
+            else:
+                self._discard(speculation)
+
+        return self.dialog_manager.generate_response(final_transcript)
+
+    def cancel(self):
+        """Descarta la especulación en curso (por ejemplo, al interrumpir el turno)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            speculation, self._current = self._current, None
+        if speculation is not None:
+            self._discard(speculation)
+
+    def report(self):
+        """Imprime y devuelve la tasa de aciertos y el costo de las especulaciones fallidas."""
+        resolved = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / resolved if resolved else 0.0
+        avg_saved = self.stats["saved_ms"] / self.stats["hits"] if self.stats["hits"] else 0.0
+        print(f"📊 Especulación: {self.stats['speculations']} lanzadas, aciertos {hit_rate:.0%} "
+              f"({self.stats['hits']}/{resolved}), ahorro medio {avg_saved:.0f} ms, "
+              f"tokens desperdiciados {self.stats['wasted_tokens']}, "
+              f"caracteres TTS desperdiciados {self.stats['wasted_tts_chars']}")
+        return {**self.stats, "hit_rate": hit_rate, "avg_saved_ms": avg_saved}
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _speculate(self, transcript):
+        with self._lock:
+            previous = self._current
+            self._current = Speculation(self.dialog_manager, transcript, self.tts)
+            self.stats["speculations"] += 1
+        print(f"\n🔮 Especulando respuesta para: {transcript}")
+        if previous is not None:
+            self._discard(previous)
+
+    def _commit(self, speculation, final_transcript):
+        # Lo que ya se generó antes del final es tiempo ahorrado; si aún no termina, se espera
+        waited_from = time.perf_counter()
+        speculation.done.wait()
+        if speculation.error is not None or not speculation.raw_reply:
+            print(f"⚠️ Especulación fallida, se genera de nuevo: {speculation.error}")
+            self._discard(speculation)
+            return None
+        saved_ms = (waited_from - speculation.started_at) * 1000
+        self.stats["hits"] += 1
+        self.stats["saved_ms"] += saved_ms
+        print(f"🔮 Especulación confirmada (~{saved_ms:.0f} ms ganados)")
+        return self.dialog_manager.commit_response(final_transcript, speculation.raw_reply)
+
+    def _discard(self, speculation):
+        speculation.cancel.set()
+        # El conteo se hace cuando el hilo termina, para incluir todo lo que se llegó a consumir
+        threading.Thread(target=self._account_waste, args=(speculation,), daemon=True).start()
+
+    def _account_waste(self, speculation):
+        speculation.done.wait()
+        with self._lock:
+            self.stats["misses"] += 1
+            self.stats["wasted_tokens"] += speculation.tokens
+            self.stats["wasted_tts_chars"] += speculation.tts_chars
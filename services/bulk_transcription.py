@@ -0,0 +1,116 @@
+# services/bulk_transcription.py
+"""
+Transcribe en lote un directorio de grabaciones de alumnos (WAV, FLAC, OGG, MP3) con el mismo
+pipeline que el asistente en vivo (SpeechRecognizer + StreamManager), pero leyendo cada archivo
+más rápido que tiempo real y con a lo sumo max_streams streams de Google en paralelo.
+Informa el factor de tiempo real (RTF = tiempo de proceso / duración del audio) por archivo
+y agregado.
+
+Uso:
+    python -m services.bulk_transcription grabaciones/ --streams 4 --language es-CL
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from google.cloud import speech
+
+from config import GOOGLE_STT_LANGUAGE, STT_ENCODING
+from stt.audio_source import FileSource
+from stt.speech_recognition import SpeechRecognizer
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".opus", ".mp3")
+
+
+class BulkTranscriber:
+    def __init__(self, language_code=GOOGLE_STT_LANGUAGE, max_streams=4, encoding=STT_ENCODING, max_speed=None):
+        """
+        max_streams: archivos (streams de Google) transcribiéndose a la vez como máximo
+        encoding: cómo viaja el audio a Google (LINEAR16, FLAC u OGG_OPUS)
+        max_speed: límite opcional por archivo en veces tiempo real (None = lo que acepte Google)
+        """
+        self.language_code = language_code
+        self.max_streams = max_streams
+        self.encoding = encoding
+        self.max_speed = max_speed
+        self.client = speech.SpeechClient()  # un solo canal gRPC para todos los streams
+
+    def transcribe_file(self, path):
+        """Transcribe una grabación y devuelve {path, text, seconds, elapsed, rtf}."""
+        source = FileSource(path, max_speed=self.max_speed)
+        recognizer = SpeechRecognizer(language_code=self.language_code, use_vad=False, endpointing=False,
+                                      barge_in=False, aec=False, encoding=self.encoding, source=source,
+                                      client=self.client)
+        start = time.perf_counter()
+        finals = recognizer.transcribe()
+        elapsed = time.perf_counter() - start
+        return {"path": path, "text": " ".join(finals), "seconds": source.seconds, "elapsed": elapsed,
+                "rtf": elapsed / source.seconds if source.seconds else 0.0}
+
+    def run(self, paths):
+        """Transcribe todas las grabaciones con max_streams en paralelo y devuelve (resultados, resumen)."""
+        results, failed = [], 0
+        print(f"🗂️ Transcripción en lote: {len(paths)} grabaciones, {self.max_streams} streams en paralelo")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_streams, thread_name_prefix="bulk-stt") as executor:
+            futures = {executor.submit(self.transcribe_file, path): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ Error transcribiendo {os.path.basename(path)}: {e}")
+                    continue
+                results.append(result)
+                print(f"✅ {os.path.basename(path)} ({result['seconds']:.1f} s, RTF {result['rtf']:.2f}): "
+                      f"{result['text']}")
+
+        wall = time.perf_counter() - start
+        audio = sum(r["seconds"] for r in results)
+        summary = {
+            "files": len(results),
+            "failed": failed,
+            "audio_seconds": audio,
+            "wall_seconds": wall,
+            "rtf": wall / audio if audio else 0.0,                                      # del lote completo
+            "rtf_per_stream": sum(r["elapsed"] for r in results) / audio if audio else 0.0,
+        }
+        self.print_summary(summary)
+        return results, summary
+
+    def print_summary(self, summary):
+        print("📊 Resumen de transcripción en lote")
+        print(f"   Archivos: {summary['files']}  |  Fallidos: {summary['failed']}  |  "
+              f"Audio: {summary['audio_seconds']:.1f} s en {summary['wall_seconds']:.1f} s")
+        print(f"   RTF agregado: {summary['rtf']:.3f} ({1 / summary['rtf'] if summary['rtf'] else 0:.1f}x tiempo real) "
+              f"|  RTF por stream: {summary['rtf_per_stream']:.3f}")
+
+
+def find_recordings(directory):
+    """Grabaciones del directorio (recursivo), ordenadas por ruta."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(AUDIO_EXTENSIONS))
+    return sorted(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe en lote un directorio de grabaciones")
+    parser.add_argument("directory", help="directorio con grabaciones WAV/FLAC/OGG/MP3")
+    parser.add_argument("--streams", type=int, default=4, help="streams de Google en paralelo")
+    parser.add_argument("--language", default=GOOGLE_STT_LANGUAGE, help="idioma de las grabaciones")
+    parser.add_argument("--encoding", default=STT_ENCODING, help="LINEAR16, FLAC u OGG_OPUS")
+    parser.add_argument("--max-speed", type=float, default=None, help="límite en veces tiempo real por archivo")
+    args = parser.parse_args()
+
+    paths = find_recordings(args.directory)
+    if not paths:
+        print(f"No hay grabaciones en {args.directory}")
+        return
+    BulkTranscriber(args.language, args.streams, args.encoding.upper(), args.max_speed).run(paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# services/context_benchmark.py
+"""
+Sesión larga simulada contra el LLM local de services/stand_ins.py (su primera palabra tarda
+más cuanto más largo es el prompt, como en la API real) para ver cómo evolucionan el tamaño
+del prompt y la latencia turno a turno: con el contexto acotado (DialogContext con resumen y
+tope de tokens) y con el historial completo de antes. Imprime promedios por tramos de turnos;
+con el contexto acotado ambos deben quedar planos.
+
+Uso:
+    python -m services.context_benchmark --turns 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from config import DIALOG_KEEP_TURNS, DIALOG_MAX_PROMPT_TOKENS
+from npl.async_dialog import AsyncDialogManager
+from npl.dialog_context import DialogContext
+from services.stand_ins import LEARNER_UTTERANCES, StandInOpenAI
+
+UNBOUNDED = 10 ** 9
+
+
+async def run_session(context, turns, client):
+    """Devuelve [(tokens del prompt, ms hasta la primera oración)] por turno."""
+    manager = AsyncDialogManager(client=client)
+    manager.context = context
+    results = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        first_sentence = {}
+
+        def on_sentence(sentence):
+            first_sentence.setdefault("ms", (time.perf_counter() - start) * 1000)
+
+        await manager.generate_response_stream(LEARNER_UTTERANCES[turn % len(LEARNER_UTTERANCES)], on_sentence)
+        results.append((context.last_prompt_tokens, first_sentence.get("ms", 0.0)))
+        await asyncio.sleep(0)   # deja correr la tarea de resumen entre turnos, como en una sesión real
+    return results
+
+
+def print_profile(name, results, window):
+    print(f"\n{name}")
+    print("  turnos      prompt (tokens)   primera oración (ms)")
+    for start in range(0, len(results), window):
+        chunk = results[start:start + window]
+        tokens = sum(t for t, _ in chunk) / len(chunk)
+        ms = sum(m for _, m in chunk) / len(chunk)
+        print(f"  {start + 1:4d}-{start + len(chunk):<4d}   {tokens:10.0f}        {ms:10.0f}")
+
+
+async def benchmark(args):
+    client = StandInOpenAI(first_token_ms=args.first_token_ms, tokens_per_second=args.tokens_per_second,
+                           prefill_ms_per_1k=args.prefill_ms_per_1k)
+    bounded = DialogContext(keep_turns=args.keep_turns, max_tokens=args.max_tokens)
+    profiles = [("Contexto acotado", await run_session(bounded, args.turns, client))]
+    if not args.bounded_only:
+        unbounded = DialogContext(keep_turns=UNBOUNDED, max_tokens=UNBOUNDED)
+        profiles.append(("Historial completo", await run_session(unbounded, args.turns, client)))
+    return profiles, bounded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamaño del prompt y latencia en una sesión larga")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--window", type=int, default=25, help="turnos por tramo del informe")
+    parser.add_argument("--keep-turns", type=int, default=DIALOG_KEEP_TURNS)
+    parser.add_argument("--max-tokens", type=int, default=DIALOG_MAX_PROMPT_TOKENS)
+    parser.add_argument("--first-token-ms", type=float, default=50)
+    parser.add_argument("--tokens-per-second", type=float, default=2000)
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=20)
+    parser.add_argument("--bounded-only", action="store_true", help="no correr la sesión con historial completo")
+    args = parser.parse_args()
+
+    # Sin los prints por turno del DialogManager: solo interesa el perfil
+    with contextlib.redirect_stdout(io.StringIO()):
+        profiles, bounded = asyncio.run(benchmark(args))
+    for name, results in profiles:
+        print_profile(name, results, args.window)
+    print()
+    bounded.report()
+
+
+if __name__ == "__main__":
+    main()
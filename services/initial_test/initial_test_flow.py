@@ -1,5 +1,17 @@
 from services.initial_test.listening_service import ListeningService
 
+WELCOME_TEXT = (
+    "¡Bienvenido/a al Test Inicial de Inglés!"
+    "Este test nos ayudará a conocer tu nivel de inglés para diseñar un plan "
+    "de aprendizaje personalizado.\n\n"
+    "¿Qué incluye?\n"
+    "- Listening: Escucharás y responderás algunas frases.\n"
+    "- Reading: Leerás textos cortos y contestarás preguntas.\n"
+    "- Speaking: Repetirás algunas frases para evaluar tu pronunciación.\n\n"
+    "Importante: No hay respuestas correctas o incorrectas.\n"
+    "Duración aproximada: 10-15 minutos."
+)
+
 class InitialTestFlow:
     def __init__(self, firestore_db, tts, stt, gpt_client):
         self.firestore = firestore_db
@@ -13,14 +25,4 @@ class InitialTestFlow:
         Muestra la bienvenida del test inicial.
         Podría ser texto plano, HTML (para web) o JSON (para apps).
         """
-        return (
-            "¡Bienvenido/a al Test Inicial de Inglés!"
-            "Este test nos ayudará a conocer tu nivel de inglés para diseñar un plan "
-            "de aprendizaje personalizado.\n\n"
-            "¿Qué incluye?\n"
-            "- Listening: Escucharás y responderás algunas frases.\n"
-            "- Reading: Leerás textos cortos y contestarás preguntas.\n"
-            "- Speaking: Repetirás algunas frases para evaluar tu pronunciación.\n\n"
-            "Importante: No hay respuestas correctas o incorrectas.\n"
-            "Duración aproximada: 10-15 minutos."
-        )
+        return WELCOME_TEXT
@@ -35,6 +35,9 @@ class ListeningService:
         # Preparar items para ListeningTest
         listening_items = []
         for idx, phrase in enumerate(phrases, start=1):
+            # Las frases generadas se guardan como {"id", "text"}
+            if isinstance(phrase, dict):
+                phrase = phrase.get("text", "")
             item = {
                 "id": idx,
                 "text_audio": phrase,  # frase que se va a reproducir
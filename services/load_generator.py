@@ -0,0 +1,236 @@
+# services/load_generator.py
+"""
+Generador de carga del servidor de sesiones: N alumnos simulados hablan a la vez en tiempo
+real (frames de 100 ms por WebSocket), cada uno con varios turnos, y se mide:
+- latencia de turno en el cliente: fin de la voz -> primer byte de audio de la respuesta
+  (incluye el silencio que necesita el STT para cerrar el turno);
+- latencia de turno en el servidor: transcript final -> primer bloque de audio enviado;
+- CPU del proceso servidor por segundo de prueba, y con eso sesiones por núcleo.
+Por defecto levanta el servidor con --stand-ins (services/stand_ins.py), así lo que se mide es
+el costo del propio servidor y no el de las APIs.
+
+Uso:
+    python -m services.load_generator --sessions 10 50 100 --turns 3 --target-p95-ms 1500
+    python -m services.load_generator --url ws://servidor:8765 --sessions 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import websockets
+from websockets.exceptions import WebSocketException
+
+from utils.latency_tracker import LatencyTracker
+
+RATE = 16000
+FRAME_MS = 100
+FRAME = int(RATE * FRAME_MS / 1000)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def speech_frames(seconds, pitch=150.0):
+    """'Voz' sintética: armónicos con una envolvente de sílabas, en frames PCM16 de FRAME_MS."""
+    t = np.arange(int(seconds * RATE)) / RATE
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    wave = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+    pcm = (wave * envelope * 4000).astype(np.int16)
+    return [pcm[start:start + FRAME].tobytes() for start in range(0, pcm.size - FRAME + 1, FRAME)]
+
+
+SILENCE_FRAME = b"\x00" * FRAME * 2
+
+
+class Learner:
+    """Un alumno simulado: habla, espera la respuesta completa (en silencio) y vuelve a hablar."""
+
+    def __init__(self, url, turns, speech_seconds, latency, reply_timeout=30.0):
+        self.url = url
+        self.turns = turns
+        self.speech = speech_frames(speech_seconds)
+        self.latency = latency
+        self.reply_timeout = reply_timeout
+        self.stats = {"turns": 0, "timeouts": 0, "audio_bytes": 0, "errors": 0}
+        self._speech_end = None
+        self._reply = asyncio.Event()
+
+    async def run(self):
+        try:
+            async with websockets.connect(self.url, max_size=None) as websocket:
+                receiver = asyncio.create_task(self._receive(websocket))
+                try:
+                    await self._talk(websocket)
+                    await websocket.send(json.dumps({"type": "stop"}))
+                finally:
+                    receiver.cancel()
+        except (OSError, WebSocketException):
+            self.stats["errors"] += 1
+
+    async def _talk(self, websocket):
+        clock = _FrameClock()
+        for _ in range(self.turns):
+            self._reply.clear()
+            for frame in self.speech:
+                await websocket.send(frame)
+                await clock.tick()
+            self._speech_end = time.perf_counter()
+            deadline = time.monotonic() + self.reply_timeout
+            # El micrófono sigue mandando silencio mientras llega y suena la respuesta
+            while not self._reply.is_set():
+                if time.monotonic() > deadline:
+                    self.stats["timeouts"] += 1
+                    break
+                await websocket.send(SILENCE_FRAME)
+                await clock.tick()
+            else:
+                self.stats["turns"] += 1
+
+    async def _receive(self, websocket):
+        async for message in websocket:
+            if isinstance(message, bytes):
+                self.stats["audio_bytes"] += len(message)
+                if self._speech_end is not None:
+                    self.latency.add((time.perf_counter() - self._speech_end) * 1000)
+                    self._speech_end = None
+            elif json.loads(message).get("type") == "reply":
+                self._reply.set()
+
+
+class _FrameClock:
+    """Ritmo de tiempo real: un frame cada FRAME_MS sin acumular atraso."""
+
+    def __init__(self):
+        self.next = time.monotonic()
+
+    async def tick(self):
+        self.next = max(self.next + FRAME_MS / 1000, time.monotonic() - FRAME_MS / 1000)
+        await asyncio.sleep(max(0.0, self.next - time.monotonic()))
+
+
+async def server_stats(url):
+    """Pide las métricas al servidor (abre una sesión de control que no manda audio)."""
+    async with websockets.connect(url, max_size=None) as websocket:
+        await websocket.send(json.dumps({"type": "stats"}))
+        async for message in websocket:
+            if isinstance(message, str):
+                event = json.loads(message)
+                if event.get("type") == "stats":
+                    await websocket.send(json.dumps({"type": "stop"}))
+                    return event
+
+
+async def run_level(url, sessions, turns, speech_seconds, ramp_seconds):
+    """Una prueba con `sessions` alumnos simultáneos. Devuelve el resumen del nivel."""
+    latency = LatencyTracker(window=sessions * turns)
+    learners = [Learner(url, turns, speech_seconds, latency) for _ in range(sessions)]
+    before = await server_stats(url)
+    start = time.perf_counter()
+
+    async def staggered(i, learner):
+        # Arranques repartidos: no todos los alumnos terminan de hablar en el mismo bloque
+        await asyncio.sleep(ramp_seconds * i / sessions)
+        await learner.run()
+
+    await asyncio.gather(*(staggered(i, learner) for i, learner in enumerate(learners)))
+    wall = time.perf_counter() - start
+    after = await server_stats(url)
+
+    cores = (after["cpu_seconds"] - before["cpu_seconds"]) / wall
+    client = latency.summary()
+    server = after["turn_latency_ms"]
+    return {
+        "sessions": sessions,
+        "turns": sum(learner.stats["turns"] for learner in learners),
+        "timeouts": sum(learner.stats["timeouts"] for learner in learners),
+        "errors": sum(learner.stats["errors"] for learner in learners),
+        "wall_seconds": wall,
+        "cores": cores,
+        "sessions_per_core": sessions / cores if cores > 0 else float("inf"),
+        "p50_ms": client["p50"],
+        "p95_ms": client["p95"],
+        "server_p95_ms": server["p95"],
+        "cpu_count": after["cpu_count"],
+    }
+
+
+def print_level(result):
+    p50 = f"{result['p50_ms']:.0f}" if result["p50_ms"] is not None else "-"
+    p95 = f"{result['p95_ms']:.0f}" if result["p95_ms"] is not None else "-"
+    server = f"{result['server_p95_ms']:.0f}" if result["server_p95_ms"] is not None else "-"
+    print(f"👥 {result['sessions']:4d} sesiones | {result['turns']} turnos ({result['timeouts']} sin respuesta, "
+          f"{result['errors']} errores) | turno p50 {p50} ms, p95 {p95} ms (servidor p95 {server} ms) | "
+          f"CPU {result['cores']:.2f} núcleos -> {result['sessions_per_core']:.0f} sesiones/núcleo")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_for_server(url, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await server_stats(url)
+            return
+        except (OSError, WebSocketException):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def run(args):
+    results = []
+    for sessions in args.sessions:
+        result = await run_level(args.url, sessions, args.turns, args.speech_seconds, args.ramp_seconds)
+        print_level(result)
+        results.append(result)
+
+    print(f"🖥️ {results[0]['cpu_count']} núcleos en el servidor")
+    within = [r for r in results if r["p95_ms"] is not None and r["p95_ms"] <= args.target_p95_ms
+              and not r["timeouts"] and not r["errors"]]
+    if within:
+        best = max(within, key=lambda r: r["sessions"])
+        print(f"✅ Hasta {best['sessions']} sesiones simultáneas con turno p95 ≤ {args.target_p95_ms:.0f} ms "
+              f"({best['sessions_per_core']:.0f} sesiones por núcleo)")
+    else:
+        print(f"❌ Ningún nivel cumple turno p95 ≤ {args.target_p95_ms:.0f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pruebas de carga del servidor de sesiones")
+    parser.add_argument("--url", help="servidor ya levantado (por defecto se levanta uno con --stand-ins)")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 50, 100], help="niveles de sesiones simultáneas")
+    parser.add_argument("--turns", type=int, default=3, help="turnos por alumno")
+    parser.add_argument("--speech-seconds", type=float, default=1.5, help="duración de cada intervención")
+    parser.add_argument("--ramp-seconds", type=float, default=2.0, help="tiempo en que se reparten los arranques")
+    parser.add_argument("--target-p95-ms", type=float, default=1500, help="objetivo de latencia de turno (cliente)")
+    args = parser.parse_args()
+
+    server = None
+    if args.url is None:
+        port = free_port()
+        args.url = f"ws://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "services.session_server", "--stand-ins", "--host", "127.0.0.1",
+             "--port", str(port), "--max-sessions", str(max(args.sessions) + 2)],
+            cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    try:
+        if server is not None:
+            asyncio.run(wait_for_server(args.url))
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
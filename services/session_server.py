@@ -0,0 +1,251 @@
+# services/session_server.py
+"""
+Servidor sin interfaz local: cada alumno se conecta por WebSocket, manda su micrófono como
+frames binarios PCM16 mono a 16 kHz y recibe el audio de las respuestas (PCM16 mono a
+PLAYBACK_RATE) más eventos JSON. Cada conexión es una sesión con su propio reconocedor,
+contexto de diálogo y motor de reproducción (STT -> DialogManager -> TTS, como
+AsyncVoiceAssistant); todas comparten un solo event loop y los recursos caros del proceso:
+clientes de Google STT / OpenAI / ElevenLabs, la caché de TTS y el banco de frases.
+
+Mensajes de texto del cliente (JSON): {"type": "cancel"} corta la respuesta en curso,
+{"type": "stop"} cierra la sesión y {"type": "stats"} pide las métricas del servidor.
+Eventos del servidor: transcript, turn (latencia final -> primer audio enviado), reply y stats.
+
+Uso:
+    python -m services.session_server --port 8765
+    python -m services.session_server --stand-ins   # backends locales (ver services/stand_ins.py)
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from async_assistant import AsyncVoiceAssistant
+from config import ELEVEN_TTS_STREAMING, OPENAI_API_KEY, SERVER_HOST, SERVER_MAX_SESSIONS, SERVER_PORT
+from npl.async_dialog import AsyncDialogManager
+from npl.listening_test import LISTENING_INSTRUCTIONS_TEMPLATE
+from stt.async_recognizer import AsyncSpeechRecognizer
+from tts.remote_playback import RemotePlaybackEngine
+from utils.latency_tracker import LatencyTracker
+
+PRACTICE_COMMANDS = ("practice", "practicar", "dame una frase")
+
+
+class SharedResources:
+    """Lo que se crea una vez por proceso y usan todas las sesiones."""
+
+    def __init__(self, stand_ins=False):
+        """stand_ins: backends locales en vez de las APIs (pruebas de carga)"""
+        self.stand_ins = stand_ins
+        if stand_ins:
+            from services.stand_ins import StandInOpenAI, StandInSpeechClient, StandInTTS
+            self.speech_client = StandInSpeechClient()
+            self.openai_client = StandInOpenAI()
+            self.tts = StandInTTS()
+        else:
+            import openai
+            from google.cloud import speech
+            from tts.eleven_tts import ElevenLabsTTS
+            self.speech_client = speech.SpeechAsyncClient()   # un canal gRPC para todos los streams
+            self.openai_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+            self.tts = ElevenLabsTTS(streaming=ELEVEN_TTS_STREAMING)  # y su TTSCache del proceso
+        self.phrases = []
+
+    async def load(self):
+        """Carga el banco de frases de listening una sola vez (Firestore es bloqueante: va a un hilo)."""
+        if self.stand_ins:
+            from services.stand_ins import STAND_IN_PHRASES
+            self.phrases = list(STAND_IN_PHRASES)
+        else:
+            from db.firebase_db import FirebaseDB
+            self.phrases = await asyncio.to_thread(lambda: FirebaseDB().get_all_listening_phrases())
+        print(f"📚 Banco de frases: {len(self.phrases)} frases")
+
+
+class ServerSession(AsyncVoiceAssistant):
+    """
+    Una sesión remota: el AsyncVoiceAssistant de siempre con el audio entrando por el
+    WebSocket (AudioBridge.push) y saliendo por un RemotePlaybackEngine propio.
+    Sin barge-in ni AEC: el eco del parlante, si lo hay, se cancela en el cliente.
+    """
+
+    def __init__(self, websocket, resources, server, language_code="en-US"):
+        self.websocket = websocket
+        self.resources = resources
+        self.server = server
+        self.turn_started = None   # perf_counter del último final, hasta que sale su primer audio
+        self.closed = False
+        recognizer = AsyncSpeechRecognizer(language_code=language_code, client=resources.speech_client,
+                                           barge_in=False, aec=False)
+        super().__init__(language_code=language_code, streaming_replies=True, recognizer=recognizer,
+                         dialog_manager=AsyncDialogManager(client=resources.openai_client),
+                         tts=resources.tts, player=RemotePlaybackEngine(self._send_audio), source=False)
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    async def run(self):
+        try:
+            await super().run()
+        finally:
+            self.player.stop()
+
+    def push_audio(self, frame):
+        """Frame binario del cliente (PCM16 mono 16 kHz) hacia el reconocedor."""
+        if len(frame) % 2:
+            frame = frame[:-1]
+        if frame:
+            self.stt.audio.push(frame)
+
+    async def on_control(self, message):
+        """Mensaje de texto del cliente."""
+        kind = message.get("type")
+        if kind == "cancel":
+            self.on_barge_in()
+        elif kind == "stop":
+            self.stop()
+        elif kind == "stats":
+            await self._send_event({"type": "stats", **self.server.stats()})
+
+    async def on_user_speech(self, text):
+        self.turn_started = time.perf_counter()
+        await self._send_event({"type": "transcript", "text": text})
+        if text.strip().lower() in PRACTICE_COMMANDS and self.resources.phrases:
+            self.cancel_reply()
+            self.reply_task = asyncio.create_task(self._practice(), name="reply")
+            return
+        await super().on_user_speech(text)
+
+    def report(self):
+        """El resumen de cada sesión lo imprime el servidor; con cientos de sesiones no se repite aquí."""
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    async def _reply(self, text):
+        await super()._reply(text)
+        await self._send_event({"type": "reply", "text": self.dialog_manager.context[-1]["content"],
+                                "target": self.pending_target})
+
+    async def _practice(self):
+        """Frase al azar del banco compartido, con la misma instrucción que el test de listening."""
+        phrase = random.choice(self.resources.phrases)
+        if isinstance(phrase, dict):
+            phrase = phrase.get("text", "")
+        await self._say(LISTENING_INSTRUCTIONS_TEMPLATE.format(sentence=phrase))
+        self.pending_target = phrase
+
+    async def _send_audio(self, data):
+        if self.turn_started is not None:
+            latency_ms = (time.perf_counter() - self.turn_started) * 1000
+            self.turn_started = None
+            self.server.turn_latency.add(latency_ms)
+            await self._send_event({"type": "turn", "latency_ms": round(latency_ms, 1)})
+        await self._send(data)
+
+    async def _send_event(self, event):
+        await self._send(json.dumps(event))
+
+    async def _send(self, message):
+        if self.closed:
+            return
+        try:
+            await self.websocket.send(message)
+        except ConnectionClosed:
+            self.closed = True
+            self.stop()
+
+
+class SessionServer:
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, max_sessions=SERVER_MAX_SESSIONS,
+                 stand_ins=False, language_code="en-US"):
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.language_code = language_code
+        self.resources = SharedResources(stand_ins=stand_ins)
+        self.sessions = set()
+        self.turn_latency = LatencyTracker(window=5000)
+        self.counters = {"sessions": 0, "rejected": 0}
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    async def serve(self):
+        await self.resources.load()
+        async with websockets.serve(self._handle, self.host, self.port, max_size=2 ** 20):
+            print(f"🌐 Servidor de sesiones en ws://{self.host}:{self.port} (máx. {self.max_sessions} sesiones)")
+            await asyncio.Future()
+
+    def stats(self):
+        """Métricas del proceso: CPU consumida, sesiones y latencia de turno (para el generador de carga)."""
+        return {"cpu_seconds": time.process_time(), "cpu_count": os.cpu_count(),
+                "sessions": len(self.sessions), "total_sessions": self.counters["sessions"],
+                "rejected": self.counters["rejected"], "turn_latency_ms": self.turn_latency.summary()}
+
+    def report(self):
+        latency = self.turn_latency.summary()
+        latency_text = (f" | turno p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms"
+                        if latency["count"] else "")
+        print(f"📊 Sesiones: {self.counters['sessions']} atendidas, {self.counters['rejected']} rechazadas | "
+              f"CPU {time.process_time():.1f} s{latency_text}")
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    async def _handle(self, websocket):
+        if len(self.sessions) >= self.max_sessions:
+            self.counters["rejected"] += 1
+            await websocket.close(1013, "servidor lleno")
+            return
+
+        session = ServerSession(websocket, self.resources, self, language_code=self.language_code)
+        self.sessions.add(session)
+        self.counters["sessions"] += 1
+        running = asyncio.create_task(session.run(), name="session")
+        # Si la sesión termina por su cuenta ("salir"), se cierra la conexión
+        running.add_done_callback(lambda _: asyncio.ensure_future(websocket.close()))
+        try:
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    session.push_audio(message)
+                else:
+                    try:
+                        await session.on_control(json.loads(message))
+                    except (ValueError, AttributeError):
+                        pass  # mensaje de control inválido: se ignora
+        except ConnectionClosed:
+            pass
+        finally:
+            session.closed = True
+            session.stop()
+            await asyncio.gather(running, return_exceptions=True)
+            self.sessions.discard(session)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor multi-sesión del asistente (WebSocket)")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--max-sessions", type=int, default=SERVER_MAX_SESSIONS)
+    parser.add_argument("--language", default="en-US", help="idioma del reconocimiento")
+    parser.add_argument("--stand-ins", action="store_true",
+                        help="backends locales en lugar de Google/OpenAI/ElevenLabs (pruebas de carga)")
+    args = parser.parse_args()
+
+    server = SessionServer(host=args.host, port=args.port, max_sessions=args.max_sessions,
+                           stand_ins=args.stand_ins, language_code=args.language)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    server.report()
+
+
+if __name__ == "__main__":
+    main()
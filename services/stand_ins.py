@@ -0,0 +1,238 @@
+# services/stand_ins.py
+"""
+Backends locales que reemplazan a Google STT, OpenAI y ElevenLabs en las pruebas de carga
+del servidor (services/load_generator.py). Tienen la misma interfaz async que los clientes
+reales y latencias típicas configurables, pero no llaman a ninguna API: así se mide
+cuántas sesiones aguanta el proceso (CPU, event loop, memoria) sin costo ni límites de cuota.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+import types
+
+import numpy as np
+
+from config import PLAYBACK_RATE
+from npl.dialog_context import estimate_tokens
+from tts.base import TTSProvider
+from tts.playback_engine import PlaybackEngine
+from tts.tts_cache import TTSCache, normalize_tts_text
+
+# Lo que "dicen" los alumnos simulados, en orden (el STT local no entiende el audio)
+LEARNER_UTTERANCES = (
+    "how do you say good morning in english",
+    "what is the past tense of go",
+    "can you give me an example with have been",
+    "how do i pronounce thought",
+    "what is the difference between say and tell",
+    "tell me more",
+)
+
+# Banco de frases de listening de las pruebas (en producción viene de Firestore)
+STAND_IN_PHRASES = (
+    {"id": 1, "text": "Hello, how are you?"},
+    {"id": 2, "text": "I would like a cup of coffee, please."},
+    {"id": 3, "text": "Where is the nearest train station?"},
+    {"id": 4, "text": "She has been working here for two years."},
+)
+
+
+def _response(transcript, is_final):
+    alternative = types.SimpleNamespace(transcript=transcript)
+    result = types.SimpleNamespace(is_final=is_final, alternatives=[alternative])
+    return types.SimpleNamespace(results=[result])
+
+
+class StandInSpeechClient:
+    """
+    En lugar de speech.SpeechAsyncClient: detecta la voz por energía y, por cada intervención,
+    manda un intermedio y después el final (como single_utterance) con el texto que toque
+    de LEARNER_UTTERANCES.
+    """
+
+    def __init__(self, interim_after_ms=300, final_silence_ms=500, final_delay_ms=150, threshold=500):
+        self.interim_after_ms = interim_after_ms
+        self.final_silence_ms = final_silence_ms
+        self.final_delay = final_delay_ms / 1000
+        self.threshold = threshold
+        self.calls = 0
+
+    async def streaming_recognize(self, requests):
+        self.calls += 1
+        audio = asyncio.Queue()
+
+        async def consume():
+            try:
+                async for request in requests:
+                    if getattr(request, "audio_content", None):
+                        audio.put_nowait(request.audio_content)
+            finally:
+                audio.put_nowait(None)
+
+        reader = asyncio.create_task(consume())
+        return self._responses(audio, reader, LEARNER_UTTERANCES[self.calls % len(LEARNER_UTTERANCES)])
+
+    async def _responses(self, audio, reader, transcript):
+        speech_ms = silence_ms = 0.0
+        try:
+            while (chunk := await audio.get()) is not None:
+                samples = np.frombuffer(chunk[:len(chunk) // 2 * 2], dtype=np.int16).astype(np.float32)
+                if not samples.size:
+                    continue
+                chunk_ms = samples.size / 16
+                if np.sqrt(np.mean(samples * samples)) >= self.threshold:
+                    if speech_ms < self.interim_after_ms <= speech_ms + chunk_ms:
+                        yield _response(transcript, False)
+                    speech_ms += chunk_ms
+                    silence_ms = 0.0
+                elif speech_ms >= self.interim_after_ms:
+                    silence_ms += chunk_ms
+                    if silence_ms >= self.final_silence_ms:
+                        break
+            if speech_ms >= self.interim_after_ms:
+                await asyncio.sleep(self.final_delay)
+                yield _response(transcript, True)
+        finally:
+            reader.cancel()
+
+
+class _StandInStream:
+    """Respuesta en streaming de chat.completions: tokens de a uno a tokens_per_second."""
+
+    def __init__(self, text, first_token_s, tokens_per_second):
+        self.text = text
+        self.first_token_s = first_token_s
+        self.token_s = 1 / tokens_per_second
+        self.closed = False
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.first_token_s)
+        words = self.text.split(" ")
+        for i, word in enumerate(words):
+            if self.closed:
+                return
+            delta = types.SimpleNamespace(content=word if i == len(words) - 1 else word + " ")
+            yield types.SimpleNamespace(usage=None, choices=[types.SimpleNamespace(delta=delta)])
+            await asyncio.sleep(self.token_s)
+        usage = types.SimpleNamespace(prompt_tokens=len(self.text) // 4, completion_tokens=len(words))
+        yield types.SimpleNamespace(usage=usage, choices=[])
+
+    async def close(self):
+        self.closed = True
+
+
+class _StandInCompletions:
+    def __init__(self, first_token_ms, tokens_per_second, prefill_ms_per_1k):
+        self.first_token_s = first_token_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.prefill_s_per_token = prefill_ms_per_1k / 1000 / 1000
+
+    async def create(self, model, messages, temperature=0.7, stream=False, max_tokens=None, **options):
+        question = messages[-1]["content"]
+        if max_tokens:
+            # Resumen (DialogManager._summarize): texto plano con el final de lo pedido, acotado a max_tokens
+            text = " ".join(question.split()[-(max_tokens * 3 // 4):])
+        else:
+            text = json.dumps({
+                "reply": f"Good question! You asked: {question}. Let's practice it together. "
+                         f"Repeat after me and try to say it slowly.",
+                "frase_objetivo": "Let's practice it together.",
+            })
+        # Como en la API real, la primera palabra tarda más cuanto más largo es el prompt
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        first_token_s = self.first_token_s + prompt_tokens * self.prefill_s_per_token
+        if stream:
+            return _StandInStream(text, first_token_s, self.tokens_per_second)
+        await asyncio.sleep(first_token_s + len(text.split(" ")) / self.tokens_per_second)
+        message = types.SimpleNamespace(content=text)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+class StandInOpenAI:
+    """
+    En lugar de openai.AsyncOpenAI: primera palabra a los first_token_ms (más prefill_ms_per_1k
+    por cada 1000 tokens de prompt) y luego tokens_per_second.
+    """
+
+    def __init__(self, first_token_ms=350, tokens_per_second=60, prefill_ms_per_1k=20):
+        self.chat = types.SimpleNamespace(
+            completions=_StandInCompletions(first_token_ms, tokens_per_second, prefill_ms_per_1k))
+
+
+class StandInTTS(TTSProvider):
+    """
+    En lugar de ElevenLabs: PCM sintético (~14 caracteres por segundo de audio) que empieza a
+    llegar a los first_byte_ms. Pasa por una TTSCache propia, así que los textos repetidos
+    (bienvenida, frases del banco) salen de caché como con el proveedor real.
+    speak() lo reproduce en el PlaybackEngine, así que también sirve en el asistente síncrono.
+    """
+
+    name = "stand-in"
+
+    def __init__(self, sample_rate=PLAYBACK_RATE, first_byte_ms=200, chunk_ms=100, cache=None, player=None):
+        """player: PlaybackEngine de speak() (por defecto el compartido, que se crea recién al usarlo)"""
+        self.sample_rate = sample_rate
+        self.first_byte_s = first_byte_ms / 1000
+        self.chunk = int(sample_rate * chunk_ms / 1000)
+        self.cache = cache or TTSCache(cache_dir=os.path.join(tempfile.gettempdir(), "stand_in_tts_cache"))
+        self.player = player
+
+    def normalize_text(self, text):
+        return normalize_tts_text(text)
+
+    def cached_pcm(self, text):
+        audio = self.cache.get(self._key(text))
+        return None if audio is None else np.frombuffer(audio, dtype=np.int16)
+
+    def stream_pcm(self, text, cancel_event=None):
+        time.sleep(self.first_byte_s)
+        pcm = self._synthesize(text)
+        for start in range(0, pcm.size, self.chunk):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            yield pcm[start:start + self.chunk].tobytes()
+        self.cache.put(self._key(text), pcm.tobytes(), ext="pcm")
+
+    async def astream_pcm(self, text):
+        await asyncio.sleep(self.first_byte_s)
+        pcm = self._synthesize(text)
+        for start in range(0, pcm.size, self.chunk):
+            yield pcm[start:start + self.chunk].tobytes()
+            await asyncio.sleep(0)
+        self.cache.put(self._key(text), pcm.tobytes(), ext="pcm")
+
+    def speak(self, text):
+        """Reproduce el texto desde caché o a medida que sale de stream_pcm, como ElevenLabsTTS.speak_streaming."""
+        if not text.strip():
+            return
+        player = self.player or PlaybackEngine.instance()
+        pcm = self.cached_pcm(text)
+        if pcm is not None or self.sample_rate != player.sample_rate:
+            if pcm is None:
+                pcm = np.frombuffer(b"".join(self.stream_pcm(text)), dtype=np.int16)
+            player.play(pcm, sample_rate=self.sample_rate, label=text[:30])
+            return
+
+        utterance = player.open_stream(label=text[:30])
+        chunks = self.stream_pcm(text)
+        try:
+            for chunk in chunks:
+                if utterance.cancelled:
+                    break
+                utterance.write(chunk)
+        finally:
+            chunks.close()
+            utterance.close()
+        utterance.wait()
+        player.report(utterance)
+
+    def _key(self, text):
+        return self.cache.make_key(self.normalize_text(text), provider=self.name, sample_rate=self.sample_rate)
+
+    def _synthesize(self, text):
+        seconds = max(0.5, len(text) / 14)
+        t = np.arange(int(seconds * self.sample_rate)) / self.sample_rate
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)   # "sílabas" a 4 Hz
+        return (np.sin(2 * np.pi * 180 * t) * envelope * 3000).astype(np.int16)
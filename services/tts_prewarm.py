@@ -0,0 +1,198 @@
+# services/tts_prewarm.py
+"""
+Pre-calienta la caché de TTS con todo lo que el asistente dice de forma predecible
+(banco de frases de listening y textos fijos), para que la primera vez que un alumno
+lo escuche no haya que sintetizarlo en vivo.
+
+Uso:
+    python -m services.tts_prewarm --workers 4 --rps 2
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import ELEVEN_COST_PER_1K_CHARS, TTS_CHUNK_MAX_CHARS
+from npl.listening_test import LISTENING_INSTRUCTIONS_TEMPLATE
+from npl.sentence_splitter import split_long_text
+from services.initial_test.initial_test_flow import WELCOME_TEXT
+from tts.segment_composer import split_template
+
+
+class RateLimiter:
+    """
+    Token bucket compartido entre hilos. Si el proveedor responde 429,
+    reduce la tasa a la mitad (y la recupera de a poco con cada éxito).
+    """
+
+    def __init__(self, rate_per_second, min_rate=0.2):
+        self.max_rate = rate_per_second
+        self.min_rate = min_rate
+        self.rate = rate_per_second
+        self.throttled = 0   # respuestas 429 recibidas (se cuentan bajo el lock: llegan de varios hilos)
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_throttled(self, retry_after=None):
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._next_slot = max(self._next_slot, time.monotonic() + retry_after)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 0.05 * self.max_rate)
+
+
+class TTSPrewarmer:
+    def __init__(self, tts, max_workers=4, requests_per_second=2.0, max_retries=4,
+                 cost_per_1k_chars=ELEVEN_COST_PER_1K_CHARS):
+        """
+        tts: backend con normalize_text(), is_cached(text, fmt) y synthesize(text, fmt)
+        max_workers: síntesis concurrentes como máximo
+        requests_per_second: tasa inicial de peticiones al proveedor
+        max_retries: reintentos por texto ante 429 o errores transitorios
+        cost_per_1k_chars: costo estimado por cada 1000 caracteres sintetizados
+        """
+        self.tts = tts
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.cost_per_1k_chars = cost_per_1k_chars
+
+    def run(self, jobs):
+        """
+        Sintetiza a la caché todo lo que falte y devuelve un resumen.
+        jobs: textos o tuplas (texto, output_format); None usa el formato por defecto del backend.
+        """
+        unique = {}
+        for job in jobs:
+            text, output_format = job if isinstance(job, tuple) else (job, None)
+            if text and text.strip():
+                unique.setdefault((self.tts.normalize_text(text), output_format), (text, output_format))
+
+        pending = [job for job in unique.values() if not self.tts.is_cached(*job)]
+        summary = {
+            "total": len(unique),
+            "skipped": len(unique) - len(pending),
+            "synthesized": 0,
+            "failed": 0,
+            "throttled": 0,
+            "chars": 0,
+            "bytes": 0,
+        }
+        print(f"🔥 Prewarm TTS: {len(unique)} textos, {summary['skipped']} ya en caché, {len(pending)} por sintetizar")
+
+        start = time.perf_counter()
+        throttled = self.limiter.throttled
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts-prewarm") as executor:
+            futures = {executor.submit(self._synthesize, job): job[0] for job in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                text = futures[future]
+                try:
+                    audio = future.result()
+                    summary["synthesized"] += 1
+                    summary["chars"] += len(text)
+                    summary["bytes"] += len(audio)
+                except Exception as e:
+                    summary["failed"] += 1
+                    print(f"❌ Error sintetizando '{text[:40]}': {e}")
+                if done % 10 == 0 or done == len(pending):
+                    print(f"   {done}/{len(pending)}")
+        summary["throttled"] = self.limiter.throttled - throttled
+        summary["seconds"] = time.perf_counter() - start
+        summary["cost"] = summary["chars"] / 1000 * self.cost_per_1k_chars
+        self.print_summary(summary)
+        return summary
+
+    def print_summary(self, summary):
+        seconds = summary["seconds"] or 1e-9
+        print("📊 Resumen prewarm TTS")
+        print(f"   Sintetizados: {summary['synthesized']}  |  En caché: {summary['skipped']}  |  Fallidos: {summary['failed']}")
+        print(f"   Throughput: {summary['synthesized'] / seconds:.2f} textos/s, "
+              f"{summary['chars'] / seconds:.0f} caracteres/s, {summary['bytes'] / 1024 / seconds:.0f} KB/s")
+        print(f"   Respuestas 429: {summary['throttled']}  |  Tasa final: {self.limiter.rate:.2f} req/s")
+        print(f"   Caracteres: {summary['chars']}  |  Costo estimado: ${summary['cost']:.2f}")
+
+    def _synthesize(self, job):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                audio = self.tts.synthesize(*job)
+                self.limiter.on_success()
+                return audio
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if attempt == self.max_retries or (status is not None and status != 429 and status < 500):
+                    raise
+                retry_after = _retry_after(e)
+                if status == 429:
+                    self.limiter.on_throttled(retry_after)
+                time.sleep(retry_after or (2 ** attempt + random.random()))
+
+
+def _retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def collect_prewarm_texts(firestore, segment_format=None):
+    """
+    Textos fijos del asistente + instrucciones de listening para cada frase del banco.
+    Con segment_format (el PCM que lee el pipeline), las instrucciones se precalientan como
+    segmentos (prefijo fijo una vez y cada frase por separado), que es como las reproduce
+    speak_template(), y la bienvenida en los mismos trozos que reproduce como respuesta larga.
+    """
+    jobs = [(chunk, segment_format) for chunk in split_long_text(WELCOME_TEXT, max_chars=TTS_CHUNK_MAX_CHARS)]
+    for phrase in firestore.get_all_listening_phrases():
+        if isinstance(phrase, dict):
+            phrase = phrase.get("text", "")
+        if not phrase:
+            continue
+        if segment_format:
+            for segment, _ in split_template(LISTENING_INSTRUCTIONS_TEMPLATE, sentence=phrase):
+                jobs.append((segment, segment_format))
+        else:
+            jobs.append((LISTENING_INSTRUCTIONS_TEMPLATE.format(sentence=phrase), None))
+    return jobs
+
+
+def main():
+    from db.firebase_db import FirebaseDB
+    from tts.eleven_tts import ElevenLabsTTS
+
+    parser = argparse.ArgumentParser(description="Pre-calienta la caché de TTS")
+    parser.add_argument("--workers", type=int, default=4, help="síntesis concurrentes")
+    parser.add_argument("--rps", type=float, default=2.0, help="peticiones por segundo al proveedor")
+    parser.add_argument("--dry-run", action="store_true", help="solo contar lo que falta sintetizar")
+    args = parser.parse_args()
+
+    tts = ElevenLabsTTS()
+    texts = collect_prewarm_texts(FirebaseDB(), segment_format=tts.pcm_format)
+    if args.dry_run:
+        missing = {job for job in texts if not tts.is_cached(*job)}
+        chars = sum(len(text) for text, _ in missing)
+        print(f"Faltan {len(missing)} de {len(texts)} textos ({chars} caracteres, "
+              f"~${chars / 1000 * ELEVEN_COST_PER_1K_CHARS:.2f})")
+        return
+
+    TTSPrewarmer(tts, max_workers=args.workers, requests_per_second=args.rps).run(texts)
+    tts.cache.flush_index()
+
+
+if __name__ == "__main__":
+    main()
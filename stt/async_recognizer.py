@@ -0,0 +1,270 @@
+# stt/async_recognizer.py
+import asyncio
+import itertools
+import random
+import time
+
+from google.cloud import speech
+
+from config import STT_STREAM_MAX_SECONDS, STT_STREAM_HARD_SECONDS, STT_STREAM_REPLAY_MS
+from config import STT_RECONNECT_BASE_MS, STT_RECONNECT_MAX_MS
+from stt.speech_recognition import SpeechRecognizer
+from utils.audio_bridge import AudioBridge
+from utils.latency_tracker import LatencyTracker
+from utils.message_bus import Transcript
+
+
+class _AsyncStream:
+    """Estado de una llamada streaming_recognize del cliente async (lo que usa _handle_response)."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.id = next(self._ids)
+        self.opened_at = time.monotonic()
+        self.first_response_at = None
+        self.endpoint = None     # (fired_at, transcript) si el turno se cerró localmente en este stream
+        self.draining = False    # ya no se envía audio: solo se esperan sus últimos finales
+        self.reason = None       # por qué dejó de enviarse audio: turn, rotation, end o stop
+        self.sent_bytes = 0
+
+    def age(self, rate):
+        """Segundos del stream: el mayor entre el tiempo real y el audio enviado."""
+        return max(time.monotonic() - self.opened_at, self.sent_bytes / 2 / rate)
+
+
+class AsyncSpeechRecognizer(SpeechRecognizer):
+    """
+    El reconocedor de SpeechRecognizer (VAD, endpointing local, barge-in, AEC) sobre asyncio:
+    - El audio llega por un AudioBridge (el callback de sounddevice lo alimenta con
+      push_threadsafe, un servidor con push) en vez del buffer circular y su hilo.
+    - Cada stream es una llamada de speech.SpeechAsyncClient: el primer mensaje lleva la
+      configuración y luego el audio, todo desde el event loop, sin hilos por stream.
+    - Rotación antes del límite de ~305 s de Google (en silencio o sí o sí en hard_seconds)
+      reenviando los últimos replay_ms, y reconexión con espera exponencial con jitter, como
+      StreamManager (sin stream de reserva: abrir la llamada async no bloquea a nadie).
+    Los finales se publican en la cola asyncio `transcripts` (Transcript del bus).
+    El audio viaja como LINEAR16 (la compresión de StreamEncoder usa un proceso y un hilo por stream).
+    """
+
+    def __init__(self, language_code="en-US", rate=16000, chunk_duration_ms=100, client=None, audio=None,
+                 max_seconds=STT_STREAM_MAX_SECONDS, hard_seconds=STT_STREAM_HARD_SECONDS,
+                 replay_ms=STT_STREAM_REPLAY_MS, backoff_base_ms=STT_RECONNECT_BASE_MS,
+                 backoff_max_ms=STT_RECONNECT_MAX_MS, **options):
+        """
+        client: SpeechAsyncClient compartido (un canal gRPC para todas las sesiones del proceso)
+        audio: AudioBridge del que se lee el audio (por defecto uno nuevo)
+        options: use_vad, endpointing, barge_in y aec, igual que en SpeechRecognizer
+        """
+        super().__init__(language_code=language_code, rate=rate, chunk_duration_ms=chunk_duration_ms,
+                         encoding="LINEAR16", client=client or speech.SpeechAsyncClient(), **options)
+        self.audio = audio or AudioBridge()
+        self.transcripts = asyncio.Queue()
+        self.max_seconds = max_seconds
+        self.hard_seconds = max(hard_seconds, max_seconds)
+        self.replay_bytes = int(rate * replay_ms / 1000) * 2
+        self.backoff_base = backoff_base_ms / 1000
+        self.backoff_max = backoff_max_ms / 1000
+        self._recent = bytearray()   # últimos replay_ms enviados (para la costura)
+        self._failures = 0
+        self.first_result = LatencyTracker()
+        self.stream_stats = {"streams": 0, "turns": 0, "rotations": 0, "reconnects": 0, "errors": 0,
+                             "replayed_ms": 0.0}
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def sink(self, samples):
+        """Recibe la captura (p. ej. MicrophoneSource.open) desde el hilo de audio: AEC y al loop."""
+        if self.aec:
+            samples = self.aec.process(samples)
+        self.audio.push_threadsafe(samples)
+
+    async def run(self):
+        """Reconoce hasta stop() o hasta que se agote el audio; siempre hay un stream activo."""
+        if self.audio.loop is None:
+            self.audio.bind()
+        self.running = True
+        streaming_config = self._streaming_config()
+        reason = "start"
+        try:
+            while self.running:
+                if self._failures:
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** (self._failures - 1))
+                    delay *= random.uniform(0.5, 1.0)
+                    print(f"🔁 Reconectando STT en {delay * 1000:.0f} ms (intento {self._failures})")
+                    await asyncio.sleep(delay)
+                if reason in ("start", "turn") and self.endpointer:
+                    self.endpointer.reset()  # una rotación no es un turno nuevo
+                replay = self._replay() if reason in ("rotation", "error") else b""
+                reason = await self._recognize(streaming_config, replay)
+                if reason in ("end", "stop"):
+                    break
+        finally:
+            self.running = False
+            self.report()
+
+    def stop(self):
+        """Termina el reconocimiento: el stream en curso se cierra con lo ya enviado."""
+        self.running = False
+        self.audio.close()
+
+    def report(self):
+        stats = self.stream_stats
+        first = self.first_result.summary()
+        first_text = f" | primer resultado p50 {first['p50']:.0f} ms" if first["count"] else ""
+        print(f"📊 Streams STT (async): {stats['streams']} abiertos, {stats['turns']} turnos, "
+              f"{stats['rotations']} rotaciones, {stats['reconnects']} reconexiones | "
+              f"{stats['replayed_ms']:.0f} ms reenviados | {self.audio.stats['dropped']} bloques descartados"
+              f"{first_text}")
+        if self.aec:
+            self.aec.report()
+        if self.vad:
+            self.vad.report()
+        if self.endpointer:
+            self.endpointer.report()
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _setup_capture(self, source, chunk_duration_ms):
+        """Sin fuente ni buffer circular propios: el audio llega por self.audio (ver sink)."""
+        self.source = None
+        self.ring = None
+
+    async def _recognize(self, streaming_config, replay):
+        """Una llamada streaming_recognize completa. Devuelve el motivo por el que terminó."""
+        stream = _AsyncStream()
+        self.stream_stats["streams"] += 1
+        try:
+            responses = await self.client.streaming_recognize(
+                requests=self._requests(stream, streaming_config, replay))
+            async for response in responses:
+                if stream.first_response_at is None:
+                    stream.first_response_at = time.monotonic()
+                    self.first_result.add((stream.first_response_at - stream.opened_at) * 1000)
+                self._failures = 0
+                if self._handle_response(stream, response):
+                    # Final del turno: se deja de enviar audio (half-close) y Google cierra la llamada
+                    stream.draining = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not self.running:
+                return "stop"
+            self.stream_stats["errors"] += 1
+            self.stream_stats["reconnects"] += 1
+            self._failures += 1
+            print(f"\n⚠️ Error en streaming STT: {e}")
+            return "error"
+
+        reason = stream.reason or ("stop" if not self.running else "turn")
+        if reason in ("turn", "end"):
+            self.stream_stats["turns"] += 1
+        elif reason == "rotation":
+            self.stream_stats["rotations"] += 1
+            print(f"🔄 Rotando stream STT #{stream.id} a los {stream.age(self.rate):.0f} s")
+        return reason
+
+    async def _requests(self, stream, streaming_config, replay):
+        """Mensajes de la llamada: primero la configuración, después la costura y el audio."""
+        yield speech.StreamingRecognizeRequest(streaming_config=streaming_config)
+        if replay:
+            yield speech.StreamingRecognizeRequest(audio_content=replay)
+        async for audio in self._audio_chunks(stream):
+            stream.sent_bytes += len(audio)
+            self._remember(audio)
+            yield speech.StreamingRecognizeRequest(audio_content=audio)
+            if self._should_rotate(stream):
+                stream.reason = "rotation"
+                return
+
+    async def _audio_chunks(self, stream):
+        """
+        Versión async de SpeechRecognizer._audio_generator: el mismo manejo de VAD, barge-in,
+        pausa durante el TTS y endpointing, leyendo del AudioBridge.
+        """
+        silence_chunk = b"\x00" * self.chunk_size * 2  # 2 bytes por sample para int16
+        while self.running and not stream.draining:
+            chunk = await self.audio.get(timeout=0.2)
+
+            if chunk and self.barge_in:
+                if self.pause_processing:
+                    window = self._check_barge_in(chunk)
+                    if window is not None:
+                        chunk = window  # incluye el inicio de la voz, no solo el último chunk
+                else:
+                    self.barge_in.reset()
+
+            if self.pause_processing:
+                if self.endpointer:
+                    self.endpointer.reset()
+                if self.vad:
+                    # Mientras habla el TTS no se envía audio, solo keepalives espaciados
+                    self.vad.reset()
+                    self.vad.skip(len(chunk) if chunk else len(silence_chunk))
+                    audio = self.vad.keepalive()
+                else:
+                    audio = [silence_chunk]
+            elif chunk is None:
+                if self.audio.exhausted():
+                    stream.reason = "end" if self.running else "stop"
+                    return
+                audio = self.vad.keepalive() if self.vad else []
+            else:
+                audio = self.vad.process(chunk) if self.vad else [chunk]
+                if self.endpointer and self._end_of_turn(chunk, stream):
+                    if audio:
+                        yield b"".join(audio)
+                    stream.reason = "turn"
+                    return
+
+            if audio:
+                yield b"".join(audio)
+
+    def _should_rotate(self, stream):
+        age = stream.age(self.rate)
+        if age < self.max_seconds:
+            return False
+        speaking = self.vad.in_speech if self.vad else bool(self.endpointer and self.endpointer.transcript)
+        return not speaking or age >= self.hard_seconds
+
+    def _remember(self, audio):
+        self._recent += audio
+        if len(self._recent) > self.replay_bytes:
+            del self._recent[:len(self._recent) - self.replay_bytes]
+
+    def _replay(self):
+        """Últimos replay_ms enviados: el stream nuevo vuelve a oír la palabra que quedó en la costura."""
+        replay = bytes(self._recent)
+        self.stream_stats["replayed_ms"] += len(replay) / 2 / self.rate * 1000
+        return replay
+
+    def _deliver_final(self, transcript, source):
+        """Los finales (de Google o del endpointing local) van a la cola asyncio del núcleo."""
+        self.transcripts.put_nowait(Transcript(transcript, is_final=True, source=source))
+
+
+if __name__ == "__main__":
+    # Prueba manual: reconocer el micrófono desde asyncio e imprimir los finales
+    from stt.audio_source import MicrophoneSource
+
+    async def main():
+        recognizer = AsyncSpeechRecognizer(language_code="es-CL")
+        recognizer.audio.bind()
+        capture = MicrophoneSource().open(recognizer.sink)
+        recognition = asyncio.create_task(recognizer.run())
+        try:
+            while True:
+                transcript = await recognizer.transcripts.get()
+                print(f"\n🗣️ {transcript.text}")
+        finally:
+            recognizer.stop()
+            await recognition
+            capture.stop()
+            capture.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
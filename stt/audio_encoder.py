@@ -0,0 +1,233 @@
+# stt/audio_encoder.py
+import argparse
+import os
+import queue
+import resource
+import shutil
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from config import STT_ENCODING, STT_OPUS_BITRATE
+
+ENCODINGS = ("LINEAR16", "FLAC", "OGG_OPUS")
+
+# Argumentos de salida de ffmpeg por codificación. Frames cortos y páginas/paquetes vaciados
+# de inmediato: cada trozo comprimido sale apenas se codifica, sin esperar a llenar buffers.
+_FFMPEG_OUTPUT = {
+    "FLAC": ["-c:a", "flac", "-frame_size", "1600", "-compression_level", "5", "-f", "flac"],
+    "OGG_OPUS": ["-c:a", "libopus", "-b:a", str(STT_OPUS_BITRATE), "-application", "voip",
+                 "-frame_duration", "20", "-page_duration", "20000", "-f", "ogg"],
+}
+
+
+def usable_encoding(encoding):
+    """La codificación pedida si se puede usar aquí; si falta ffmpeg, LINEAR16 (con aviso)."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Codificación STT desconocida: {encoding} (opciones: {', '.join(ENCODINGS)})")
+    if encoding != "LINEAR16" and not shutil.which("ffmpeg"):
+        print(f"⚠️ No se encontró ffmpeg: el audio a Google STT viaja como LINEAR16 en vez de {encoding}")
+        return "LINEAR16"
+    return encoding
+
+
+class StreamEncoder:
+    """
+    Codifica en streaming el PCM16 mono de la captura al formato que se envía a Google STT.
+    - LINEAR16: pasa el PCM tal cual.
+    - FLAC / OGG_OPUS: un proceso ffmpeg por stream (cada stream de Google necesita sus propias
+      cabeceras) que recibe PCM por stdin; un hilo lee la salida comprimida a medida que aparece.
+    write() no espera a la codificación, salvo que haya max_pending trozos sin enviar: así un
+    archivo que se lee más rápido que tiempo real avanza al ritmo que acepta Google.
+    """
+
+    def __init__(self, encoding=STT_ENCODING, rate=16000, max_pending=32):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Codificación STT desconocida: {encoding} (opciones: {', '.join(ENCODINGS)})")
+        self.encoding = encoding
+        self.rate = rate
+        self.stats = {"bytes_in": 0, "bytes_out": 0}
+        self._output = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._process = None
+        if encoding != "LINEAR16":
+            self._process = self._start_ffmpeg()
+            threading.Thread(target=self._read_output, daemon=True).start()
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def write(self, pcm):
+        """Agrega PCM16 (bytes o memoryview) al stream."""
+        if self._closed or not pcm:
+            return
+        self.stats["bytes_in"] += len(pcm)
+        if self._process is None:
+            data = bytes(pcm)
+            self.stats["bytes_out"] += len(data)
+            self._output.put(data)
+            return
+        try:
+            self._process.stdin.write(pcm)
+            self._process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            self._closed = True
+
+    def read(self, timeout=None):
+        """
+        Próximo trozo codificado. Devuelve b"" si no hubo salida en timeout segundos
+        y None cuando el stream terminó (después de close()).
+        """
+        try:
+            return self._output.get(timeout=timeout)
+        except queue.Empty:
+            return b""
+
+    def close(self):
+        """Fin del audio: ffmpeg vacía lo pendiente y read() termina devolviendo None."""
+        if self._closed and self._process is None:
+            return
+        self._closed = True
+        if self._process is None:
+            self._output.put(None)
+            return
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    def abort(self):
+        """El stream murió y nadie va a leer más: descarta lo pendiente y libera a quien espere."""
+        self._closed = True
+        with self._output.mutex:
+            self._output.queue.clear()
+            self._output.not_full.notify_all()
+        if self._process is None:
+            self._output.put(None)
+        elif self._process.poll() is None:
+            self._process.kill()
+
+    def encode_all(self, pcm, chunk_bytes=3200):
+        """Codifica un audio completo en trozos (como llegaría de la captura) y devuelve el resultado."""
+        parts = []
+        reader = threading.Thread(target=lambda: parts.extend(iter(self.read, None)), daemon=True)
+        reader.start()
+        for start in range(0, len(pcm), chunk_bytes):
+            self.write(pcm[start:start + chunk_bytes])
+        self.close()
+        reader.join()
+        return b"".join(parts)
+
+    def ratio(self):
+        """Bytes enviados por cada byte de PCM."""
+        return self.stats["bytes_out"] / self.stats["bytes_in"] if self.stats["bytes_in"] else 1.0
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _start_ffmpeg(self):
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise RuntimeError(f"Se necesita ffmpeg para enviar audio {self.encoding} a Google STT")
+        command = [ffmpeg, "-loglevel", "error", "-fflags", "nobuffer", "-probesize", "32",
+                   "-f", "s16le", "-ar", str(self.rate), "-ac", "1", "-i", "pipe:0",
+                   *_FFMPEG_OUTPUT[self.encoding], "-flush_packets", "1", "pipe:1"]
+        return subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                bufsize=0)
+
+    def _read_output(self):
+        fd = self._process.stdout.fileno()
+        try:
+            while data := os.read(fd, 65536):
+                self.stats["bytes_out"] += len(data)
+                self._output.put(data)
+        finally:
+            self._process.stdout.close()
+            self._process.wait()
+            self._output.put(None)
+
+
+# -----------------------------
+# Benchmark offline
+# -----------------------------
+def _load_wav(path, rate):
+    from tts.audio_decoder import decode_to_pcm
+    with open(path, "rb") as f:
+        return decode_to_pcm(f.read(), "wav", rate).tobytes()
+
+
+def _transcribe(client, audio, encoding, rate, language_code):
+    from google.cloud import speech
+    config = speech.RecognitionConfig(encoding=getattr(speech.RecognitionConfig.AudioEncoding, encoding),
+                                      sample_rate_hertz=rate, language_code=language_code)
+    response = client.recognize(config=config, audio=speech.RecognitionAudio(content=audio))
+    return " ".join(r.alternatives[0].transcript.strip() for r in response.results if r.alternatives)
+
+
+def _word_agreement(reference, hypothesis):
+    """Fracción de palabras del transcript de referencia que coinciden en orden (1 - distancia de edición relativa)."""
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    if not ref:
+        return 1.0 if not hyp else 0.0
+    previous = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        current = [i]
+        for j, other in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other)))
+        previous = current
+    return max(0.0, 1 - previous[-1] / len(ref))
+
+
+def benchmark(paths, rate=16000, language_code="es-CL", transcribe=True):
+    """
+    Para cada grabación WAV y cada codificación mide bytes/s enviados, CPU de codificación
+    (tiempo de CPU del proceso ffmpeg) y, si transcribe, compara el transcript de Google
+    con el de LINEAR16 (acuerdo por palabras).
+    """
+    client = None
+    if transcribe:
+        from google.cloud import speech
+        client = speech.SpeechClient()
+
+    print(f"🧪 Benchmark de codificación STT: {len(paths)} grabaciones a {rate} Hz")
+    totals = {encoding: {"seconds": 0.0, "bytes": 0, "cpu_ms": 0.0, "agreement": []} for encoding in ENCODINGS}
+    for path in paths:
+        pcm = _load_wav(path, rate)
+        seconds = len(pcm) / 2 / rate
+        reference = None
+        for encoding in ENCODINGS:
+            before = resource.getrusage(resource.RUSAGE_CHILDREN)
+            start = time.process_time()
+            audio = StreamEncoder(encoding, rate).encode_all(pcm)
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu_ms = ((after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime)
+                      + (time.process_time() - start)) * 1000
+            total = totals[encoding]
+            total["seconds"] += seconds
+            total["bytes"] += len(audio)
+            total["cpu_ms"] += cpu_ms
+            if client:
+                transcript = _transcribe(client, audio, encoding, rate, language_code)
+                if reference is None:
+                    reference = transcript  # LINEAR16 va primero
+                total["agreement"].append(_word_agreement(reference, transcript))
+                print(f"   {os.path.basename(path)} [{encoding}] {transcript}")
+
+    for encoding, total in totals.items():
+        seconds = total["seconds"] or 1
+        agreement = (f" | acuerdo con LINEAR16 {np.mean(total['agreement']):.0%}"
+                     if total["agreement"] else "")
+        print(f"   {encoding:9s} {total['bytes'] / seconds / 1024:6.1f} KB/s "
+              f"({total['bytes'] * 8 / seconds / 1000:5.1f} kbit/s) | "
+              f"CPU {total['cpu_ms'] / seconds:5.1f} ms por s de audio{agreement}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara LINEAR16, FLAC y OGG_OPUS para Google STT")
+    parser.add_argument("wavs", nargs="+", help="grabaciones WAV de alumnos")
+    parser.add_argument("--language", default="es-CL", help="idioma de las grabaciones")
+    parser.add_argument("--sin-transcripcion", action="store_true", help="solo bytes/s y CPU (sin llamar a Google)")
+    args = parser.parse_args()
+    benchmark(args.wavs, language_code=args.language, transcribe=not args.sin_transcripcion)
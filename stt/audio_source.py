@@ -0,0 +1,204 @@
+# stt/audio_source.py
+import os
+import shutil
+import subprocess
+import time
+import wave
+
+import numpy as np
+
+from config import AUDIO_CAPTURE_NATIVE, AUDIO_INPUT_DEVICE
+from utils.audio_utils import AudioUtils
+from utils.resampler import StreamingResampler
+
+
+class AudioSource:
+    """
+    Origen del audio que reconoce SpeechRecognizer: entrega PCM16 mono a `rate` a un sink.
+    - realtime = True (micrófono): el audio llega a su ritmo y el sink nunca debe bloquear.
+    - realtime = False (archivo, buffer): se entrega tan rápido como lo consume el reconocedor
+      (el sink bloquea cuando el buffer de captura está lleno) y run() termina al agotarse.
+    """
+
+    realtime = False
+
+    def __init__(self, rate=16000, block_ms=100):
+        self.rate = rate
+        self.block = int(rate * block_ms / 1000)
+        self.samples = 0   # muestras entregadas (a `rate`)
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    @property
+    def seconds(self):
+        return self.samples / self.rate
+
+    def run(self, sink, stop_event):
+        """Entrega bloques int16 a sink(samples) hasta agotarse o hasta stop_event.set()."""
+        raise NotImplementedError
+
+    def _deliver(self, sink, samples):
+        if samples.size:
+            self.samples += samples.size
+            sink(samples)
+
+
+class MicrophoneSource(AudioSource):
+    """Micrófono en su formato nativo, remuestreado a rate mono (ver StreamingResampler)."""
+
+    realtime = True
+
+    def __init__(self, rate=16000, block_ms=100, device=AUDIO_INPUT_DEVICE, native=AUDIO_CAPTURE_NATIVE):
+        super().__init__(rate, block_ms)
+        self.device = device
+        self.native = native
+
+    def run(self, sink, stop_event):
+        stream = self.open(sink, stop_event)
+        try:
+            # Espera sin polling hasta stop() o pause()
+            stop_event.wait()
+        finally:
+            stream.stop()
+            stream.close()
+
+    def open(self, sink, stop_event=None):
+        """
+        Abre y arranca la captura sin bloquear: sink recibe cada bloque desde el callback de
+        audio (p. ej. para llevarlo a un event loop). Devuelve el InputStream; cerrarlo con
+        stop() y close().
+        """
+        # Import diferido: las demás fuentes y el servidor no necesitan dispositivo de audio
+        import sounddevice as sd
+        if self.native:
+            device_rate, channels = AudioUtils.native_input_format(self.device)
+        else:
+            device_rate, channels = self.rate, 1
+        resampler = StreamingResampler(device_rate, self.rate, channels)
+        print(f" 🎧 Captura de audio iniciada ({device_rate} Hz, {channels} canal(es))...")
+
+        def callback(indata, frames, time, status):
+            if stop_event is not None and stop_event.is_set():
+                raise sd.CallbackStop()
+            self._deliver(sink, resampler.process(indata))
+
+        stream = sd.InputStream(device=self.device, channels=channels, samplerate=device_rate, callback=callback,
+                                blocksize=int(self.block * device_rate / self.rate), dtype="int16")
+        stream.start()
+        return stream
+
+
+class BufferSource(AudioSource):
+    """
+    Audio ya en memoria (bytes PCM16 o array int16, mono o frames x canales) a source_rate,
+    p. ej. para volver a pasar una sesión grabada.
+    """
+
+    def __init__(self, pcm, source_rate=16000, channels=1, rate=16000, block_ms=100, max_speed=None):
+        """max_speed: límite opcional en veces tiempo real (None = tan rápido como se consuma)"""
+        super().__init__(rate, block_ms)
+        if isinstance(pcm, (bytes, bytearray, memoryview)):
+            pcm = np.frombuffer(pcm, dtype=np.int16)
+        self.pcm = np.asarray(pcm).reshape(-1, channels)
+        self.source_rate = source_rate
+        self.channels = channels
+        self.max_speed = max_speed
+
+    def run(self, sink, stop_event):
+        resampler = StreamingResampler(self.source_rate, self.rate, self.channels)
+        frames = int(self.block * self.source_rate / self.rate)
+        pacer = _Pacer(self.source_rate, self.max_speed)
+        for start in range(0, self.pcm.shape[0], frames):
+            if stop_event.is_set():
+                return
+            block = self.pcm[start:start + frames]
+            self._deliver(sink, resampler.process(block))
+            if pacer.wait(block.shape[0], stop_event):
+                return
+
+
+class FileSource(AudioSource):
+    """
+    Grabación WAV (leída por bloques con wave) o FLAC/OGG/MP3 (decodificada en streaming por
+    ffmpeg, como en tts/audio_decoder.py). No se carga el archivo entero en memoria.
+    """
+
+    def __init__(self, path, rate=16000, block_ms=100, max_speed=None):
+        """max_speed: límite opcional en veces tiempo real (None = tan rápido como se consuma)"""
+        super().__init__(rate, block_ms)
+        self.path = path
+        self.max_speed = max_speed
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    def run(self, sink, stop_event):
+        with open(self.path, "rb") as f:
+            is_wav = f.read(4) == b"RIFF"
+        if is_wav:
+            self._run_wav(sink, stop_event)
+        else:
+            self._run_ffmpeg(sink, stop_event)
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _run_wav(self, sink, stop_event):
+        with wave.open(self.path, "rb") as wf:
+            if wf.getsampwidth() != 2:
+                raise ValueError(f"{self.name}: solo se admite WAV PCM de 16 bits")
+            source_rate, channels = wf.getframerate(), wf.getnchannels()
+            resampler = StreamingResampler(source_rate, self.rate, channels)
+            frames = int(self.block * source_rate / self.rate)
+            pacer = _Pacer(source_rate, self.max_speed)
+            while not stop_event.is_set():
+                data = wf.readframes(frames)
+                if not data:
+                    return
+                block = np.frombuffer(data, dtype=np.int16).reshape(-1, channels)
+                self._deliver(sink, resampler.process(block))
+                if pacer.wait(block.shape[0], stop_event):
+                    return
+
+    def _run_ffmpeg(self, sink, stop_event):
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise RuntimeError(f"Se necesita ffmpeg para leer {self.name}")
+        process = subprocess.Popen(
+            [ffmpeg, "-loglevel", "error", "-i", self.path, "-f", "s16le", "-ac", "1", "-ar", str(self.rate), "pipe:1"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        pacer = _Pacer(self.rate, self.max_speed)
+        try:
+            while not stop_event.is_set():
+                data = process.stdout.read(self.block * 2)
+                if not data:
+                    return
+                block = np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16)
+                self._deliver(sink, block)
+                if pacer.wait(block.size, stop_event):
+                    return
+        finally:
+            process.kill()
+            process.wait()
+
+
+class _Pacer:
+    """Limita una fuente a max_speed veces tiempo real (sin límite si max_speed es None)."""
+
+    def __init__(self, rate, max_speed):
+        self.rate = rate
+        self.max_speed = max_speed
+        self.start = time.monotonic()
+        self.samples = 0
+
+    def wait(self, samples, stop_event):
+        """Cuenta las muestras entregadas y espera si se adelantó. Devuelve True si hay que parar."""
+        if not self.max_speed:
+            return False
+        self.samples += samples
+        ahead = self.samples / self.rate / self.max_speed - (time.monotonic() - self.start)
+        return ahead > 0 and stop_event.wait(ahead)
@@ -0,0 +1,64 @@
+# stt/barge_in.py
+from collections import deque
+
+import numpy as np
+
+from config import BARGE_IN_CONFIDENCE, BARGE_IN_WINDOW_MS, BARGE_IN_MIN_RMS, VAD_FRAME_MS
+
+
+class BargeInDetector:
+    """
+    Detecta que el alumno empezó a hablar mientras suena el TTS.
+    La confianza es la fracción de frames con voz (webrtcvad en modo estricto) dentro de
+    una ventana deslizante, contando solo frames con energía suficiente para no disparar
+    con el eco suave del parlante. Guarda el audio de la ventana para que, al interrumpir,
+    esas primeras palabras también lleguen al reconocedor.
+    """
+
+    def __init__(self, rate=16000, confidence=BARGE_IN_CONFIDENCE, window_ms=BARGE_IN_WINDOW_MS,
+                 min_rms=BARGE_IN_MIN_RMS, frame_ms=VAD_FRAME_MS, aggressiveness=3):
+        """
+        confidence: fracción de frames con voz en la ventana necesaria para interrumpir (0-1)
+        window_ms: duración de la ventana analizada
+        min_rms: energía mínima de un frame para contarlo como voz
+        """
+        self.rate = rate
+        self.confidence = confidence
+        self.min_rms = min_rms
+        self.frame_bytes = int(rate * frame_ms / 1000) * 2
+        import webrtcvad   # diferido: solo hace falta si el barge-in está activo
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self._frames = deque(maxlen=max(1, window_ms // frame_ms))  # True/False por frame
+        self._audio = deque(maxlen=max(1, window_ms // frame_ms))   # bytes de la ventana
+        self._pending = b""
+        self.last_confidence = 0.0
+
+    def update(self, chunk):
+        """
+        Procesa un chunk PCM16 capturado durante el TTS.
+        Devuelve el audio de la ventana (bytes) si hay que interrumpir, o None.
+        """
+        data = self._pending + chunk
+        usable = len(data) // self.frame_bytes * self.frame_bytes
+        self._pending = data[usable:]
+        for start in range(0, usable, self.frame_bytes):
+            frame = data[start:start + self.frame_bytes]
+            samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+            loud = np.sqrt(np.mean(samples * samples)) >= self.min_rms
+            self._frames.append(loud and self.vad.is_speech(frame, self.rate))
+            self._audio.append(frame)
+
+        if len(self._frames) < self._frames.maxlen:
+            return None
+        self.last_confidence = sum(self._frames) / len(self._frames)
+        if self.last_confidence < self.confidence:
+            return None
+        audio = b"".join(self._audio)
+        self.reset()
+        return audio
+
+    def reset(self):
+        self._frames.clear()
+        self._audio.clear()
+        self._pending = b""
+        self.last_confidence = 0.0
@@ -0,0 +1,285 @@
+# stt/echo_canceller.py
+"""
+Cancelación de eco acústico (AEC) para poder seguir escuchando al alumno mientras suena el TTS.
+
+Filtro adaptativo en el dominio de la frecuencia por bloques particionados (PBFDAF, overlap-save)
+con paso NLMS normalizado por bin. La referencia es la señal que entrega el PlaybackEngine
+(lo que sale por el parlante) y la entrada es el micrófono de SpeechRecognizer._capture_audio.
+
+Presupuesto de CPU: a 16 kHz con bloques de 10 ms (160 muestras) y 200 ms de cola de eco
+(20 particiones), cada bloque debe procesarse en menos de AEC_BLOCK_BUDGET_MS (1 ms, el 10%
+de tiempo real de un núcleo). El costo por bloque es 3 FFT de 320 puntos más 2 FFT por lotes
+de 20 x 320 (restricción del gradiente) y unas pocas operaciones vectoriales sobre 20 x 161 bins.
+
+Benchmark offline con mezclas de eco sintéticas:
+    python -m stt.echo_canceller
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from config import AEC_BLOCK_MS, AEC_FILTER_MS, AEC_STEP, AEC_BLOCK_BUDGET_MS, PLAYBACK_RATE
+
+
+class EchoReference:
+    """
+    Referencia del eco: recibe los bloques que reproduce el PlaybackEngine (desde su callback)
+    y los entrega a la frecuencia del micrófono. El remuestreo es lineal y con estado (sin
+    cortes entre bloques); el filtro adaptativo absorbe la diferencia con el audio real.
+    """
+
+    def __init__(self, from_rate=PLAYBACK_RATE, to_rate=16000, max_ms=1000):
+        self.step = from_rate / to_rate
+        self.max_samples = int(to_rate * max_ms / 1000)
+        self._phase = 0.0
+        self._last = 0.0
+        self._samples = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def push(self, block):
+        """Agrega un bloque int16 reproducido (llamado desde el callback de audio: debe ser barato)."""
+        x = np.concatenate(([self._last], block.astype(np.float32)))
+        positions = np.arange(self._phase, len(x) - 1, self.step)
+        out = np.interp(positions, np.arange(len(x)), x).astype(np.float32)
+        self._phase = positions[-1] + self.step - (len(x) - 1) if positions.size else self._phase - (len(x) - 1)
+        self._last = x[-1]
+        with self._lock:
+            self._samples.append(out)
+            self._size += out.size
+            # Si el parlante y el micrófono derivan, se descarta lo más viejo
+            while self._size > self.max_samples:
+                self._size -= self._samples.popleft().size
+
+    def align(self, n, max_lag):
+        """Descarta referencia vieja para que no queden más de n + max_lag muestras pendientes."""
+        with self._lock:
+            while self._samples and self._size - self._samples[0].size >= n + max_lag:
+                self._size -= self._samples.popleft().size
+
+    def read(self, n):
+        """Devuelve n muestras float32 de referencia (ceros si no se está reproduciendo nada)."""
+        out = np.zeros(n, dtype=np.float32)
+        filled = 0
+        with self._lock:
+            while filled < n and self._samples:
+                chunk = self._samples[0]
+                take = min(n - filled, chunk.size)
+                out[filled:filled + take] = chunk[:take]
+                filled += take
+                if take == chunk.size:
+                    self._samples.popleft()
+                else:
+                    self._samples[0] = chunk[take:]
+                self._size -= take
+        return out
+
+
+class EchoCanceller:
+    """
+    PBFDAF/NLMS vectorizado en NumPy. process() recibe audio del micrófono (int16) y devuelve
+    el mismo audio sin el eco del TTS. Congela la adaptación durante el doble habla
+    (detector de Geigel) para no desajustar el filtro con la voz del alumno.
+    """
+
+    def __init__(self, rate=16000, block_ms=AEC_BLOCK_MS, filter_ms=AEC_FILTER_MS, step=AEC_STEP,
+                 reference=None, geigel_threshold=0.6, regularization=1e-6, smoothing=0.9):
+        """
+        block_ms: tamaño de bloque (latencia agregada y unidad del presupuesto de CPU)
+        filter_ms: largo de la cola de eco modelada (define la cantidad de particiones)
+        step: paso de adaptación NLMS (0-1)
+        reference: EchoReference de la que se lee la señal reproducida
+        geigel_threshold: |mic| mayor que este factor por el pico de la referencia = doble habla
+        """
+        self.rate = rate
+        self.block = int(rate * block_ms / 1000)
+        self.partitions = max(1, int(round(filter_ms / block_ms)))
+        self.step = step
+        self.reference = reference or EchoReference(to_rate=rate)
+        self.geigel_threshold = geigel_threshold
+        self.regularization = regularization
+        self.smoothing = smoothing
+
+        bins = self.block + 1
+        self._weights = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self._x_spectra = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self._power = np.full(bins, 1e-2)
+        self._prev_x = np.zeros(self.block)
+        self._ref_peak = deque(maxlen=self.partitions)
+        self._pending = np.zeros(0, dtype=np.int16)
+        self.stats = {"blocks": 0, "cpu_ms": 0.0, "max_cpu_ms": 0.0, "over_budget": 0, "double_talk": 0}
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def process(self, mic):
+        """Cancela el eco de un chunk int16 (bytes o array); devuelve lo mismo que recibió."""
+        as_bytes = isinstance(mic, (bytes, bytearray, memoryview))
+        samples = np.frombuffer(mic, dtype=np.int16) if as_bytes else np.asarray(mic, dtype=np.int16).ravel()
+        data = np.concatenate((self._pending, samples)) if self._pending.size else samples
+        usable = len(data) // self.block * self.block
+        self._pending = data[usable:].copy()
+
+        # Mantiene la referencia alineada con el micrófono (la cola del filtro cubre el resto)
+        self.reference.align(usable, self.block * self.partitions // 2)
+        out = np.empty(usable, dtype=np.int16)
+        for start in range(0, usable, self.block):
+            x = self.reference.read(self.block)
+            out[start:start + self.block] = self.process_block(data[start:start + self.block], x)
+        # Lo que no completa un bloque sale en el próximo chunk: mismo largo total, 1 bloque de retardo máx.
+        if len(out) < len(samples):
+            out = np.concatenate((np.zeros(len(samples) - len(out), dtype=np.int16), out))
+        elif len(out) > len(samples):
+            out = out[-len(samples):]
+        return out.tobytes() if as_bytes else out
+
+    def process_block(self, mic_block, ref_block):
+        """Un bloque: mic (int16) y referencia (float) de self.block muestras. Devuelve int16."""
+        start = time.perf_counter()
+        d = mic_block.astype(np.float64) / 32768.0
+        x = ref_block.astype(np.float64) / 32768.0
+        n = self.block
+
+        # Espectro de la referencia (overlap-save: bloque anterior + actual)
+        X = np.fft.rfft(np.concatenate((self._prev_x, x)))
+        self._prev_x = x
+        self._x_spectra = np.roll(self._x_spectra, 1, axis=0)
+        self._x_spectra[0] = X
+        self._ref_peak.append(np.max(np.abs(x)))
+
+        ref_peak = max(self._ref_peak)
+        if ref_peak == 0.0:
+            # Sin reproducción en toda la cola del filtro: no hay eco que restar
+            self._account(start)
+            return mic_block.astype(np.int16)
+
+        # Estimación del eco y error
+        y = np.fft.irfft(np.sum(self._weights * self._x_spectra, axis=0))[n:]
+        e = d - y
+
+        # Adaptación NLMS por bin, salvo con doble habla o con referencia casi nula
+        if np.max(np.abs(d)) > self.geigel_threshold * ref_peak * self._coupling():
+            self.stats["double_talk"] += 1
+        elif ref_peak > 1e-4:
+            self._power = self.smoothing * self._power + (1 - self.smoothing) * (np.abs(X) ** 2)
+            E = np.fft.rfft(np.concatenate((np.zeros(n), e)))
+            gradient = np.conj(self._x_spectra) * (E / (self._power * self.partitions + self.regularization))
+            # Restricción del gradiente: solo la primera mitad de la respuesta al impulso es válida
+            g = np.fft.irfft(gradient, axis=1)
+            g[:, n:] = 0.0
+            self._weights += self.step * np.fft.rfft(g, axis=1)
+
+        # Si el filtro aún no converge y el error supera al micrófono, no empeorar la señal
+        if np.dot(e, e) > np.dot(d, d):
+            e = d
+        out = np.clip(e * 32768.0, -32768, 32767).astype(np.int16)
+        self._account(start)
+        return out
+
+    def report(self):
+        blocks = self.stats["blocks"] or 1
+        avg = self.stats["cpu_ms"] / blocks
+        block_ms = self.block / self.rate * 1000
+        print(f"📊 AEC: {self.stats['blocks']} bloques, {avg:.3f} ms/bloque "
+              f"(máx. {self.stats['max_cpu_ms']:.2f} ms, presupuesto {AEC_BLOCK_BUDGET_MS} ms, "
+              f"{avg / block_ms:.1%} de tiempo real), {self.stats['over_budget']} fuera de presupuesto, "
+              f"{self.stats['double_talk']} bloques con doble habla")
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _account(self, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats["blocks"] += 1
+        self.stats["cpu_ms"] += elapsed_ms
+        self.stats["max_cpu_ms"] = max(self.stats["max_cpu_ms"], elapsed_ms)
+        if elapsed_ms > AEC_BLOCK_BUDGET_MS:
+            self.stats["over_budget"] += 1
+
+    def _coupling(self):
+        """Ganancia estimada parlante -> micrófono (energía total del filtro), mínimo 1."""
+        return max(1.0, float(np.sqrt(np.sum(np.abs(self._weights) ** 2) / (self.block + 1))))
+
+
+# -----------------------------
+# Benchmark offline
+# -----------------------------
+def _synthetic_speech(rng, seconds, rate):
+    """Ruido con forma de voz: filtrado paso bajo y modulado en sílabas (~4 Hz)."""
+    n = int(seconds * rate)
+    noise = rng.standard_normal(n)
+    kernel = np.exp(-np.arange(32) / 6.0)
+    voiced = np.convolve(noise, kernel / kernel.sum(), mode="same")
+    envelope = np.clip(np.sin(2 * np.pi * 4 * np.arange(n) / rate + rng.uniform(0, np.pi)), 0, None) ** 2
+    return voiced * envelope
+
+
+def _room_response(rng, rate, delay_ms=20, tail_ms=150, gain=0.6):
+    """Respuesta al impulso sintética: retardo directo + cola con decaimiento exponencial."""
+    delay = int(rate * delay_ms / 1000)
+    tail = int(rate * tail_ms / 1000)
+    h = np.zeros(delay + tail)
+    h[delay:] = rng.standard_normal(tail) * np.exp(-np.arange(tail) / (tail / 6))
+    h[delay] = 1.0
+    return gain * h / np.sqrt(np.sum(h ** 2))
+
+
+def _erle_db(mic, out, start):
+    return 10 * np.log10(np.sum(mic[start:] ** 2) / (np.sum(out[start:] ** 2) + 1e-12))
+
+
+def benchmark(seconds=10.0, rate=16000, seed=0):
+    """
+    Mezclas sintéticas: eco solo, eco + ruido, y eco + voz del alumno (doble habla).
+    Mide ERLE (reducción del eco en dB, después de 2 s de convergencia) y CPU por bloque.
+    """
+    rng = np.random.default_rng(seed)
+    far = _synthetic_speech(rng, seconds, rate) * 8000
+    echo = np.convolve(far, _room_response(rng, rate))[:far.size]
+    near = np.zeros_like(far)
+    talk = slice(int(6 * rate), int(8 * rate))
+    near[talk] = _synthetic_speech(rng, 2.0, rate) * 6000
+    noise = rng.standard_normal(far.size) * 30
+
+    scenarios = {
+        "eco": echo,
+        "eco + ruido": echo + noise,
+        "eco + doble habla": echo + noise + near,
+    }
+    print(f"🧪 Benchmark AEC: {seconds:.0f} s a {rate} Hz, bloques de {AEC_BLOCK_MS} ms, "
+          f"cola de {AEC_FILTER_MS} ms")
+    for name, mic in scenarios.items():
+        reference = EchoReference(from_rate=rate, to_rate=rate, max_ms=seconds * 1000 + 1000)
+        aec = EchoCanceller(rate=rate, reference=reference)
+        mic16 = np.clip(mic, -32768, 32767).astype(np.int16)
+        far16 = np.clip(far, -32768, 32767).astype(np.int16)
+        out = np.empty_like(mic16)
+        cpu = []
+        for start in range(0, far16.size - aec.block + 1, aec.block):
+            end = start + aec.block
+            t0 = time.perf_counter()
+            out[start:end] = aec.process_block(mic16[start:end], far16[start:end].astype(np.float32))
+            cpu.append((time.perf_counter() - t0) * 1000)
+        out = out.astype(np.float64)
+        converged = int(2 * rate)
+        if name == "eco + doble habla":
+            # ERLE fuera del tramo con voz del alumno; dentro, cuánto de esa voz se preserva
+            mask = np.ones(far.size, dtype=bool)
+            mask[talk] = False
+            mask[:converged] = False
+            erle = 10 * np.log10(np.sum(mic[mask] ** 2) / (np.sum(out[mask] ** 2) + 1e-12))
+            residual = out[talk] - near[talk]
+            preserved = 10 * np.log10(np.sum(near[talk] ** 2) / (np.sum(residual ** 2) + 1e-12))
+            extra = f" | voz del alumno / residuo {preserved:.1f} dB"
+        else:
+            erle = _erle_db(mic, out, converged)
+            extra = ""
+        cpu = np.array(cpu)
+        print(f"   {name:18s} ERLE {erle:5.1f} dB | CPU {cpu.mean():.3f} ms/bloque "
+              f"(p95 {np.percentile(cpu, 95):.3f}, presupuesto {AEC_BLOCK_BUDGET_MS} ms){extra}")
+
+
+if __name__ == "__main__":
+    benchmark()
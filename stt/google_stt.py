@@ -1,41 +1,62 @@
-import numpy as np
-import queue
+import threading
+
 from google.cloud import speech
-import sounddevice as sd
+from config import STT_ENCODING
+from stt.audio_encoder import StreamEncoder, usable_encoding
 from utils.audio_utils import AudioUtils
-from utils.shared_queue import audio_queue  # en lugar de declararlo aquí
+from utils.message_bus import MessageBus
 
 class GoogleSTT:
-    def __init__(self, rate=16000, chunk=1024, channels=1, language_code="en-ES"):
+    def __init__(self, rate=16000, chunk=1024, channels=1, language_code="en-ES", bus=None, encoding=STT_ENCODING):
         """
         silence_seconds: tiempo máximo de silencio antes de cortar la grabación
         rate: frecuencia de muestreo (Hz)
         chunk: tamaño del buffer de audio
+        bus: MessageBus por el que llega el audio capturado (canal audio)
+        encoding: cómo viaja el audio a Google: LINEAR16, FLAC u OGG_OPUS (ver StreamEncoder)
         """
         self.language_code = language_code
         self.rate = rate
         self.chunk = chunk
         self.channels = channels
+        self.encoding = usable_encoding(encoding)
 
         # Cliente de Google STT
         self.client = speech.SpeechClient()
 
-        # Utilidad de audio (sounddevice)
-        self.audio_utils = AudioUtils(rate=rate, chunk=chunk, channels=channels)
-
-        # Cola de audio para enviar a Google
-        self.requests = queue.Queue()
+        # Utilidad de audio (sounddevice): publica los bloques capturados en bus.audio
+        self.bus = bus or MessageBus()
+        self.audio_utils = AudioUtils(rate=rate, chunk=chunk, channels=channels, bus=self.bus)
+        self._running = False
 
     def _generator(self):
-        """Generador que envía audio a la API de Google"""
-        while True:
-            chunk = self.audio_utils.get_audio_chunk()
-            if chunk is None:
-                continue
+        """Generador que envía audio a la API de Google (codificado según self.encoding)"""
+        encoder = StreamEncoder(self.encoding, self.rate)
+        threading.Thread(target=self._feed_encoder, args=(encoder,), daemon=True).start()
+        while (data := encoder.read()) is not None:
+            if data:
+                yield speech.StreamingRecognizeRequest(audio_content=data)
 
-            # Asegurar tipo bytes (Google espera PCM lineal 16-bit)
-            audio_content = chunk.astype(np.int16).tobytes()
-            yield speech.StreamingRecognizeRequest(audio_content=audio_content)
+    def _feed_encoder(self, encoder):
+        """Pasa el PCM16 que publica la captura al encoder hasta que se detenga el streaming."""
+        try:
+            while self._running:
+                frame = self.bus.audio.get(timeout=1)
+                if frame is None:
+                    if self.bus.audio.closed:
+                        break
+                    continue
+                encoder.write(frame.pcm)
+        finally:
+            encoder.close()
+
+    def _recognition_config(self, **extra):
+        return speech.RecognitionConfig(
+            encoding=getattr(speech.RecognitionConfig.AudioEncoding, self.encoding),
+            sample_rate_hertz=self.rate,
+            language_code=self.language_code,
+            **extra,
+        )
 
     def listen_and_transcribe(self, on_transcription_update=None):
         """
@@ -43,12 +64,7 @@ class GoogleSTT:
         on_transcription_update: callback para texto parcial/final.
         """
         # Configuración de reconocimiento
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-            sample_rate_hertz=self.rate,
-            language_code=self.language_code,
-            enable_automatic_punctuation=True,
-        )
+        config = self._recognition_config(enable_automatic_punctuation=True)
 
         streaming_config = speech.StreamingRecognitionConfig(
             config=config,
@@ -56,6 +72,7 @@ class GoogleSTT:
         )
 
         # Iniciar captura de audio
+        self._running = True
         self.audio_utils.start_recording()
 
         # Llamada en streaming a Google
@@ -83,36 +100,22 @@ class GoogleSTT:
         except Exception as e:
             print(f"❌ Error en STT: {e}")
         finally:
+            self._running = False
             self.audio_utils.stop_recording()
 
     def start_streaming(self, on_update=None, on_final=None, single_utterance=False):
         self._running = True
 
         stream_config = speech.StreamingRecognitionConfig(
-            config=speech.RecognitionConfig(
-                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-                sample_rate_hertz=self.rate,
-                language_code=self.language_code,
-            ),
+            config=self._recognition_config(),
             interim_results=True,
             single_utterance=single_utterance,
         )
 
-        def request_generator():
-            while self._running:
-                try:
-                    data = audio_queue.get(timeout=1)
-                except queue.Empty:
-                    continue
-
-                if data is None:  # señal de stop
-                    break
-
-                yield speech.StreamingRecognizeRequest(audio_content=data)
-
+        self.audio_utils.start_recording()
         try:
             # 👇 Aquí pasamos stream_config como primer parámetro obligatorio
-            responses = self.client.streaming_recognize(stream_config, request_generator())
+            responses = self.client.streaming_recognize(stream_config, self._generator())
             for response in responses:
                 if not self._running:
                     break
@@ -131,6 +134,7 @@ class GoogleSTT:
                             on_update(transcript)
         finally:
             self._running = False
+            self.audio_utils.stop_recording()
     
 
     def stop_streaming(self):
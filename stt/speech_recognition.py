@@ -1,25 +1,150 @@
-import queue
 import threading
-import sounddevice as sd
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import numpy as np
 from google.cloud import speech
 
+from config import VAD_ENABLED, ENDPOINTING_ENABLED, ENDPOINT_SILENCE_MS, ENDPOINT_STABLE_MS, ENDPOINT_ENERGY_THRESHOLD
+from config import BARGE_IN_ENABLED, AEC_ENABLED, AUDIO_RING_SECONDS, STT_ENCODING
+from stt.audio_encoder import usable_encoding
+from stt.audio_source import MicrophoneSource
+from stt.barge_in import BargeInDetector
+from stt.echo_canceller import EchoCanceller
+from stt.stream_manager import StreamManager
+from stt.vad_gate import VADGate
+from tts.playback_engine import PlaybackEngine
+from utils.audio_utils import detect_silence
+from utils.message_bus import Transcript
+from utils.pcm_ring_buffer import PCMRingBuffer
+
+
+class Endpointer:
+    """
+    Detección local del fin de turno. Da el turno por terminado cuando se cumplen a la vez:
+    - silencio final de al menos trailing_silence_ms (frames de la VAD y energía del chunk),
+    - un transcript intermedio que no cambió en los últimos stable_ms.
+    Así no hay que esperar el is_final de Google, que suele llegar cientos de ms después.
+    """
+
+    def __init__(self, rate=16000, trailing_silence_ms=ENDPOINT_SILENCE_MS, stable_ms=ENDPOINT_STABLE_MS,
+                 energy_threshold=ENDPOINT_ENERGY_THRESHOLD):
+        """
+        trailing_silence_ms: silencio necesario después de la última palabra
+        stable_ms: tiempo que el transcript intermedio debe permanecer igual
+        energy_threshold: RMS bajo el cual un chunk cuenta como silencio (ver detect_silence)
+        """
+        self.rate = rate
+        self.trailing_silence_ms = trailing_silence_ms
+        self.stable_ms = stable_ms
+        self.energy_threshold = energy_threshold
+        self._lock = threading.Lock()
+        self.stats = {"local": 0, "server": 0, "advantage_ms": 0.0, "mismatches": 0}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.transcript = ""
+            self.transcript_changed_at = None
+            self.silence_ms = 0
+            self.fired_at = None
+            self.fired_transcript = None
+
+    def on_interim(self, transcript):
+        """Registra un resultado intermedio de Google."""
+        with self._lock:
+            if transcript != self.transcript:
+                self.transcript = transcript
+                self.transcript_changed_at = time.monotonic()
+
+    def update(self, samples, vad_silence_ms=None):
+        """
+        Procesa un chunk de la captura (int16). Devuelve el transcript si el turno terminó, o None.
+        vad_silence_ms: silencio final según la VAD (None si no hay VAD: solo cuenta la energía)
+        """
+        chunk_ms = samples.size * 1000 / self.rate
+        with self._lock:
+            if self.fired_at is not None:
+                return None
+            if detect_silence(samples, threshold=self.energy_threshold):
+                self.silence_ms += chunk_ms
+            else:
+                self.silence_ms = 0
+            silence_ms = self.silence_ms if vad_silence_ms is None else min(self.silence_ms, vad_silence_ms)
+
+            if not self.transcript or silence_ms < self.trailing_silence_ms:
+                return None
+            if (time.monotonic() - self.transcript_changed_at) * 1000 < self.stable_ms:
+                return None
+            self.fired_at = time.monotonic()
+            self.fired_transcript = self.transcript
+            self.stats["local"] += 1
+            return self.transcript
+
+    def on_server_final(self, transcript, fired_at, fired_transcript):
+        """Final de Google de un turno que ya se cerró localmente (en fired_at, con fired_transcript): mide la ventaja."""
+        advantage_ms = (time.monotonic() - fired_at) * 1000
+        self.stats["advantage_ms"] += advantage_ms
+        print(f"⏱️ Fin de turno local {advantage_ms:.0f} ms antes que el final de Google")
+        if transcript.lower() != fired_transcript.lower():
+            self.stats["mismatches"] += 1
+            print(f"⚠️ El final de Google difiere del intermedio usado: '{transcript}'")
+
+    def report(self):
+        local = self.stats["local"]
+        if not local:
+            return
+        print(f"📊 Endpointing: {local} turnos cerrados localmente, "
+              f"ventaja media {self.stats['advantage_ms'] / local:.0f} ms, "
+              f"{self.stats['mismatches']} con transcript distinto al final")
+
 class SpeechRecognizer:
     """
     Reconocimiento de voz en streaming usando Google Speech-to-Text.
     Usa sounddevice para capturar audio y soporta resultados intermedios.
     """
 
-    def __init__(self, language_code="en-US", rate=16000, chunk_duration_ms=100):
+    def __init__(self, language_code="en-US", rate=16000, chunk_duration_ms=100, use_vad=VAD_ENABLED,
+                 endpointing=ENDPOINTING_ENABLED, barge_in=BARGE_IN_ENABLED, aec=AEC_ENABLED, encoding=STT_ENCODING,
+                 source=None, client=None):
+        """
+        use_vad: si es True, solo se envía a Google el audio con voz (ver VADGate)
+        endpointing: si es True, el fin de turno se detecta localmente (ver Endpointer)
+        barge_in: si es True, se sigue escuchando mientras habla el TTS y se llama a
+                  barge_in_callback cuando el alumno lo interrumpe (ver BargeInDetector)
+        aec: si es True, se cancela del micrófono el eco de lo que reproduce el PlaybackEngine
+        encoding: cómo viaja el audio a Google: LINEAR16, FLAC u OGG_OPUS (ver StreamEncoder)
+        source: AudioSource a reconocer (por defecto el micrófono; ver stt/audio_source.py)
+        client: SpeechClient compartido (p. ej. entre los streams de una transcripción masiva)
+        """
         self.language_code = language_code
         self.rate = rate
         self.chunk_size = int(rate * chunk_duration_ms / 1000)
-        self.client = speech.SpeechClient()
-
-        self.audio_queue = queue.Queue()
+        self.encoding = usable_encoding(encoding)
+        self.client = client or speech.SpeechClient()
+        self._setup_capture(source, chunk_duration_ms)
         self.running = False
         self.speaking = False
         self.callback = None
+        self.bus = None                # si hay bus, los finales se publican en bus.transcripts
+        self._final_waiters = []       # futures de await_next_final / next_final
+        self._final_lock = threading.Lock()
+        self._capture_stop = threading.Event()
+        self.interim_callback = None   # recibe cada transcript intermedio (generación especulativa)
+        self.barge_in_callback = None  # se llama cuando el alumno habla encima del TTS
         self.pause_processing = False
+        self.vad = VADGate(rate=rate) if use_vad else None
+        self.endpointer = Endpointer(rate=rate) if endpointing else None
+        self.barge_in = BargeInDetector(rate=rate) if barge_in else None
+        self.aec = EchoCanceller(rate=rate) if aec else None
+        self.streams = None            # StreamManager del reconocimiento en curso
+        if self.aec:
+            PlaybackEngine.instance().add_reference(self.aec.reference)
+
+    def _setup_capture(self, source, chunk_duration_ms):
+        """Fuente de audio (por defecto el micrófono) y buffer circular de la captura."""
+        self.source = source or MicrophoneSource(rate=self.rate, block_ms=chunk_duration_ms)
+        # Captura -> STT: buffer circular preasignado (el callback escribe en su lugar)
+        self.ring = PCMRingBuffer(capacity=self.rate * AUDIO_RING_SECONDS, max_read=self.chunk_size * 4)
 
     def start(self, callback):
         """Inicia captura de audio y reconocimiento en streaming."""
@@ -33,79 +158,220 @@ class SpeechRecognizer:
     def stop(self):
         """Detiene la captura y el streaming."""
         self.running = False
-        self.audio_queue.put(None)
+        self._capture_stop.set()
+        self.ring.close()
+        if self.streams:
+            self.streams.stop()
+        with self._final_lock:
+            waiters, self._final_waiters = self._final_waiters, []
+        for future in waiters:
+            future.cancel()
+
+    def next_final(self):
+        """Future que se resuelve con el próximo transcript final (de Google o del endpointing local)."""
+        future = Future()
+        with self._final_lock:
+            self._final_waiters.append(future)
+        return future
+
+    def await_next_final(self, timeout=None):
+        """Espera (sin polling) el próximo transcript final. Devuelve None si vence el timeout."""
+        future = self.next_final()
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            with self._final_lock:
+                if future in self._final_waiters:
+                    self._final_waiters.remove(future)
+            return None
+        except Exception:
+            return None  # reconocedor detenido
+
+    def transcribe(self):
+        """
+        Reconoce una fuente finita (archivo o buffer) de principio a fin, sin micrófono ni TTS,
+        y devuelve la lista de transcripts finales. El audio se envía tan rápido como lo acepta Google.
+        """
+        finals = []
+        self.callback = finals.append
+        self.running = True
+        capture = threading.Thread(target=self._capture_audio, daemon=True)
+        capture.start()
+        try:
+            self._streaming_recognition()
+        finally:
+            self.stop()
+            capture.join()
+        return finals
 
     def _capture_audio(self):
-        """Captura audio del micrófono con sounddevice y lo pone en la cola."""
-        print(f" 🎧 Captura de audio iniciada...")
-        def callback(indata, frames, time, status):
-            if not self.running:
-                raise sd.CallbackStop()
-
-            self.audio_queue.put(indata.tobytes())
-
-        with sd.InputStream(channels=1, samplerate=self.rate, callback=callback,
-                            blocksize=self.chunk_size, dtype='int16'):
-            while self.running:
-                #print("...capturando audio")
-                sd.sleep(50)  # Bloqueo activo
-
-    def _audio_generator(self):
-        """Generador que produce chunks de audio para Google STT."""
+        """
+        Lleva el audio de la fuente (micrófono, archivo o buffer) al buffer circular.
+        El micrófono escribe desde su callback sin esperar nunca; una fuente finita espera
+        a que el reconocedor libere lugar y, al agotarse, cierra el buffer (fin del audio).
+        """
+        self.ring.reopen()
+        self._capture_stop.clear()
+        blocking = not self.source.realtime
+
+        def sink(samples):
+            if self.aec:
+                samples = self.aec.process(samples)
+            self.ring.write(samples, block=blocking)
+
+        self.source.run(sink, self._capture_stop)
+        if blocking and not self._capture_stop.is_set():
+            self.ring.close()
+
+    def _audio_generator(self, stream=None):
+        """
+        Generador que produce el audio PCM16 para el stream activo de Google STT.
+        Con VAD solo envía la voz (y keepalives espaciados); sin VAD envía todo y silencio
+        continuo mientras habla el TTS. Termina si el stream terminó o si el endpointing local
+        detecta el fin del turno.
+        """
         silence_chunk = b"\x00" * self.chunk_size * 2  # 2 bytes por sample para int16
-        while self.running:
-            try:
-                chunk = self.audio_queue.get(timeout=0.1)
-            except queue.Empty:
-                chunk = None
+        while self.running and not (stream and stream.done.is_set()):
+            # Vista sin copia sobre el buffer de captura (None si no llegó audio a tiempo)
+            chunk = self.ring.read(self.chunk_size, timeout=0.2)
+
+            if chunk and self.barge_in:
+                if getattr(self, "pause_processing", False):
+                    window = self._check_barge_in(chunk)
+                    if window is not None:
+                        chunk = window  # incluye el inicio de la voz, no solo el último chunk
+                else:
+                    self.barge_in.reset()
 
             if getattr(self, "pause_processing", False):
-                # Enviar silencio mientras TTS está hablando
-                yield speech.StreamingRecognizeRequest(audio_content=silence_chunk)
-                continue
+                if self.endpointer:
+                    self.endpointer.reset()
+                if self.vad:
+                    # Mientras habla el TTS no se envía audio, solo keepalives espaciados
+                    self.vad.reset()
+                    self.vad.skip(len(chunk) if chunk else len(silence_chunk))
+                    audio = self.vad.keepalive()
+                else:
+                    # Enviar silencio mientras TTS está hablando
+                    audio = [silence_chunk]
+            elif chunk is None:
+                if self.ring.exhausted():
+                    return  # terminó la fuente (archivo o buffer)
+                audio = self.vad.keepalive() if self.vad else []
+            else:
+                audio = self.vad.process(chunk) if self.vad else [chunk]
+                if self.endpointer and self._end_of_turn(chunk, stream):
+                    if audio:
+                        yield b"".join(audio)
+                    return
+
+            if audio:
+                yield b"".join(audio)
+
+    def _check_barge_in(self, chunk):
+        """Si el alumno habla encima del TTS, avisa y devuelve el audio de la ventana detectada."""
+        if not self.barge_in_callback:
+            return None
+        window = self.barge_in.update(chunk)
+        if window is None:
+            return None
+        print(f"\n✋ Interrupción detectada (confianza {self.barge_in.confidence:.0%}+)")
+        # El callback corta el TTS y reanuda el reconocimiento (pause_processing = False)
+        self.barge_in_callback()
+        return window
 
-            if chunk is None:
-                continue
+    def _end_of_turn(self, chunk, stream=None):
+        """Actualiza el endpointing con el chunk; si el turno terminó, dispara el callback."""
+        vad_silence_ms = self.vad.trailing_silence_ms if self.vad else None
+        transcript = self.endpointer.update(np.frombuffer(chunk, dtype=np.int16), vad_silence_ms)
+        if transcript is None:
+            return False
+        if stream is not None:
+            # El final que Google mande después para este stream ya no se vuelve a entregar
+            stream.endpoint = (self.endpointer.fired_at, transcript)
+        print(f"\n✅ Usuario (fin de turno local): {transcript}")
+        self._deliver_final(transcript, source="local")
+        return True
 
-            yield speech.StreamingRecognizeRequest(audio_content=chunk)
+    def _deliver_final(self, transcript, source):
+        """Entrega un transcript final a quien espere con next_final() y por el bus o, si no hay bus, al callback."""
+        with self._final_lock:
+            waiters, self._final_waiters = self._final_waiters, []
+        for future in waiters:
+            future.set_result(transcript)
+        if self.bus is not None:
+            self.bus.transcripts.put(Transcript(transcript, is_final=True, source=source))
+        elif self.callback:
+            if source == "local":
+                # En otro hilo: el stream se cierra ya, sin esperar a que se procese la respuesta
+                threading.Thread(target=self.callback, args=(transcript,), daemon=True).start()
+            else:
+                self.callback(transcript)
 
-    def _streaming_recognition(self):
-        """Envia audio a Google STT y procesa resultados intermedios y finales."""
+    def _streaming_recognition(self, **stream_options):
+        """
+        Envía audio a Google STT y procesa resultados intermedios y finales.
+        El StreamManager mantiene siempre un stream activo (rotación, reserva y reconexión);
+        stream_options ajusta sus parámetros (p. ej. max_seconds para probar la rotación).
+        """
+        self.streams = StreamManager(self, self._streaming_config(), encoding=self.encoding, **stream_options)
+        try:
+            self.streams.run()
+        finally:
+            ring = self.ring.stats()
+            print(f"📊 Buffer de captura: {ring['overruns']} overruns ({ring['dropped'] / self.rate:.1f} s perdidos), "
+                  f"{ring['underruns']} underruns")
+            self.streams.report()
+            if self.aec:
+                self.aec.report()
+            if self.vad:
+                self.vad.report()
+            if self.endpointer:
+                self.endpointer.report()
+
+    def _streaming_config(self):
         config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            encoding=getattr(speech.RecognitionConfig.AudioEncoding, self.encoding),
             sample_rate_hertz=self.rate,
             language_code=self.language_code,
         )
 
-        streaming_config = speech.StreamingRecognitionConfig(
+        # Con endpointing, un stream por intervención (single_utterance) que se reabre al terminar
+        return speech.StreamingRecognitionConfig(
             config=config,
-            interim_results=True
+            interim_results=True,
+            single_utterance=self.endpointer is not None
         )
 
-        requests = self._audio_generator()
-        responses = self.client.streaming_recognize(streaming_config, requests)
+    def _handle_response(self, stream, response):
+        """Procesa una respuesta de un stream. Devuelve True si ese stream debe terminar."""
+        if not response.results:
+            return False
 
-        try:
-            for response in responses:
-                if not response.results:
-                    continue
+        result = response.results[0]
+        transcript = result.alternatives[0].transcript.strip()
 
-                result = response.results[0]
-                transcript = result.alternatives[0].transcript.strip()
+        if result.is_final:
+            if stream.endpoint is not None:
+                # El callback ya se disparó con el transcript intermedio
+                self.endpointer.on_server_final(transcript, *stream.endpoint)
+            else:
+                print(f"\n✅ Usuario (final): {transcript}")
+                self._deliver_final(transcript, source="google")
+            return self.endpointer is not None
+        if stream.draining:
+            return False  # intermedios de un stream ya reemplazado
+        print(f"\r📝 Usuario (hablando): {transcript}", end="")
+        if self.endpointer:
+            self.endpointer.on_interim(transcript)
+        if self.interim_callback:
+            self.interim_callback(transcript)
+        return False
 
-                if result.is_final:
-                    print(f"\n✅ Usuario (final): {transcript}")
-                    if self.callback:
-                        self.callback(transcript)
-                else:
-                    print(f"\r📝 Usuario (hablando): {transcript}", end="")
-        except Exception as e:
-            if self.running:
-                print(f"\n⚠️ Error en streaming STT: {e}")
-    
     def pause(self):
         """Pausa la captura de audio."""
         self.running = False
+        self._capture_stop.set()
         if hasattr(self, "_capture_thread") and self._capture_thread.is_alive():
             self._capture_thread.join(timeout=0.5)  # esperar a que termine el hilo
 
@@ -0,0 +1,316 @@
+# stt/stream_manager.py
+import itertools
+import random
+import threading
+import time
+
+from google.cloud import speech
+
+from config import (STT_STREAM_MAX_SECONDS, STT_STREAM_HARD_SECONDS, STT_STREAM_REPLAY_MS, STT_STREAM_PREWARM,
+                    STT_RECONNECT_BASE_MS, STT_RECONNECT_MAX_MS)
+from stt.audio_encoder import StreamEncoder
+from utils.latency_tracker import LatencyTracker
+
+
+class RecognitionStream:
+    """
+    Un stream streaming_recognize de Google con su propio hilo de respuestas.
+    Se abre "en reserva": la llamada gRPC y la configuración ya viajaron, y mientras
+    espera solo envía un frame de silencio cada tanto para que Google no la cierre.
+    Al activarlo empieza a recibir el audio del reconocedor (y la repetición de la costura).
+    Todo el audio pasa por su propio StreamEncoder (LINEAR16, FLAC u OGG_OPUS).
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, client, streaming_config, on_response, keepalive_frame, encoder, keepalive_ms=1000):
+        """
+        on_response(stream, response): devuelve True si el stream debe terminar
+        keepalive_frame: PCM de silencio que se envía mientras el stream está en reserva
+        encoder: StreamEncoder nuevo (cada stream necesita sus propias cabeceras FLAC/Ogg)
+        """
+        self.id = next(self._ids)
+        self.client = client
+        self.streaming_config = streaming_config
+        self.on_response = on_response
+        self.keepalive_frame = keepalive_frame
+        self.keepalive_s = keepalive_ms / 1000
+        self.encoder = encoder
+        self.opened_at = time.monotonic()
+        self.activated_at = None
+        self.first_response_at = None
+        self.endpoint = None        # (fired_at, transcript) si el turno se cerró localmente en este stream
+        self.draining = False       # ya no recibe audio: solo se esperan sus últimos finales
+        self.error = None
+        self.done = threading.Event()
+        self._active = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def activate(self, replay=b""):
+        """Pasa el stream de reserva a activo; replay se envía antes que el audio nuevo."""
+        self.activated_at = time.monotonic()
+        self.send(replay)
+        self._active.set()
+
+    def send(self, pcm):
+        """Audio PCM16 de la captura (se codifica antes de enviarse)."""
+        self.encoder.write(pcm)
+
+    def finish(self):
+        """Cierra el envío de audio (half-close); las respuestas pendientes siguen llegando."""
+        self.draining = True
+        self._active.set()
+        self.encoder.close()
+
+    def age(self):
+        """
+        Segundos desde que se abrió (Google cuenta el límite desde la apertura), o de audio
+        enviado si es más (un archivo se envía más rápido que tiempo real).
+        """
+        audio_seconds = self.encoder.stats["bytes_in"] / 2 / self.encoder.rate
+        return max(time.monotonic() - self.opened_at, audio_seconds)
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _request_iterator(self):
+        last_keepalive = time.monotonic()
+        while True:
+            timeout = None
+            if not self._active.is_set():
+                # En reserva: solo un frame de silencio cada keepalive_s
+                now = time.monotonic()
+                if now - last_keepalive >= self.keepalive_s:
+                    self.encoder.write(self.keepalive_frame)
+                    last_keepalive = now
+                timeout = self.keepalive_s - (now - last_keepalive)
+            data = self.encoder.read(timeout=timeout)
+            if data is None:
+                return
+            if data:
+                yield speech.StreamingRecognizeRequest(audio_content=data)
+
+    def _run(self):
+        try:
+            responses = self.client.streaming_recognize(self.streaming_config, self._request_iterator())
+            for response in responses:
+                if self.first_response_at is None:
+                    self.first_response_at = time.monotonic()
+                if self.on_response(self, response):
+                    break
+        except Exception as e:
+            if not self.draining:
+                self.error = e
+        finally:
+            self.done.set()
+            self.draining = True
+            self._active.set()
+            self.encoder.abort()  # libera al iterador de requests y a quien esté escribiendo audio
+
+
+class StreamManager:
+    """
+    Mantiene siempre un stream de Google STT recibiendo el audio del reconocedor:
+    - Reserva: poco antes de cada cambio (rotación cercana o, con endpointing, cuando el
+      alumno empieza a hablar) se abre el siguiente stream, así el cambio no espera el
+      handshake ni la configuración.
+    - Rotación: antes del límite de duración de Google se pasa al stream de reserva en el
+      próximo silencio (o sí o sí al llegar a hard_seconds), reenviando los últimos
+      replay_ms del buffer de captura para no perder palabras en la costura.
+    - Reconexión: si un stream falla se pasa a otro con espera exponencial (con jitter)
+      mientras los fallos sean consecutivos.
+    Métricas: rotaciones, reconexiones, errores, usos de la reserva y el hueco de cada
+    cambio (tiempo en que el audio quedó en el buffer sin stream activo).
+    """
+
+    def __init__(self, recognizer, streaming_config, max_seconds=STT_STREAM_MAX_SECONDS,
+                 hard_seconds=STT_STREAM_HARD_SECONDS, replay_ms=STT_STREAM_REPLAY_MS, prewarm=STT_STREAM_PREWARM,
+                 backoff_base_ms=STT_RECONNECT_BASE_MS, backoff_max_ms=STT_RECONNECT_MAX_MS, warm_lead_seconds=5,
+                 encoding="LINEAR16", drain_timeout=10.0):
+        """
+        recognizer: SpeechRecognizer dueño del audio (ring, _audio_generator) y de las respuestas
+        max_seconds: edad a partir de la cual se rota en el próximo silencio
+        hard_seconds: edad a la que se rota aunque el alumno esté hablando
+        replay_ms: audio reciente que se reenvía al stream nuevo al rotar o reconectar
+        prewarm: abrir el stream de reserva antes de necesitarlo
+        warm_lead_seconds: antelación con la que se abre la reserva antes de rotar
+        encoding: codificación del audio enviado (debe coincidir con la de streaming_config)
+        drain_timeout: espera máxima de los últimos finales cuando se agota una fuente finita
+        """
+        self.recognizer = recognizer
+        self.streaming_config = streaming_config
+        self.max_seconds = max_seconds
+        self.hard_seconds = max(hard_seconds, max_seconds)
+        self.replay_samples = int(recognizer.rate * replay_ms / 1000)
+        self.prewarm = prewarm
+        self.warm_lead = min(warm_lead_seconds, max_seconds / 4)
+        self.backoff_base = backoff_base_ms / 1000
+        self.backoff_max = backoff_max_ms / 1000
+        self.encoding = encoding
+        self.drain_timeout = drain_timeout
+        self.keepalive_frame = b"\x00" * int(recognizer.rate * 0.02) * 2  # 20 ms de silencio int16
+
+        self.active = None
+        self._warm = None
+        self._failures = 0
+        self._stop = threading.Event()
+        self.gaps = LatencyTracker()            # ms sin stream activo en cada cambio
+        self.first_result = LatencyTracker()    # ms desde la activación hasta la primera respuesta
+        self.stats = {"streams": 0, "turns": 0, "rotations": 0, "reconnects": 0, "errors": 0,
+                      "warm_hits": 0, "replayed_ms": 0.0, "pcm_bytes": 0, "sent_bytes": 0}
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def run(self):
+        """Bucle del hilo de reconocimiento: mientras el reconocedor corra hay un stream activo."""
+        reason, replay = "start", b""
+        switch_started = time.monotonic()
+        try:
+            while self.recognizer.running:
+                stream = self._next_stream()
+                if stream is None:
+                    break
+                if reason in ("start", "turn") and self.recognizer.endpointer:
+                    self.recognizer.endpointer.reset()  # una rotación no es un turno nuevo
+                stream.activate(replay)
+                self.active = stream
+                self.gaps.add((time.monotonic() - switch_started) * 1000)
+
+                reason = self._pump(stream)
+                switch_started = time.monotonic()
+                stream.finish()
+                self._account(stream, reason)
+                if reason == "end":
+                    # Fuente finita agotada: solo faltan los últimos finales de Google
+                    stream.done.wait(self.drain_timeout)
+                    break
+                replay = self._replay() if reason in ("rotation", "error") else b""
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stop.set()
+        for stream in (self.active, self._warm):
+            if stream:
+                stream.finish()
+        self._warm = None
+
+    def report(self):
+        """Imprime y devuelve las métricas de los streams de la sesión."""
+        gaps = self.gaps.summary()
+        first = self.first_result.summary()
+        summary = {**self.stats, "gap_p95_ms": gaps["p95"], "first_result_p50_ms": first["p50"]}
+        if self.stats["pcm_bytes"]:
+            seconds = self.stats["pcm_bytes"] / 2 / self.recognizer.rate
+            print(f"📦 Audio a Google STT ({self.encoding}): {self.stats['sent_bytes'] / 1024:.0f} KB "
+                  f"({self.stats['sent_bytes'] * 8 / seconds / 1000:.1f} kbit/s, "
+                  f"{self.stats['sent_bytes'] / self.stats['pcm_bytes']:.0%} del PCM)")
+        gap_text = f"hueco p50 {gaps['p50']:.0f} ms | p95 {gaps['p95']:.0f} ms" if gaps["count"] else "sin cambios"
+        print(f"📊 Streams STT: {self.stats['streams']} abiertos, {self.stats['turns']} turnos, "
+              f"{self.stats['rotations']} rotaciones, {self.stats['reconnects']} reconexiones "
+              f"({self.stats['errors']} errores) | reserva usada {self.stats['warm_hits']} veces | {gap_text} | "
+              f"{self.stats['replayed_ms']:.0f} ms reenviados")
+        return summary
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _pump(self, stream):
+        """Envía el audio al stream activo hasta que termine el turno, falle o toque rotar. Devuelve el motivo."""
+        for pcm in self.recognizer._audio_generator(stream):
+            stream.send(pcm)
+            if self.prewarm and self._warm is None and self._next_switch_near(stream):
+                self._warm = self._open()
+            if self._should_rotate(stream):
+                return "rotation"
+        if stream.error is not None:
+            return "error"
+        if not self.recognizer.running:
+            return "stop"
+        return "end" if self.recognizer.ring.exhausted() else "turn"
+
+    def _should_rotate(self, stream):
+        age = stream.age()
+        if age < self.max_seconds:
+            return False
+        return not self._speaking() or age >= self.hard_seconds
+
+    def _next_switch_near(self, stream):
+        """Se acerca un cambio de stream: la rotación por edad o, con endpointing, el fin del turno en curso."""
+        if stream.age() >= self.max_seconds - self.warm_lead:
+            return True
+        return self.recognizer.endpointer is not None and self._speaking()
+
+    def _speaking(self):
+        vad = self.recognizer.vad
+        if vad:
+            return vad.in_speech
+        return bool(self.recognizer.endpointer and self.recognizer.endpointer.transcript)
+
+    def _next_stream(self):
+        """El stream de reserva si sigue sano; si no, uno nuevo (esperando el backoff si viene de fallos)."""
+        warm, self._warm = self._warm, None
+        if warm is not None:
+            if not warm.done.is_set() and warm.age() < self.max_seconds / 2:
+                self.stats["warm_hits"] += 1
+                return warm
+            warm.finish()  # falló o envejeció esperando: no sirve para un stream largo
+        if self._failures:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (self._failures - 1))
+            delay *= random.uniform(0.5, 1.0)
+            print(f"🔁 Reconectando STT en {delay * 1000:.0f} ms (intento {self._failures})")
+            if self._stop.wait(delay):
+                return None
+        return self._open()
+
+    def _open(self):
+        self.stats["streams"] += 1
+        return RecognitionStream(self.recognizer.client, self.streaming_config, self._on_response,
+                                 self.keepalive_frame, StreamEncoder(self.encoding, self.recognizer.rate))
+
+    def _on_response(self, stream, response):
+        if self._failures and stream.activated_at is not None:
+            self._failures = 0
+        return self.recognizer._handle_response(stream, response)
+
+    def _account(self, stream, reason):
+        self.stats["pcm_bytes"] += stream.encoder.stats["bytes_in"]
+        self.stats["sent_bytes"] += stream.encoder.stats["bytes_out"]
+        if stream.first_response_at and stream.activated_at:
+            self.first_result.add(max(0.0, stream.first_response_at - stream.activated_at) * 1000)
+        if reason in ("turn", "end"):
+            self.stats["turns"] += 1
+        elif reason == "rotation":
+            self.stats["rotations"] += 1
+            print(f"🔄 Rotando stream STT #{stream.id} a los {stream.age():.0f} s")
+        elif reason == "error":
+            self.stats["errors"] += 1
+            self.stats["reconnects"] += 1
+            self._failures += 1
+            print(f"\n⚠️ Error en streaming STT: {stream.error}")
+
+    def _replay(self):
+        """Últimos replay_ms ya enviados: el stream nuevo vuelve a oír la palabra que quedó en la costura."""
+        replay = self.recognizer.ring.recent(self.replay_samples)
+        self.stats["replayed_ms"] += len(replay) / 2 / self.recognizer.rate * 1000
+        return replay
+
+
+if __name__ == "__main__":
+    # Prueba manual: rotar cada 20 s (en vez de ~280 s) y hablar a través de las costuras
+    from stt.speech_recognition import SpeechRecognizer
+
+    recognizer = SpeechRecognizer(language_code="es-CL")
+    recognizer.start(lambda text: print(f"\n🗣️ {text}"))
+    recognizer.running = True
+    capture = threading.Thread(target=recognizer._capture_audio, daemon=True)
+    capture.start()
+    try:
+        recognizer._streaming_recognition(max_seconds=20, hard_seconds=25)
+    except KeyboardInterrupt:
+        recognizer.stop()
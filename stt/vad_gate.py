@@ -0,0 +1,142 @@
+# stt/vad_gate.py
+import time
+from collections import deque
+
+from config import (VAD_AGGRESSIVENESS, VAD_FRAME_MS, VAD_PRE_PADDING_MS, VAD_POST_PADDING_MS,
+                    VAD_KEEPALIVE_MS)
+
+
+class VADGate:
+    """
+    Compuerta de voz (webrtcvad) entre la captura y el stream de Google STT.
+    Solo deja pasar los frames con voz, más un relleno antes (para no cortar el inicio
+    de la palabra) y después (para no cortar el final). Durante el silencio envía cada
+    tanto un frame de silencio corto para que Google no cierre el stream por inactividad.
+    Lleva la cuenta de cuántos bytes y segundos de audio se evitaron enviar.
+    """
+
+    def __init__(self, rate=16000, aggressiveness=VAD_AGGRESSIVENESS, frame_ms=VAD_FRAME_MS,
+                 pre_padding_ms=VAD_PRE_PADDING_MS, post_padding_ms=VAD_POST_PADDING_MS,
+                 keepalive_ms=VAD_KEEPALIVE_MS):
+        """
+        rate: frecuencia del audio (webrtcvad acepta 8000, 16000, 32000 o 48000)
+        aggressiveness: 0 (deja pasar más) a 3 (filtra más ruido)
+        frame_ms: duración de cada frame analizado (10, 20 o 30 ms)
+        pre_padding_ms: audio previo a la voz que se envía junto con ella
+        post_padding_ms: audio que se sigue enviando después de la última voz detectada
+        keepalive_ms: cada cuánto se envía un frame de silencio mientras no hay voz
+        """
+        self.rate = rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = int(rate * frame_ms / 1000) * 2  # int16
+        self.post_padding_frames = max(1, post_padding_ms // frame_ms)
+        self.keepalive_ms = keepalive_ms
+        import webrtcvad   # diferido: solo hace falta si la compuerta está activa
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+        self.silence_frame = b"\x00" * self.frame_bytes
+        self._pre_roll = deque(maxlen=max(1, pre_padding_ms // frame_ms))
+        self._pending = b""
+        self._hangover = 0
+        self._last_sent = time.monotonic()
+
+        self.in_speech = False
+        self.last_frame_is_speech = False
+        self.trailing_silence_ms = 0   # ms seguidos sin voz (lo usa el endpointing)
+        self.stats = {"bytes_in": 0, "bytes_sent": 0, "keepalives": 0, "utterances": 0}
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def process(self, chunk):
+        """
+        Recibe un chunk PCM16 de la captura (bytes o memoryview) y devuelve la lista de frames
+        a enviar. Si el chunk es múltiplo del frame, los frames son vistas del chunk (sin copia).
+        """
+        self.stats["bytes_in"] += len(chunk)
+        data = self._pending + bytes(chunk) if self._pending else chunk
+        usable = len(data) // self.frame_bytes * self.frame_bytes
+        self._pending = bytes(data[usable:])
+
+        out = []
+        for start in range(0, usable, self.frame_bytes):
+            frame = data[start:start + self.frame_bytes]
+            out.extend(self._process_frame(frame))
+
+        if out:
+            self._mark_sent(out)
+        else:
+            out = self.keepalive()
+        return out
+
+    def keepalive(self):
+        """Frame de silencio si pasó keepalive_ms sin enviar nada; si no, lista vacía."""
+        now = time.monotonic()
+        if (now - self._last_sent) * 1000 < self.keepalive_ms:
+            return []
+        self.stats["keepalives"] += 1
+        self._mark_sent([self.silence_frame], now)
+        return [self.silence_frame]
+
+    def skip(self, nbytes):
+        """Cuenta audio que no se envió sin pasar por la VAD (por ejemplo, mientras habla el TTS)."""
+        self.stats["bytes_in"] += nbytes
+
+    def reset(self):
+        """Olvida el estado de voz y el relleno (al pausar, para no reenviar audio viejo)."""
+        self._pre_roll.clear()
+        self._pending = b""
+        self._hangover = 0
+        self.in_speech = False
+        self.last_frame_is_speech = False
+        self.trailing_silence_ms = 0
+
+    def seconds(self, nbytes):
+        return nbytes / 2 / self.rate
+
+    def report(self):
+        """Imprime el ahorro de la sesión y lo devuelve."""
+        saved = max(0, self.stats["bytes_in"] - self.stats["bytes_sent"])
+        total = self.stats["bytes_in"] or 1
+        summary = {
+            "bytes_saved": saved,
+            "seconds_saved": self.seconds(saved),
+            "seconds_sent": self.seconds(self.stats["bytes_sent"]),
+            "ratio_saved": saved / total,
+        }
+        print(f"📉 VAD: {summary['seconds_sent']:.1f} s enviados, {summary['seconds_saved']:.1f} s evitados "
+              f"({saved / 1024:.0f} KB, {summary['ratio_saved']:.0%}) | "
+              f"{self.stats['utterances']} intervenciones, {self.stats['keepalives']} keepalives")
+        return summary
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _process_frame(self, frame):
+        is_speech = self.vad.is_speech(frame, self.rate)
+        self.last_frame_is_speech = is_speech
+        self.trailing_silence_ms = 0 if is_speech else self.trailing_silence_ms + self.frame_ms
+
+        if is_speech:
+            self._hangover = self.post_padding_frames
+            if not self.in_speech:
+                # Comienza la voz: se envía primero el relleno previo
+                self.in_speech = True
+                self.stats["utterances"] += 1
+                out = list(self._pre_roll) + [frame]
+                self._pre_roll.clear()
+                return out
+            return [frame]
+
+        if self.in_speech:
+            self._hangover -= 1
+            if self._hangover <= 0:
+                self.in_speech = False
+            return [frame]
+
+        self._pre_roll.append(frame)
+        return []
+
+    def _mark_sent(self, frames, now=None):
+        self.stats["bytes_sent"] += sum(len(f) for f in frames)
+        self._last_sent = now or time.monotonic()
@@ -0,0 +1,109 @@
+# tts/async_speaker.py
+import asyncio
+import time
+
+from config import TTS_CHUNK_WORKERS
+from tts.playback_engine import PlaybackEngine
+
+
+class AsyncSpeaker:
+    """
+    Reproduce texto desde asyncio: el audio de cada frase se pide con astream_pcm() del
+    proveedor y se escribe en una Utterance del PlaybackEngine a medida que llega.
+    Las frases se encolan en orden, así que la segunda se sintetiza mientras suena la primera.
+    Cancelar la tarea que llama a speak()/speak_all() corta en el acto las peticiones de TTS
+    en curso y el audio (sonando o encolado) de esas frases, sin tocar el resto del motor.
+    """
+
+    def __init__(self, tts, player=None, workers=TTS_CHUNK_WORKERS):
+        """
+        tts: proveedor con normalize_text, cached_pcm y astream_pcm (ver TTSProvider)
+        workers: síntesis concurrentes como máximo por respuesta
+        """
+        self.tts = tts
+        self.player = player or PlaybackEngine.instance()
+        self.workers = workers
+        self.last_ttfa_ms = None
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    async def speak(self, text):
+        """Sintetiza (o toma de caché) y reproduce una frase; vuelve cuando terminó de sonar."""
+        await self.speak_all([text])
+
+    async def speak_all(self, texts):
+        """
+        Reproduce en orden las frases de texts: una lista o un iterador async (p. ej. las
+        oraciones que va generando el LLM). Vuelve cuando la última terminó de sonar.
+        """
+        first_audio = {"start": time.perf_counter(), "reported": False}
+        limit = asyncio.Semaphore(self.workers)
+        utterances, fills = [], []
+        try:
+            async for text in _aiter(texts):
+                if not text.strip():
+                    continue
+                utterance = self.player.open_stream(label=self.tts.normalize_text(text)[:30])
+                utterances.append(utterance)
+                fills.append(asyncio.create_task(self._fill(utterance, text, limit, first_audio)))
+            await asyncio.gather(*fills)
+            for utterance in utterances:
+                await self._wait(utterance)
+                self.player.report(utterance)
+        except BaseException:
+            # Cancelación (o error de un proveedor): corta las peticiones y el audio de esta respuesta
+            for task in fills:
+                task.cancel()
+            for utterance in utterances:
+                self.player.cancel(utterance)
+            raise
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    async def _fill(self, utterance, text, limit, first_audio):
+        try:
+            async with limit:
+                pcm = await asyncio.to_thread(self.tts.cached_pcm, text)
+                if pcm is not None:
+                    utterance.write(pcm)
+                    self._report_ttfa(first_audio, "caché")
+                    return
+                async for chunk in self.tts.astream_pcm(text):
+                    if utterance.cancelled:
+                        break
+                    utterance.write(chunk)
+                    self._report_ttfa(first_audio, "streaming async")
+        finally:
+            utterance.close()
+
+    async def _wait(self, utterance):
+        """Espera el fin de la Utterance sin ocupar un hilo: el motor avisa al loop con call_soon_threadsafe."""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def resolve():
+            if not done.done():
+                done.set_result(None)
+
+        utterance.add_done_callback(lambda: loop.call_soon_threadsafe(resolve))
+        await done
+
+    def _report_ttfa(self, first_audio, mode):
+        """Tiempo hasta el primer audio de la respuesta (solo la primera frase que llega)."""
+        if first_audio["reported"]:
+            return
+        first_audio["reported"] = True
+        self.last_ttfa_ms = (time.perf_counter() - first_audio["start"]) * 1000
+        print(f"⏱️ Tiempo hasta primer audio ({mode}): {self.last_ttfa_ms:.0f} ms")
+
+
+async def _aiter(items):
+    """Recorre igual una lista que un iterador async."""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
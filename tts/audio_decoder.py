@@ -0,0 +1,74 @@
+# tts/audio_decoder.py
+import io
+import shutil
+import subprocess
+import time
+import wave
+
+import numpy as np
+from scipy.signal import resample_poly
+from math import gcd
+
+# Tiempo medio de decodificación medido en este proceso (para estimar lo que ahorra la caché PCM)
+_decode_ms = {"total": 0.0, "count": 0}
+
+
+def resample(pcm, from_rate, to_rate):
+    """Cambia la frecuencia de muestreo de un array int16 mono."""
+    if from_rate == to_rate or pcm.size == 0:
+        return pcm
+    g = gcd(from_rate, to_rate)
+    out = resample_poly(pcm.astype(np.float32), to_rate // g, from_rate // g)
+    return np.clip(out, -32768, 32767).astype(np.int16)
+
+
+def decode_to_pcm(audio_bytes, fmt, sample_rate):
+    """
+    Decodifica audio a PCM 16-bit mono en sample_rate.
+    fmt: formato de origen ("pcm_22050", "wav", "mp3", "ogg", ...).
+    PCM y WAV se decodifican en memoria; los formatos comprimidos usan ffmpeg.
+    """
+    if fmt.startswith("pcm"):
+        rate = int(fmt.split("_")[1]) if "_" in fmt else sample_rate
+        pcm = np.frombuffer(audio_bytes[:len(audio_bytes) // 2 * 2], dtype=np.int16)
+        return resample(pcm, rate, sample_rate)
+
+    if audio_bytes[:4] == b"RIFF":
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wf:
+            channels = wf.getnchannels()
+            rate = wf.getframerate()
+            pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        if channels > 1:
+            pcm = pcm.reshape(-1, channels).mean(axis=1).astype(np.int16)
+        return resample(pcm, rate, sample_rate)
+
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError(f"Se necesita ffmpeg para decodificar audio {fmt}")
+    result = subprocess.run(
+        [ffmpeg, "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+        input=audio_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def decode_cached(cache, cache_key, load_audio, fmt, sample_rate):
+    """
+    Caché de PCM decodificado: cada entrada comprimida se decodifica una sola vez.
+    load_audio: función que devuelve los bytes comprimidos (solo se llama si hace falta decodificar).
+    Devuelve (pcm int16, ms de decodificación evitados por la caché; 0 si hubo que decodificar).
+    """
+    pcm_key = cache.make_key(cache_key, decoded="s16le", sample_rate=sample_rate)
+    data = cache.get(pcm_key)
+    if data is not None:
+        saved_ms = _decode_ms["total"] / _decode_ms["count"] if _decode_ms["count"] else 0.0
+        return np.frombuffer(data, dtype=np.int16), saved_ms
+
+    start = time.perf_counter()
+    pcm = decode_to_pcm(load_audio(), fmt, sample_rate)
+    decode_ms = (time.perf_counter() - start) * 1000
+    _decode_ms["total"] += decode_ms
+    _decode_ms["count"] += 1
+    cache.put(pcm_key, pcm.tobytes(), ext="pcm")
+    print(f"🎛️ Audio decodificado a PCM en {decode_ms:.0f} ms (queda en caché)")
+    return pcm, 0.0
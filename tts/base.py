@@ -0,0 +1,61 @@
+# tts/base.py
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+
+
+class TTSProvider(ABC):
+    """
+    Interfaz común de los proveedores de TTS (ElevenLabs, Google) para poder
+    intercambiarlos o competir entre ellos (HedgedTTS).
+    Todo el audio se maneja como PCM 16-bit mono a la frecuencia del PlaybackEngine.
+    """
+
+    name = "tts"
+
+    @abstractmethod
+    def normalize_text(self, text):
+        """Normaliza el texto igual que para calcular la clave de caché."""
+
+    @abstractmethod
+    def cached_pcm(self, text):
+        """PCM del texto si ya está en caché (sin llamar a la API), o None."""
+
+    @abstractmethod
+    def stream_pcm(self, text, cancel_event=None):
+        """
+        Genera el audio como chunks de bytes PCM a medida que llegan de la API y lo guarda en caché
+        al terminar. Si cancel_event se activa, deja de leer, cierra la respuesta y no cachea nada.
+        """
+
+    async def astream_pcm(self, text):
+        """
+        Versión asyncio de stream_pcm para el núcleo async (async_assistant.py). Por defecto
+        corre stream_pcm en el executor del loop y pasa los chunks al loop; los proveedores con
+        cliente async la reemplazan. Cancelar la tarea que itera activa cancel_event.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        cancel_event = threading.Event()
+
+        def produce():
+            try:
+                for chunk in self.stream_pcm(text, cancel_event=cancel_event):
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+        loop.run_in_executor(None, produce)
+        try:
+            while (chunk := await chunks.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            cancel_event.set()
+
+    @abstractmethod
+    def speak(self, text):
+        """Sintetiza (o toma de caché) y reproduce el texto."""
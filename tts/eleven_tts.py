@@ -1,24 +1,49 @@
-import hashlib
-import os
-import re
-from elevenlabs.client import ElevenLabs
-from elevenlabs import play
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from elevenlabs.client import ElevenLabs, AsyncElevenLabs
 from config import ELEVEN_API_KEY
+from tts.tts_cache import TTSCache, normalize_tts_text
+from tts.segment_composer import SegmentComposer, split_template
+from tts.audio_decoder import decode_cached
+from tts.playback_engine import PlaybackEngine
+from tts.base import TTSProvider
 
-CACHE_DIR = "tts_cache"
-os.makedirs(CACHE_DIR, exist_ok=True)
+class ElevenLabsTTS(TTSProvider):
+    name = "elevenlabs"
 
-class ElevenLabsTTS:
-    def __init__(self, voice_id="XrExE9yKIg1WjnnlVkGX", model_id="eleven_multilingual_v2", output_format="mp3_44100_128"):
+    def __init__(self, voice_id="XrExE9yKIg1WjnnlVkGX", model_id="eleven_multilingual_v2", output_format="mp3_44100_128",
+                 streaming=False, cache=None, player=None):
+        """
+        output_format: formato comprimido para synthesize() (prewarm, archivos)
+        streaming: si es True, speak() reproduce los chunks a medida que llegan de la API
+        en lugar de esperar la respuesta completa.
+        cache: instancia de TTSCache (por defecto la compartida del proceso)
+        player: PlaybackEngine (por defecto el compartido del proceso)
+        """
         self.client = ElevenLabs(api_key=ELEVEN_API_KEY)
+        self._async_client = None   # AsyncElevenLabs, se crea con el primer astream_pcm()
         self.voice_id = voice_id
         self.model_id = model_id
         self.output_format = output_format
+        self.streaming = streaming
+        self.cache = cache or TTSCache.default()
+        self.player = player or PlaybackEngine.instance()
+        # Para reproducir se pide PCM a la frecuencia del motor: no hay que decodificar nada
+        self.pcm_format = f"pcm_{self.player.sample_rate}"
+        self.composer = SegmentComposer(sample_rate=self.player.sample_rate)
+        self.segment_stats = {"segments": 0, "cached": 0}
+        # Tiempo hasta el primer audio (ms) de la última llamada a speak()
+        self.last_ttfa_ms = None
 
-    def _get_cache_path(self, text):
-        """Genera un nombre de archivo único para cada texto"""
-        h = hashlib.md5(text.encode("utf-8")).hexdigest()
-        return os.path.join(CACHE_DIR, f"{h}.mp3")
+    def _get_cache_key(self, text, output_format=None):
+        """Clave de caché: texto normalizado + todo lo que cambia el audio generado"""
+        return self.cache.make_key(text, provider="elevenlabs", voice_id=self.voice_id,
+                                   model_id=self.model_id, output_format=output_format or self.output_format)
+
+    def _cache_ext(self, output_format=None):
+        """Extensión del archivo según el formato de salida (mp3_44100_128 -> mp3)"""
+        return (output_format or self.output_format).split("_")[0]
 
     def synthesize_to_file(self, text, output_file="tts_out.mp3"):
         response = self.client.text_to_speech.convert(
@@ -31,49 +56,207 @@ class ElevenLabsTTS:
             for chunk in response:
                 f.write(chunk)
         return output_file
-    
+
     def normalize_text(self, text: str) -> str:
-        # 1. Quitar espacios al inicio y final
-        text = text.strip()
-        # 2. Convertir saltos de línea y tabs a espacio
-        text = re.sub(r"\s+", " ", text)
-        # 3. Opcional: pasar todo a minúsculas si quieres unificar cache sin importar mayúsculas
-        text = text.lower()
-        return text
-
-    def speak(self, text):
+        return normalize_tts_text(text)
+
+    def speak(self, text, stream=None):
+        """
+        Reproduce el texto. stream=None usa el modo configurado en el constructor.
+        """
         if not text.strip():
             return
+        start = time.perf_counter()
+        normalized_text = self.normalize_text(text)
+
+        use_stream = self.streaming if stream is None else stream
+        if use_stream and not self._has_audio(normalized_text):
+            self.speak_streaming(normalized_text, start)
+            return
+
+        pcm, saved_ms = self.get_pcm(normalized_text)
+        self._report_ttfa(start, "completo")
+        self.player.play(pcm, label=normalized_text[:30], saved_ms=saved_ms)
+
+    def is_cached(self, text, output_format=None):
+        """Indica si el audio del texto ya está en caché (sin leerlo)."""
+        return self.cache.contains(self._get_cache_key(self.normalize_text(text), output_format))
+
+    def synthesize(self, text, output_format=None):
+        """
+        Devuelve el audio del texto como bytes (desde caché o sintetizándolo), sin reproducirlo.
+        """
         normalized_text = self.normalize_text(text)
-        cache_file = self._get_cache_path(normalized_text)
-        # Si ya existe en caché, reproducimos directamente
-        if os.path.exists(cache_file):
-            print(f"Archivo en cache {cache_file}")
-            try:
-                print(f"🔊 Reproduciendo desde caché")
-                play(self.open_audio(cache_file))
-                return
-            except Exception:
-                print("⚠️ Error al reproducir desde caché, regenerando audio...")
-        
+        cache_key = self._get_cache_key(normalized_text, output_format)
+        audio_bytes = self.cache.get(cache_key)
+        if audio_bytes is not None:
+            return audio_bytes
+        return self._synthesize_to_cache(normalized_text, cache_key, output_format)
+
+    def synthesize_pcm(self, text):
+        """Audio del texto como PCM 16-bit mono (int16) a la frecuencia del motor de reproducción."""
+        return np.frombuffer(self.synthesize(text, self.pcm_format), dtype=np.int16)
+
+    def get_pcm(self, text):
+        """
+        PCM listo para reproducir. Orden: PCM nativo en caché -> entrada comprimida ya en caché
+        (se decodifica una sola vez a la caché PCM) -> síntesis directa en PCM.
+        Devuelve (pcm, ms de decodificación evitados).
+        """
+        normalized_text = self.normalize_text(text)
+        compressed_key = self._get_cache_key(normalized_text)
+        if not self.is_cached(normalized_text, self.pcm_format) and self.cache.contains(compressed_key):
+            pcm, saved_ms = decode_cached(self.cache, compressed_key, lambda: self.cache.get(compressed_key),
+                                          self._cache_ext(), self.player.sample_rate)
+            if pcm.size:
+                return pcm, saved_ms
+        return self.synthesize_pcm(normalized_text), 0.0
+
+    def prepare_audio(self, text):
+        """Deja el audio listo para play_audio() (usado por el pipeline de oraciones)."""
+        return self.get_pcm(text)
+
+    def play_audio(self, audio):
+        """Reproduce audio devuelto por prepare_audio()."""
+        pcm, saved_ms = audio
+        self.player.play(pcm, saved_ms=saved_ms)
+
+    def speak_template(self, template, **values):
+        """
+        Reproduce un template con partes fijas y variables, p. ej.
+        speak_template("Listen carefully and repeat the following sentence: '{sentence}'", sentence=s).
+        Cada segmento se sintetiza y cachea por separado, así la parte fija se genera una sola vez
+        y solo la variable se sintetiza en cada ítem; luego se unen a nivel PCM con crossfade.
+        """
+        segments = [text for text, _ in split_template(template, **values)]
+        if not segments:
+            return
+        start = time.perf_counter()
+        cached = sum(self.is_cached(text, self.pcm_format) for text in segments)
+        self.segment_stats["segments"] += len(segments)
+        self.segment_stats["cached"] += cached
+
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            pcm_segments = list(executor.map(self.synthesize_pcm, segments))
+        audio = self.composer.compose(pcm_segments)
+
+        ratio = self.segment_stats["cached"] / self.segment_stats["segments"]
+        print(f"🧩 Segmentos desde caché: {cached}/{len(segments)} (acumulado {ratio:.0%})")
+        self._report_ttfa(start, "segmentos")
+        self.player.play(audio, sample_rate=self.composer.sample_rate)
+
+    def _has_audio(self, normalized_text):
+        return self.is_cached(normalized_text, self.pcm_format) or self.is_cached(normalized_text)
+
+    def _synthesize_to_cache(self, normalized_text, cache_key, output_format=None):
         audio = self.client.text_to_speech.convert(
             voice_id=self.voice_id,
             text=normalized_text,
             model_id=self.model_id,
-            output_format=self.output_format
+            output_format=output_format or self.output_format
+        )
+        # Guardar a cache (escritura atómica) y devolver los bytes
+        return self.save_audio(cache_key, audio, output_format)
+
+    def cached_pcm(self, text):
+        """PCM del texto si ya hay audio en caché (nativo o comprimido), sin llamar a la API."""
+        normalized_text = self.normalize_text(text)
+        if not self._has_audio(normalized_text):
+            return None
+        return self.get_pcm(normalized_text)[0]
+
+    def stream_pcm(self, text, cancel_event=None):
+        """
+        Chunks PCM a medida que llegan de la API. Los mismos bytes se escriben en paralelo
+        a la caché; la entrada solo queda visible si el stream terminó completo.
+        """
+        normalized_text = self.normalize_text(text)
+        audio = self.client.text_to_speech.stream(
+            voice_id=self.voice_id,
+            text=normalized_text,
+            model_id=self.model_id,
+            output_format=self.pcm_format
         )
-        # 2. Guardar a cache como bytes
-        self.save_audio(cache_file, audio)
-        
-        # 3. Reproducir desde cache
-        play(self.open_audio(cache_file))
-
-    def save_audio(self, cache_file, audio):
-        with open(cache_file, "wb") as f:
+        writer = self.cache.writer(self._get_cache_key(normalized_text, self.pcm_format), "pcm")
+        completed = False
+        try:
             for chunk in audio:
-                f.write(chunk)
+                if not chunk:
+                    continue
+                writer.write(chunk)
+                yield chunk
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+            else:
+                completed = True
+        finally:
+            # Cerrar el generador de la SDK corta la conexión HTTP
+            if hasattr(audio, "close"):
+                audio.close()
+            if completed:
+                writer.commit()
+            else:
+                writer.abort()
+
+    async def astream_pcm(self, text):
+        """
+        Igual que stream_pcm, con el cliente async de ElevenLabs: no ocupa un hilo por petición.
+        Cancelar la tarea cierra la respuesta HTTP y descarta la entrada de caché a medio escribir.
+        """
+        if self._async_client is None:
+            self._async_client = AsyncElevenLabs(api_key=ELEVEN_API_KEY)
+        normalized_text = self.normalize_text(text)
+        audio = self._async_client.text_to_speech.stream(
+            voice_id=self.voice_id,
+            text=normalized_text,
+            model_id=self.model_id,
+            output_format=self.pcm_format
+        )
+        writer = self.cache.writer(self._get_cache_key(normalized_text, self.pcm_format), "pcm")
+        completed = False
+        try:
+            async for chunk in audio:
+                if not chunk:
+                    continue
+                writer.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if hasattr(audio, "aclose"):
+                await audio.aclose()
+            if completed:
+                writer.commit()
+            else:
+                writer.abort()
+
+    def speak_streaming(self, normalized_text, start=None):
+        """
+        Reproduce el audio a medida que llegan los chunks de la API (PCM, directo al motor
+        de reproducción), cacheándolo en paralelo.
+        """
+        start = start or time.perf_counter()
+        utterance = self.player.open_stream(label=normalized_text[:30])
+        chunks = self.stream_pcm(normalized_text)
+        first_chunk = True
+        try:
+            for chunk in chunks:
+                if utterance.cancelled:
+                    break
+                utterance.write(chunk)
+                if first_chunk:
+                    self._report_ttfa(start, "streaming")
+                    first_chunk = False
+        finally:
+            chunks.close()
+            utterance.close()
+        utterance.wait()
+        self.player.report(utterance)
+
+    def _report_ttfa(self, start, mode):
+        """Registra el tiempo hasta el primer audio para comparar modos de reproducción."""
+        self.last_ttfa_ms = (time.perf_counter() - start) * 1000
+        print(f"⏱️ Tiempo hasta primer audio ({mode}): {self.last_ttfa_ms:.0f} ms")
 
-    def open_audio(self, cache_file):
-        with open(cache_file, "rb") as f:
-            audio_bytes = f.read()
-        return audio_bytes
+    def save_audio(self, cache_key, audio, output_format=None):
+        """Guarda el audio en la caché de forma atómica y devuelve los bytes."""
+        return self.cache.put(cache_key, audio, ext=self._cache_ext(output_format))
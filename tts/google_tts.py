@@ -1,25 +1,92 @@
 from google.cloud import texttospeech
-import pyaudio
-import wave
+import asyncio
 import os
+import threading
+from config import GOOGLE_TTS_ENCODING
+from tts.tts_cache import TTSCache, normalize_tts_text
+from tts.audio_decoder import decode_to_pcm, decode_cached
+from tts.playback_engine import PlaybackEngine
+from tts.base import TTSProvider
 
+# Extensión con la que se guarda cada codificación en la caché
+_EXTENSIONS = {"LINEAR16": "wav", "MP3": "mp3", "OGG_OPUS": "ogg"}
+# Opus solo admite 8/12/16/24/48 kHz: se pide a 24 kHz y decode_cached remuestrea al motor.
+# MP3 va con la frecuencia por defecto de la voz; solo LINEAR16 se pide a la del motor.
+_OPUS_SAMPLE_RATE = 24000
 
-class GoogleTTS:
-    def __init__(self, language_code="en-US", voice_name=None, speaking_rate=1.0):
+
+class GoogleTTS(TTSProvider):
+    name = "google"
+
+    def __init__(self, language_code="en-US", voice_name=None, speaking_rate=1.0,
+                 audio_encoding=GOOGLE_TTS_ENCODING, cache=None, player=None):
         """
         language_code: Código de idioma (ej: "en-US", "es-ES", "es-CL")
         voice_name: Nombre específico de la voz (opcional)
         speaking_rate: Velocidad de habla (1.0 = normal)
+        audio_encoding: LINEAR16, OGG_OPUS o MP3 (los dos últimos ocupan mucho menos en caché)
+        cache: instancia de TTSCache (por defecto la compartida del proceso)
+        player: PlaybackEngine (por defecto el compartido del proceso)
         """
+        if audio_encoding not in _EXTENSIONS:
+            raise ValueError(f"audio_encoding no soportado: {audio_encoding}")
         self.client = texttospeech.TextToSpeechClient()
+        self._async_client = None   # TextToSpeechAsyncClient, se crea con el primer astream_pcm()
         self.language_code = language_code
         self.voice_name = voice_name
         self.speaking_rate = speaking_rate
+        self.audio_encoding = audio_encoding
+        self.cache = cache or TTSCache.default()
+        self.player = player or PlaybackEngine.instance()
+        # Evita sintetizar dos veces el mismo texto si lo piden varios hilos a la vez
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def normalize_text(self, text):
+        return normalize_tts_text(text)
+
+    def _get_cache_key(self, text):
+        """Clave de caché: texto normalizado + todo lo que cambia el audio generado"""
+        return self.cache.make_key(text, provider="google", language_code=self.language_code,
+                                   voice_name=self.voice_name or "", speaking_rate=self.speaking_rate,
+                                   audio_encoding=self.audio_encoding, sample_rate=self.player.sample_rate)
 
-    def synthesize(self, text, output_file="output.wav"):
+    def is_cached(self, text):
+        return self.cache.contains(self._get_cache_key(self.normalize_text(text)))
+
+    def synthesize_bytes(self, text):
         """
-        Convierte texto en voz, guarda en archivo WAV y lo retorna.
+        Devuelve el audio codificado (audio_encoding) en memoria, desde caché o desde la API.
+        Es seguro llamarlo desde varios hilos a la vez.
         """
+        normalized_text = self.normalize_text(text)
+        cache_key = self._get_cache_key(normalized_text)
+        audio_bytes = self.cache.get(cache_key)
+        if audio_bytes is not None:
+            return audio_bytes
+
+        with self._inflight_lock:
+            lock = self._inflight.setdefault(cache_key, threading.Lock())
+        try:
+            with lock:
+                # Otro hilo pudo haberlo sintetizado mientras esperábamos
+                audio_bytes = self.cache.get(cache_key)
+                if audio_bytes is None:
+                    audio_bytes = self._request(normalized_text)
+                    self.cache.put(cache_key, audio_bytes, ext=_EXTENSIONS[self.audio_encoding])
+        finally:
+            # También si la API falló: si no, el lock de la clave queda para siempre en _inflight
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
+        return audio_bytes
+
+    def _request(self, text):
+        # Solicitud a la API de Google
+        response = self.client.synthesize_speech(**self._synthesis_params(text))
+        return response.audio_content
+
+    def _synthesis_params(self, text):
+        """Argumentos de synthesize_speech (los mismos para el cliente sync y el async)."""
         input_text = texttospeech.SynthesisInput(text=text)
 
         # Configuración de voz
@@ -31,23 +98,82 @@ class GoogleTTS:
 
         # Configuración de salida
         audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.LINEAR16,
-            speaking_rate=self.speaking_rate
+            audio_encoding=getattr(texttospeech.AudioEncoding, self.audio_encoding),
+            speaking_rate=self.speaking_rate,
+            sample_rate_hertz=self._request_sample_rate()
         )
+        return {"input": input_text, "voice": voice_params, "audio_config": audio_config}
 
-        # Solicitud a la API de Google
-        response = self.client.synthesize_speech(
-            input=input_text,
-            voice=voice_params,
-            audio_config=audio_config
-        )
+    def _request_sample_rate(self):
+        """Frecuencia pedida a la API (0 = la nativa de la voz), válida para audio_encoding."""
+        if self.audio_encoding == "LINEAR16":
+            return self.player.sample_rate
+        if self.audio_encoding == "OGG_OPUS":
+            return _OPUS_SAMPLE_RATE
+        return 0
 
-        # Guardar archivo WAV
+    def synthesize(self, text, output_file=None):
+        """
+        Convierte texto en voz. Sin output_file devuelve los bytes en memoria;
+        con output_file además los guarda en ese archivo y retorna la ruta.
+        """
+        audio_bytes = self.synthesize_bytes(text)
+        if output_file is None:
+            return audio_bytes
         with open(output_file, "wb") as out:
-            out.write(response.audio_content)
-
+            out.write(audio_bytes)
         return output_file
 
+    def get_pcm(self, text):
+        """
+        PCM listo para reproducir. LINEAR16 se decodifica en memoria (solo el encabezado WAV);
+        OGG_OPUS y MP3 se decodifican una vez y el resultado queda en la caché PCM.
+        Devuelve (pcm, ms de decodificación evitados).
+        """
+        if self.audio_encoding == "LINEAR16":
+            return decode_to_pcm(self.synthesize_bytes(text), "wav", self.player.sample_rate), 0.0
+        cache_key = self._get_cache_key(self.normalize_text(text))
+        return decode_cached(self.cache, cache_key, lambda: self.synthesize_bytes(text),
+                             _EXTENSIONS[self.audio_encoding], self.player.sample_rate)
+
+    def cached_pcm(self, text):
+        """PCM del texto si ya está en caché, sin llamar a la API."""
+        if not self.is_cached(text):
+            return None
+        return self.get_pcm(text)[0]
+
+    def stream_pcm(self, text, cancel_event=None):
+        """
+        Google entrega el audio completo en una sola respuesta: se emite como un único chunk PCM.
+        La petición en curso no se puede cortar; si se canceló, el resultado igual queda en caché.
+        """
+        pcm, _ = self.get_pcm(text)
+        yield pcm.tobytes()
+
+    async def astream_pcm(self, text):
+        """
+        Versión asyncio: la petición va por TextToSpeechAsyncClient (cancelable, a diferencia de
+        stream_pcm) y solo la decodificación (ffmpeg para OGG_OPUS/MP3) corre en el executor.
+        """
+        normalized_text = self.normalize_text(text)
+        cache_key = self._get_cache_key(normalized_text)
+        if not self.cache.contains(cache_key):
+            if self._async_client is None:
+                self._async_client = texttospeech.TextToSpeechAsyncClient()
+            response = await self._async_client.synthesize_speech(**self._synthesis_params(normalized_text))
+            self.cache.put(cache_key, response.audio_content, ext=_EXTENSIONS[self.audio_encoding])
+        pcm, _ = await asyncio.to_thread(self.get_pcm, normalized_text)
+        yield pcm.tobytes()
+
+    def prepare_audio(self, text):
+        """Deja el audio listo para play_audio() (usado por el pipeline de oraciones)."""
+        return self.get_pcm(text)
+
+    def play_audio(self, audio):
+        """Reproduce audio devuelto por prepare_audio()."""
+        pcm, saved_ms = audio
+        self.player.play(pcm, saved_ms=saved_ms)
+
     def play(self, file_path):
         """
         Reproduce un archivo WAV.
@@ -55,28 +181,14 @@ class GoogleTTS:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
 
-        wf = wave.open(file_path, 'rb')
-        p = pyaudio.PyAudio()
-
-        stream = p.open(format=p.get_format_from_width(wf.getsampwidth()),
-                        channels=wf.getnchannels(),
-                        rate=wf.getframerate(),
-                        output=True)
-
-        data = wf.readframes(1024)
-        while data:
-            stream.write(data)
-            data = wf.readframes(1024)
-
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+        with open(file_path, "rb") as f:
+            pcm = decode_to_pcm(f.read(), "wav", self.player.sample_rate)
+        self.player.play(pcm)
 
     def speak(self, text):
         """
-        Convierte texto en voz y lo reproduce directamente (sin guardar archivo permanente).
+        Convierte texto en voz y lo reproduce directamente desde memoria (sin archivos temporales).
         """
-        temp_file = "temp_tts.wav"
-        self.synthesize(text, temp_file)
-        self.play(temp_file)
-        os.remove(temp_file)
+        if not text.strip():
+            return
+        self.play_audio(self.get_pcm(text))
@@ -0,0 +1,233 @@
+# tts/hedged_tts.py
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import TTS_HEDGE_DEADLINE_MS, TTS_HEDGE_MIN_DEADLINE_MS, TTS_HEDGE_MAX_DEADLINE_MS
+from tts.playback_engine import PlaybackEngine
+from tts.segment_composer import SegmentComposer, split_template
+from utils.latency_tracker import LatencyTracker
+
+
+class _Attempt:
+    """Una petición de síntesis a un proveedor, corriendo en su propio hilo."""
+
+    def __init__(self, provider, text, events, started_at, tracker):
+        self.provider = provider
+        self.tracker = tracker
+        self.cancel = threading.Event()
+        self.started_at = started_at
+        self.first_byte_ms = None
+        self.error = None
+        self._events = events
+        self._thread = threading.Thread(target=self._run, args=(text,), daemon=True,
+                                        name=f"tts-hedge-{provider.name}")
+        self._thread.start()
+
+    def _run(self, text):
+        try:
+            for chunk in self.provider.stream_pcm(text, cancel_event=self.cancel):
+                if self.first_byte_ms is None:
+                    # Se registra aunque este intento pierda: así los percentiles no quedan sesgados
+                    self.first_byte_ms = (time.perf_counter() - self.started_at) * 1000
+                    self.tracker.add(self.first_byte_ms)
+                if self.cancel.is_set():
+                    return
+                self._events.put((self, chunk))
+            if self.first_byte_ms is None and not self.cancel.is_set():
+                # Stream vacío sin excepción: que el log diga por qué perdió este intento
+                self.error = RuntimeError("sin audio")
+        except Exception as e:
+            self.error = e
+        self._events.put((self, None))
+
+
+class HedgedTTS:
+    """
+    Front-end de TTS con peticiones "hedged": empieza con el proveedor primario y, si el
+    primer byte de audio no llega antes del deadline, lanza también el secundario en paralelo.
+    Reproduce el que responda primero y cancela al otro.
+    El deadline se ajusta solo al percentil 95 de la latencia al primer byte del primario,
+    de modo que solo ~5% de las frases disparan la petición extra.
+    """
+
+    def __init__(self, primary, secondary, player=None, deadline_ms=TTS_HEDGE_DEADLINE_MS,
+                 min_deadline_ms=TTS_HEDGE_MIN_DEADLINE_MS, max_deadline_ms=TTS_HEDGE_MAX_DEADLINE_MS,
+                 percentile=95, min_samples=20):
+        """
+        primary, secondary: proveedores que implementan TTSProvider
+        deadline_ms: espera inicial por el primer byte del primario antes de lanzar el secundario
+        min_deadline_ms, max_deadline_ms: límites del deadline adaptativo
+        percentile: percentil de latencia del primario usado como deadline
+        min_samples: muestras necesarias antes de adaptar el deadline
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.player = player or PlaybackEngine.instance()
+        self.initial_deadline_ms = deadline_ms
+        self.min_deadline_ms = min_deadline_ms
+        self.max_deadline_ms = max_deadline_ms
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latency = {primary.name: LatencyTracker(), secondary.name: LatencyTracker()}
+        self.stats = {"requests": 0, "hedged": 0, "cache": 0,
+                      "wins": {primary.name: 0, secondary.name: 0}, "failures": 0}
+        # Las uniones de speak_template suenan como las del primario (mismo crossfade y volumen)
+        self.composer = getattr(primary, "composer", None) or SegmentComposer(sample_rate=self.player.sample_rate)
+        self._stats_lock = threading.Lock()
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    @property
+    def deadline_ms(self):
+        """Deadline actual: percentil del primario acotado, o el inicial si aún no hay datos."""
+        tracker = self.latency[self.primary.name]
+        if len(tracker) < self.min_samples:
+            return self.initial_deadline_ms
+        return min(self.max_deadline_ms, max(self.min_deadline_ms, tracker.percentile(self.percentile)))
+
+    def normalize_text(self, text):
+        return self.primary.normalize_text(text)
+
+    def speak(self, text):
+        """Reproduce el texto con el proveedor que entregue audio primero (en streaming)."""
+        if not text.strip():
+            return
+        pcm = self._from_cache(text)
+        if pcm is not None:
+            self.player.play(pcm)
+            return
+
+        winner, first_chunk, events = self._race(text)
+        utterance = self.player.open_stream(label=text[:30])
+        try:
+            utterance.write(first_chunk)
+            for chunk in self._winner_chunks(winner, events):
+                if utterance.cancelled:
+                    winner.cancel.set()
+                    break
+                utterance.write(chunk)
+        finally:
+            utterance.close()
+        utterance.wait()
+        self.player.report(utterance)
+
+    def prepare_audio(self, text):
+        """Audio completo del ganador, para el pipeline de oraciones (ver play_audio)."""
+        pcm = self._from_cache(text)
+        if pcm is not None:
+            return pcm, 0.0
+        winner, first_chunk, events = self._race(text)
+        data = bytearray(first_chunk)
+        for chunk in self._winner_chunks(winner, events):
+            data.extend(chunk)
+        return np.frombuffer(bytes(data[:len(data) // 2 * 2]), dtype=np.int16), 0.0
+
+    def play_audio(self, audio):
+        pcm, saved_ms = audio
+        self.player.play(pcm, saved_ms=saved_ms)
+
+    def speak_template(self, template, **values):
+        """
+        Como ElevenLabsTTS.speak_template: cada segmento del template sale de caché (de
+        cualquiera de los dos proveedores) y solo los que faltan se piden, con hedge y en
+        paralelo; después se unen con el composer del primario.
+        """
+        segments = [text for text, _ in split_template(template, **values)]
+        if not segments:
+            return
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            pcm_segments = [pcm for pcm, _ in executor.map(self.prepare_audio, segments)]
+        self.player.play(self.composer.compose(pcm_segments), sample_rate=self.composer.sample_rate)
+
+    def report(self):
+        """Resumen de hedging y percentiles de latencia al primer byte por proveedor."""
+        print(f"📊 TTS hedged: {self.stats['requests']} peticiones, {self.stats['hedged']} con hedge, "
+              f"{self.stats['cache']} desde caché, ganadores {self.stats['wins']}, "
+              f"deadline actual {self.deadline_ms:.0f} ms")
+        for name, tracker in self.latency.items():
+            summary = tracker.summary()
+            if summary["count"]:
+                print(f"   {name}: p50 {summary['p50']:.0f} ms | p95 {summary['p95']:.0f} ms | "
+                      f"p99 {summary['p99']:.0f} ms ({summary['count']} muestras)")
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _from_cache(self, text):
+        for provider in (self.primary, self.secondary):
+            pcm = provider.cached_pcm(text)
+            if pcm is not None:
+                with self._stats_lock:
+                    self.stats["cache"] += 1
+                return pcm
+        return None
+
+    def _race(self, text):
+        """
+        Lanza el primario, y el secundario si vence el deadline o el primario falla.
+        Devuelve (intento ganador, primer chunk, cola de eventos).
+        """
+        with self._stats_lock:
+            self.stats["requests"] += 1
+        events = queue.Queue()
+        start = time.perf_counter()
+        deadline = start + self.deadline_ms / 1000
+        attempts = [self._attempt(self.primary, text, events, start)]
+        finished = set()
+
+        while True:
+            hedged = len(attempts) > 1
+            timeout = None if hedged else max(0.0, deadline - time.perf_counter())
+            try:
+                attempt, chunk = events.get(timeout=timeout)
+            except queue.Empty:
+                attempt = None
+            if attempt is None or (chunk is None and not hedged):
+                # Deadline vencido o el primario terminó sin audio: entra el secundario
+                if attempt is not None:
+                    finished.add(attempt)
+                    print(f"⚠️ {attempt.provider.name} falló: {attempt.error}")
+                if not hedged:
+                    with self._stats_lock:
+                        self.stats["hedged"] += 1
+                    if attempt is None:
+                        print(f"⏱️ Sin audio de {self.primary.name} en {self.deadline_ms:.0f} ms, "
+                              f"lanzando {self.secondary.name}")
+                    attempts.append(self._attempt(self.secondary, text, events, time.perf_counter()))
+                continue
+            if chunk is None:
+                finished.add(attempt)
+                if len(finished) == len(attempts):
+                    with self._stats_lock:
+                        self.stats["failures"] += 1
+                    raise RuntimeError(f"Ningún proveedor de TTS entregó audio: "
+                                       f"{[a.error for a in attempts]}")
+                continue
+
+            # Primer audio: este intento gana, el resto se cancela
+            with self._stats_lock:
+                self.stats["wins"][attempt.provider.name] += 1
+            for other in attempts:
+                if other is not attempt:
+                    other.cancel.set()
+            return attempt, chunk, events
+
+    def _attempt(self, provider, text, events, started_at):
+        return _Attempt(provider, text, events, started_at, self.latency[provider.name])
+
+    def _winner_chunks(self, winner, events):
+        """Chunks restantes del ganador (descarta lo que siga llegando del perdedor)."""
+        while True:
+            attempt, chunk = events.get()
+            if attempt is not winner:
+                continue
+            if chunk is None:
+                if winner.error:
+                    print(f"⚠️ {winner.provider.name} se cortó a mitad del audio: {winner.error}")
+                return
+            yield chunk
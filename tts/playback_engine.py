@@ -0,0 +1,319 @@
+# tts/playback_engine.py
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from config import PLAYBACK_RATE, PLAYBACK_BLOCKSIZE
+from tts.audio_decoder import resample
+from utils.latency_tracker import LatencyTracker
+
+
+class Utterance:
+    """
+    Un audio encolado en el PlaybackEngine. Puede recibir todo el PCM de una vez
+    o por partes (write) mientras se reproduce, y avisa con `done` cuando terminó de sonar.
+    """
+
+    def __init__(self, label="", saved_ms=0.0):
+        self.label = label
+        self.saved_ms = saved_ms       # ms de decodificación evitados (caché PCM)
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = False
+        self.done = threading.Event()
+        self._chunks = deque()
+        self._offset = 0
+        self._pending_byte = b""
+        self._closed = False
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def write(self, pcm):
+        """Agrega audio: array int16 o bytes PCM16 (acepta chunks con un byte suelto)."""
+        if isinstance(pcm, (bytes, bytearray, memoryview)):
+            data = self._pending_byte + bytes(pcm)
+            even = len(data) // 2 * 2
+            self._pending_byte = data[even:]
+            pcm = np.frombuffer(data[:even], dtype=np.int16)
+        if pcm.size:
+            self._chunks.append(pcm)
+
+    def close(self):
+        """Indica que no llegará más audio."""
+        self._closed = True
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def add_done_callback(self, callback):
+        """
+        Llama a callback() cuando termina de sonar o se cancela (enseguida si ya terminó).
+        Puede correr en el hilo de audio: debe ser inmediato (p. ej. call_soon_threadsafe).
+        """
+        with self._callbacks_lock:
+            if not self.done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def _finish(self, cancelled=False):
+        if cancelled:
+            self.cancelled = True
+        self.finished_at = time.perf_counter()
+        with self._callbacks_lock:
+            self.done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def _read_into(self, out):
+        """Copia muestras a `out` (llamado desde el callback de audio). Devuelve cuántas copió."""
+        filled = 0
+        while filled < out.size and self._chunks:
+            chunk = self._chunks[0]
+            n = min(out.size - filled, chunk.size - self._offset)
+            out[filled:filled + n] = chunk[self._offset:self._offset + n]
+            filled += n
+            self._offset += n
+            if self._offset >= chunk.size:
+                self._chunks.popleft()
+                self._offset = 0
+        return filled
+
+    def _exhausted(self):
+        return self._closed and not self._chunks
+
+
+class PlaybackEngine:
+    """
+    Motor de reproducción en el mismo proceso: un único sounddevice.OutputStream abierto
+    durante toda la vida del proceso, al que se le encolan audios PCM ya decodificados.
+    Evita lanzar un reproductor externo por frase (elevenlabs.play) o abrir y cerrar
+    PyAudio por clip, y reporta cuánto tiempo de arranque se ahorra por frase.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """Motor compartido por todos los backends de TTS del proceso."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, sample_rate=PLAYBACK_RATE, blocksize=PLAYBACK_BLOCKSIZE):
+        """
+        sample_rate: frecuencia del stream de salida (los audios se remuestrean si difieren)
+        blocksize: frames por callback; acota cuánto tarda en cortarse el audio con flush()
+        """
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.stream = None
+        self.playback_finished = threading.Event()
+        self.playback_finished.set()
+        self.stats = {"utterances": 0, "startup_ms": 0.0, "saved_ms": 0.0}
+        self.legacy_startup_ms = None
+        self.silence_latency = LatencyTracker()  # ms desde flush() hasta el primer bloque en silencio
+        self.silenced = threading.Event()
+        self._flush_at = None
+        self._discarding = False
+        self._references = []  # receptores de lo que se reproduce (p. ej. cancelación de eco)
+        self._queue = deque()
+        self._current = None
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def start(self):
+        """Abre el stream de salida (una sola vez)."""
+        # Import diferido: el servidor (RemotePlaybackEngine) corre sin dispositivo de audio
+        import sounddevice as sd
+        with self._lock:
+            if self.stream is not None:
+                return
+            self.stream = sd.OutputStream(samplerate=self.sample_rate, channels=1, dtype="int16",
+                                          blocksize=self.blocksize, latency="low", callback=self._callback)
+            self.stream.start()
+        threading.Thread(target=self._measure_legacy_startup, daemon=True).start()
+        print(f"🔈 Motor de reproducción iniciado ({self.sample_rate} Hz)")
+
+    def stop(self):
+        """Corta lo que esté sonando y cierra el stream de salida."""
+        self.flush()
+        with self._lock:
+            stream, self.stream = self.stream, None
+        if stream is not None:
+            stream.stop()
+            stream.close()
+
+    def flush(self):
+        """
+        Descarta el audio en curso y el encolado; la salida queda en silencio en el próximo bloque,
+        es decir, como máximo blocksize / sample_rate más la latencia del dispositivo.
+        """
+        with self._lock:
+            pending = list(self._queue)
+            if self._current is not None:
+                pending.append(self._current)
+            self._queue.clear()
+            self._current = None
+            if pending and self.stream is not None:
+                self._flush_at = time.perf_counter()
+                self.silenced.clear()
+        for utterance in pending:
+            utterance._finish(cancelled=True)
+        self.playback_finished.set()
+
+    def interrupt(self):
+        """
+        Corta la reproducción (flush) y descarta todo audio que se encole hasta resume():
+        así una síntesis que termina después de la interrupción tampoco llega a sonar.
+        """
+        with self._lock:
+            self._discarding = True
+        self.flush()
+
+    def resume(self):
+        """Vuelve a aceptar audio después de interrupt()."""
+        with self._lock:
+            self._discarding = False
+
+    def play(self, pcm, sample_rate=None, wait=True, label="", saved_ms=0.0):
+        """
+        Reproduce un array int16 mono. Con wait=True bloquea hasta que termina de sonar.
+        saved_ms: ms de decodificación que se evitaron gracias a la caché PCM (para el reporte).
+        """
+        if sample_rate and sample_rate != self.sample_rate:
+            pcm = resample(pcm, sample_rate, self.sample_rate)
+        utterance = Utterance(label, saved_ms)
+        utterance.write(pcm)
+        utterance.close()
+        self._enqueue(utterance)
+        if wait:
+            utterance.wait()
+            self.report(utterance)
+        return utterance
+
+    def open_stream(self, label=""):
+        """Utterance que se reproduce mientras se le escribe PCM (a sample_rate del motor)."""
+        utterance = Utterance(label)
+        self._enqueue(utterance)
+        return utterance
+
+    def cancel(self, utterance):
+        """Corta solo esta utterance (sonando o encolada); el resto de la cola sigue."""
+        with self._lock:
+            if utterance is self._current:
+                self._current = None
+            elif utterance in self._queue:
+                self._queue.remove(utterance)
+            elif utterance.done.is_set():
+                return
+            idle = self._current is None and not self._queue
+        utterance._finish(cancelled=True)
+        if idle:
+            self.playback_finished.set()
+
+    def wait(self, timeout=None):
+        """Espera a que no quede nada por reproducir."""
+        return self.playback_finished.wait(timeout)
+
+    def is_playing(self):
+        return not self.playback_finished.is_set()
+
+    def report(self, utterance):
+        """Imprime el arranque de la frase y el ahorro estimado frente al reproductor externo."""
+        if utterance.started_at is None:
+            return
+        startup_ms = (utterance.started_at - utterance.enqueued_at) * 1000
+        saved_ms = max(0.0, (self.legacy_startup_ms or 0.0) + utterance.saved_ms - startup_ms)
+        self.stats["utterances"] += 1
+        self.stats["startup_ms"] += startup_ms
+        self.stats["saved_ms"] += saved_ms
+        print(f"⚡ Audio en {startup_ms:.0f} ms (ahorro estimado {saved_ms:.0f} ms vs. reproductor externo)")
+
+    def add_reference(self, reference):
+        """Registra un receptor con push(bloque int16) que recibe cada bloque de salida, incluido el silencio."""
+        self._references.append(reference)
+
+    def report_interruptions(self):
+        """Resumen de la latencia desde la interrupción hasta el silencio."""
+        summary = self.silence_latency.summary()
+        if summary["count"]:
+            print(f"📊 Interrupción -> silencio: p50 {summary['p50']:.0f} ms | p95 {summary['p95']:.0f} ms "
+                  f"| máx. teórico {self.max_silence_latency_ms():.0f} ms ({summary['count']} interrupciones)")
+        return summary
+
+    def max_silence_latency_ms(self):
+        """Cota de flush(): un bloque de salida más la latencia del dispositivo."""
+        device_ms = (self.stream.latency * 1000) if self.stream is not None else 0.0
+        return self.blocksize / self.sample_rate * 1000 + device_ms
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _enqueue(self, utterance):
+        self.start()
+        with self._lock:
+            if not self._discarding:
+                self._queue.append(utterance)
+                self.playback_finished.clear()
+                return
+        # Interrumpido: el audio se descarta sin sonar
+        utterance._finish(cancelled=True)
+
+    def _callback(self, outdata, frames, time_info, status):
+        out = outdata[:, 0]
+        filled = 0
+        with self._lock:
+            while filled < frames:
+                if self._current is None:
+                    if not self._queue:
+                        break
+                    self._current = self._queue.popleft()
+                utterance = self._current
+                n = utterance._read_into(out[filled:])
+                if n and utterance.started_at is None:
+                    utterance.started_at = time.perf_counter()
+                filled += n
+                if utterance._exhausted():
+                    utterance._finish()
+                    self._current = None
+                elif n == 0:
+                    break  # stream que todavía no recibió más audio
+            idle = self._current is None and not self._queue
+            flush_at = self._flush_at if filled == 0 else None
+            if flush_at is not None:
+                self._flush_at = None
+        out[filled:] = 0
+        for reference in self._references:
+            reference.push(out)
+        if flush_at is not None:
+            # Primer bloque en silencio después de flush(): suena tras la latencia del dispositivo
+            latency_ms = (time.perf_counter() - flush_at + (self.stream.latency if self.stream else 0.0)) * 1000
+            self.silence_latency.add(latency_ms)
+            self.silenced.set()
+        if idle:
+            self.playback_finished.set()
+
+    def _measure_legacy_startup(self):
+        """Mide una vez cuánto tarda en arrancar un reproductor externo (lo que usaba elevenlabs.play)."""
+        player = shutil.which("ffplay")
+        if not player:
+            self.legacy_startup_ms = 0.0
+            return
+        start = time.perf_counter()
+        try:
+            subprocess.run([player, "-version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+        except (OSError, subprocess.SubprocessError):
+            self.legacy_startup_ms = 0.0
+            return
+        self.legacy_startup_ms = (time.perf_counter() - start) * 1000
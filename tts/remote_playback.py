@@ -0,0 +1,77 @@
+# tts/remote_playback.py
+import asyncio
+
+import numpy as np
+
+from config import PLAYBACK_RATE, SERVER_AUDIO_BLOCK_MS
+from tts.playback_engine import PlaybackEngine
+
+
+class _RemoteOutputStream:
+    """
+    Hace de sd.OutputStream para un cliente remoto: una tarea del event loop le pide al motor
+    un bloque cada blocksize / samplerate segundos (el ritmo al que el cliente lo reproduce)
+    y lo envía mientras haya algo sonando. Así el corte por interrupción o cancelación
+    funciona igual que con el parlante: el audio que no salió todavía no se envía.
+    """
+
+    latency = 0.0   # la del cliente no se conoce desde el servidor
+
+    def __init__(self, engine, send, samplerate, blocksize):
+        self.engine = engine
+        self.send = send
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.stats = {"blocks": 0, "bytes": 0}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def close(self):
+        pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        block = np.zeros((self.blocksize, 1), dtype=np.int16)
+        period = self.blocksize / self.samplerate
+        next_tick = loop.time()
+        while True:
+            playing = self.engine.is_playing()
+            self.engine._callback(block, self.blocksize, None, None)
+            if playing:
+                data = block.tobytes()
+                self.stats["blocks"] += 1
+                self.stats["bytes"] += len(data)
+                await self.send(data)
+            next_tick = max(next_tick + period, loop.time() - period)
+            await asyncio.sleep(next_tick - loop.time())
+
+
+class RemotePlaybackEngine(PlaybackEngine):
+    """
+    PlaybackEngine de una sesión remota (servidor): la misma cola de Utterances, interrupt(),
+    cancel() y métricas, pero la salida es una corrutina send(bytes PCM16) hacia el cliente
+    (p. ej. un WebSocket) en bloques de SERVER_AUDIO_BLOCK_MS en vez del parlante.
+    Un motor por sesión: cortar el audio de un alumno no toca a los demás.
+    """
+
+    def __init__(self, send, sample_rate=PLAYBACK_RATE, block_ms=SERVER_AUDIO_BLOCK_MS):
+        super().__init__(sample_rate=sample_rate, blocksize=int(sample_rate * block_ms / 1000))
+        self.send = send
+        self.legacy_startup_ms = 0.0   # no hay reproductor externo con el que comparar
+
+    def start(self):
+        """Arranca la tarea de envío (una sola vez, desde el event loop)."""
+        with self._lock:
+            if self.stream is not None:
+                return
+            self.stream = _RemoteOutputStream(self, self.send, self.sample_rate, self.blocksize)
+            self.stream.start()
+
+    def report(self, utterance):
+        """Sin impresión por frase: con muchas sesiones las métricas van al resumen del servidor."""
@@ -0,0 +1,99 @@
+# tts/segment_composer.py
+import re
+import string
+
+import numpy as np
+
+
+def split_template(template, **values):
+    """
+    Divide un template estilo str.format en segmentos hablables.
+    Devuelve una lista de (texto, es_variable). Los literales se limpian de comillas
+    y espacios sobrantes, y se descartan los que no tienen nada que pronunciar.
+
+    "Listen carefully and repeat the following sentence: '{sentence}'"
+        -> [("Listen carefully and repeat the following sentence:", False), ("<frase>", True)]
+    """
+    segments = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        literal = literal.strip().strip("'\"“”‘’").strip()
+        if re.search(r"\w", literal):
+            segments.append((literal, False))
+        if field is not None:
+            value = format(values[field], spec or "")
+            if re.search(r"\w", value):
+                segments.append((value.strip(), True))
+    return segments
+
+
+class SegmentComposer:
+    """
+    Une segmentos de audio PCM 16-bit mono sintetizados por separado:
+    recorta silencios en las uniones, iguala el volumen de cada segmento y los une
+    con un crossfade corto para que no se note el corte.
+    """
+
+    def __init__(self, sample_rate=22050, crossfade_ms=12, gap_ms=120, target_dbfs=-20.0,
+                 silence_threshold=0.01):
+        """
+        sample_rate: frecuencia de los segmentos (Hz)
+        crossfade_ms: duración del crossfade en cada unión
+        gap_ms: pausa entre segmentos (como la coma o los dos puntos al hablar)
+        target_dbfs: volumen RMS al que se normaliza cada segmento
+        silence_threshold: amplitud (0-1) bajo la cual se considera silencio al recortar
+        """
+        self.sample_rate = sample_rate
+        self.crossfade = int(sample_rate * crossfade_ms / 1000)
+        self.gap = int(sample_rate * gap_ms / 1000)
+        self.target_rms = 10 ** (target_dbfs / 20)
+        self.silence_threshold = silence_threshold
+
+    def compose(self, segments):
+        """
+        segments: lista de arrays int16 (o bytes PCM16) en el mismo sample_rate.
+        Devuelve un array int16 con el audio unido.
+        """
+        parts = [self._prepare(seg) for seg in segments]
+        parts = [p for p in parts if p.size]
+        if not parts:
+            return np.zeros(0, dtype=np.int16)
+
+        out = parts[0]
+        for part in parts[1:]:
+            out = np.concatenate([out, np.zeros(self.gap, dtype=np.float32)])
+            out = self._crossfade(out, part)
+        return (np.clip(out, -1.0, 1.0) * 32767).astype(np.int16)
+
+    def _prepare(self, segment):
+        if isinstance(segment, (bytes, bytearray, memoryview)):
+            segment = np.frombuffer(segment, dtype=np.int16)
+        audio = segment.astype(np.float32) / 32768.0
+        return self._match_loudness(self._trim(audio))
+
+    def _trim(self, audio):
+        """Recorta silencio al inicio y al final."""
+        voiced = np.flatnonzero(np.abs(audio) > self.silence_threshold)
+        if voiced.size == 0:
+            return audio[:0]
+        return audio[voiced[0]:voiced[-1] + 1]
+
+    def _match_loudness(self, audio):
+        """Escala el segmento al RMS objetivo (medido solo en las partes con voz)."""
+        voiced = audio[np.abs(audio) > self.silence_threshold]
+        if voiced.size == 0:
+            return audio
+        rms = np.sqrt(np.mean(np.square(voiced)))
+        gain = np.clip(self.target_rms / max(rms, 1e-6), 0.25, 4.0)
+        peak = np.max(np.abs(audio)) * gain
+        if peak > 0.99:
+            gain *= 0.99 / peak  # evitar saturar
+        return audio * gain
+
+    def _crossfade(self, a, b):
+        """Superpone el final de a con el inicio de b usando curvas de igual potencia."""
+        n = min(self.crossfade, a.size, b.size)
+        if n == 0:
+            return np.concatenate([a, b])
+        t = np.linspace(0.0, np.pi / 2, n, dtype=np.float32)
+        mixed = a[-n:] * np.cos(t) + b[:n] * np.sin(t)
+        return np.concatenate([a[:-n], mixed, b[n:]])
@@ -0,0 +1,416 @@
+# tts/tts_cache.py
+import atexit
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from config import TTS_CACHE_DIR, TTS_CACHE_MAX_MB, TTS_CACHE_HOT_ITEMS
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+TMP_GRACE_SECONDS = 600   # Un .tmp más nuevo puede ser una escritura en curso de otro proceso
+_ENTRY_FILE = re.compile(r"^([0-9a-f]{64})\.\w+$")   # {sha256 de make_key}.{ext}
+_LEGACY_FILE = re.compile(r"^[0-9a-f]{32}\.mp3$")     # caché anterior: md5 del texto
+
+
+def normalize_tts_text(text):
+    """Normalización común del texto antes de calcular la clave (todos los backends)."""
+    # 1. Quitar espacios al inicio y final
+    text = text.strip()
+    # 2. Convertir saltos de línea y tabs a espacio
+    text = re.sub(r"\s+", " ", text)
+    # 3. Pasar todo a minúsculas para unificar cache sin importar mayúsculas
+    return text.lower()
+
+
+class TTSCache:
+    """
+    Caché de audio sintetizado en disco con índice persistente.
+
+    - La clave incluye el texto normalizado y todos los parámetros que cambian el audio
+      (proveedor, voz, modelo, formato), así cambiar de voz no devuelve audio viejo.
+    - El índice (index.json) guarda tamaño, último acceso y cantidad de hits por clave,
+      de modo que una consulta no necesita tocar el disco para saber si existe.
+    - Respeta un presupuesto de bytes expulsando las entradas menos usadas recientemente (LRU).
+    - Mantiene en memoria los clips más reproducidos (tier caliente).
+    - Escribe de forma atómica (archivo temporal + os.replace): un corte a mitad de
+      escritura nunca deja un mp3 truncado visible en la caché.
+    - Se puede compartir entre procesos (el asistente y services/tts_prewarm.py, o varios
+      asistentes): el índice se lee y se escribe con un lock de archivo (index.lock) y al
+      guardarlo se combina con lo que dejaron los demás en vez de pisarlo.
+    """
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024,
+                 hot_items=TTS_CACHE_HOT_ITEMS, hot_min_hits=2, hot_max_bytes=16 * 1024 * 1024,
+                 flush_every=20):
+        """
+        max_bytes: tamaño máximo total de la caché en disco
+        hot_items: cantidad máxima de clips mantenidos en memoria
+        hot_min_hits: hits necesarios para que un clip suba al tier en memoria
+        hot_max_bytes: tamaño máximo del tier en memoria
+        flush_every: cada cuántos cambios se reescribe el índice en disco
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hot_items = hot_items
+        self.hot_min_hits = hot_min_hits
+        self.hot_max_bytes = hot_max_bytes
+        self.flush_every = flush_every
+
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # key -> {"file", "size", "last_access", "hits"}, orden LRU
+        self._hot = OrderedDict()      # key -> bytes
+        self._hot_bytes = 0
+        self._total_bytes = 0
+        self._dirty = 0
+        self._removed = {}             # key -> time.time() de lo quitado desde el último flush
+        self._flush_wanted = threading.Event()
+        self._flusher = None           # hilo que reescribe el índice fuera de self._lock
+        self.stats = {"hits": 0, "hot_hits": 0, "misses": 0, "evictions": 0}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+        atexit.register(self.flush_index)
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    @classmethod
+    def default(cls):
+        """Caché compartida por todos los backends del proceso (un solo índice por directorio)."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    @staticmethod
+    def make_key(text, **params):
+        """Clave estable a partir del texto y de los parámetros de síntesis."""
+        payload = json.dumps({"text": text, **params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """Devuelve los bytes del audio o None si no está en caché."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._touch(key, entry)
+            data = self._hot.get(key)
+            if data is not None:
+                self._hot.move_to_end(key)
+                self.stats["hot_hits"] += 1
+                return data
+            path = os.path.join(self.cache_dir, entry["file"])
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._remove_locked(key)
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            if len(data) != entry["size"]:
+                # Archivo alterado fuera de la caché: se descarta
+                self._remove_locked(key)
+                self.stats["misses"] += 1
+                return None
+            if entry["hits"] >= self.hot_min_hits:
+                self._promote(key, data)
+        return data
+
+    def put(self, key, audio, ext="mp3"):
+        """
+        Guarda audio (bytes o iterable de chunks) de forma atómica y devuelve los bytes escritos.
+        """
+        writer = self.writer(key, ext)
+        try:
+            if isinstance(audio, (bytes, bytearray)):
+                writer.write(audio)
+            else:
+                for chunk in audio:
+                    writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+        return writer.data
+
+    def writer(self, key, ext="mp3"):
+        """Escritor incremental (para streaming): solo aparece en la caché al hacer commit()."""
+        return CacheWriter(self, key, ext)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove_locked(key)
+
+    def size_bytes(self):
+        with self._lock:
+            return self._total_bytes
+
+    def flush_index(self):
+        """
+        Escribe el índice a disco (atómico), combinado con el que haya en disco: las entradas
+        que agregó otro proceso se adoptan y no se pierden.
+        Nunca se llama con self._lock tomado: el orden es siempre index.lock -> self._lock.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+        with self._index_lock():
+            disk = self._read_index()
+            with self._lock:
+                self._merge(disk)
+                self._evict()   # lo que expulse va en este mismo flush
+                snapshot = dict(self._entries)
+                self._removed.clear()
+                self._dirty = 0
+            _atomic_write(os.path.join(self.cache_dir, INDEX_FILE),
+                          json.dumps(snapshot, ensure_ascii=False).encode("utf-8"),
+                          self.cache_dir)
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _load_index(self):
+        with self._index_lock():
+            raw = self._read_index()
+            for key, entry in sorted(raw.items(), key=lambda kv: kv[1].get("last_access", 0)):
+                size = self._file_size(entry.get("file", ""))
+                if size is None or size != entry.get("size"):
+                    continue
+                self._entries[key] = entry
+                self._total_bytes += size
+            if len(self._entries) != len(raw):
+                self._dirty += 1
+            self._scan_files()
+        self._evict()
+
+    def _scan_files(self):
+        """
+        Archivos fuera del índice: los de una entrada que otro proceso todavía no registró se
+        adoptan; se borran solo los temporales abandonados y los de la caché anterior (md5).
+        """
+        known = {entry["file"] for entry in self._entries.values()}
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if name in known or name in (INDEX_FILE, LOCK_FILE):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            match = _ENTRY_FILE.match(name)
+            if match:
+                self._entries[match.group(1)] = {"file": name, "size": stat.st_size,
+                                                 "last_access": stat.st_mtime, "hits": 0}
+                self._entries.move_to_end(match.group(1), last=False)   # sin uso conocido: primero en el LRU
+                self._total_bytes += stat.st_size
+                self._dirty += 1
+            elif (name.endswith(".tmp") and now - stat.st_mtime > TMP_GRACE_SECONDS) or _LEGACY_FILE.match(name):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _merge(self, disk):
+        """Incorpora las entradas del índice en disco (de otros procesos) que este no conoce."""
+        for key, entry in disk.items():
+            mine = self._entries.get(key)
+            if mine is not None:
+                mine["hits"] = max(mine["hits"], entry.get("hits", 0))
+                continue
+            removed_at = self._removed.get(key)
+            if removed_at is not None and entry.get("last_access", 0) <= removed_at:
+                continue   # este proceso la expulsó o la descartó después de ese acceso
+            size = self._file_size(entry.get("file", ""))
+            if size is None or size != entry.get("size"):
+                continue
+            self._entries[key] = entry
+            self._total_bytes += size
+        # Mantener el orden LRU por último acceso después de sumar entradas ajenas
+        self._entries = OrderedDict(sorted(self._entries.items(), key=lambda kv: kv[1].get("last_access", 0)))
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _file_size(self, file_name):
+        if not file_name:
+            return None
+        try:
+            return os.path.getsize(os.path.join(self.cache_dir, file_name))
+        except OSError:
+            return None
+
+    @contextmanager
+    def _index_lock(self):
+        """Lock exclusivo entre procesos sobre index.lock mientras se lee o se reescribe el índice."""
+        with open(os.path.join(self.cache_dir, LOCK_FILE), "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _add(self, key, file_name, data):
+        with self._lock:
+            self._remove_locked(key, delete_file=False)
+            self._entries[key] = {"file": file_name, "size": len(data),
+                                  "last_access": time.time(), "hits": 0}
+            self._total_bytes += len(data)
+            self._mark_dirty()
+            self._evict()
+
+    def _touch(self, key, entry):
+        entry["last_access"] = time.time()
+        entry["hits"] += 1
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        self._mark_dirty()
+
+    def _promote(self, key, data):
+        if len(data) > self.hot_max_bytes:
+            return
+        self._hot[key] = data
+        self._hot_bytes += len(data)
+        while self._hot and (len(self._hot) > self.hot_items or self._hot_bytes > self.hot_max_bytes):
+            _, old = self._hot.popitem(last=False)
+            self._hot_bytes -= len(old)
+
+    def _evict(self):
+        while self._entries and self._total_bytes > self.max_bytes:
+            key = next(iter(self._entries))
+            self._remove_locked(key)
+            self.stats["evictions"] += 1
+
+    def _remove_locked(self, key, delete_file=True):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry["size"]
+        self._removed[key] = time.time()
+        data = self._hot.pop(key, None)
+        if data is not None:
+            self._hot_bytes -= len(data)
+        if delete_file:
+            try:
+                os.remove(os.path.join(self.cache_dir, entry["file"]))
+            except OSError:
+                pass
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        """Solo cuenta el cambio (con self._lock tomado): el índice lo escribe _flush_loop."""
+        self._dirty += 1
+        if self._dirty >= self.flush_every:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name="tts-cache-flush")
+                self._flusher.start()
+            self._flush_wanted.set()
+
+    def _flush_loop(self):
+        """Reescribe el índice en segundo plano, sin frenar get() ni put() con el lock de archivo y el fsync."""
+        while True:
+            self._flush_wanted.wait()
+            self._flush_wanted.clear()
+            try:
+                self.flush_index()
+            except Exception as e:
+                print(f"⚠️ No se pudo guardar el índice de la caché TTS: {e}")
+
+
+class CacheWriter:
+    """Escritura incremental a un temporal que se publica en la caché al hacer commit()."""
+
+    def __init__(self, cache, key, ext):
+        self.cache = cache
+        self.key = key
+        self.file_name = f"{key}.{ext}"
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.cache_dir, suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._chunks = []
+        self.data = b""
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._chunks.append(chunk)
+
+    def commit(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, os.path.join(self.cache.cache_dir, self.file_name))
+        self.data = b"".join(self._chunks)
+        self._chunks = []
+        self.cache._add(self.key, self.file_name, self.data)
+        return self.data
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+def _atomic_write(path, data, directory):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,86 @@
+# tts/tts_pipeline.py
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+class TTSPipeline:
+    """
+    Pipeline de síntesis y reproducción por oraciones.
+    Cada texto que entra con put() se sintetiza en segundo plano mientras la oración
+    anterior se está reproduciendo; la reproducción respeta el orden de llegada.
+    """
+
+    def __init__(self, tts, on_start=None, on_finish=None, workers=1):
+        """
+        tts: backend con prepare_audio(text) y play_audio(audio)
+        on_start: callback al comenzar a reproducir la primera oración
+        on_finish: callback cuando se reprodujo todo (o no había nada que reproducir)
+        workers: síntesis concurrentes; con más de uno, los trozos siguientes se sintetizan
+                 en paralelo mientras suena el primero (el orden de reproducción no cambia)
+        """
+        self.tts = tts
+        self.on_start = on_start
+        self.on_finish = on_finish
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts-synth")
+        self.pending = queue.Queue()
+        self.created_at = time.perf_counter()
+        self.first_audio_ms = None
+        self.cancelled = False
+        self._player = threading.Thread(target=self._play_loop, daemon=True)
+        self._player.start()
+
+    def put(self, text):
+        """Encola una oración: comienza a sintetizarla de inmediato."""
+        if self.cancelled or not text or not text.strip():
+            return
+        try:
+            future = self.executor.submit(self.tts.prepare_audio, text)
+        except RuntimeError:
+            return  # cancelado entre el chequeo y el submit
+        self.pending.put((text, future))
+
+    def close(self):
+        """Indica que no llegarán más oraciones."""
+        self.pending.put(None)
+
+    def cancel(self):
+        """Interrumpe: no se reproduce nada más y se descartan las síntesis aún no iniciadas."""
+        self.cancelled = True
+        self.pending.put(None)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def wait(self, timeout=None):
+        """Espera a que termine la reproducción de todo lo encolado."""
+        self._player.join(timeout)
+        self.executor.shutdown(wait=False)
+
+    def _play_loop(self):
+        started = False
+        try:
+            while True:
+                item = self.pending.get()
+                if item is None or self.cancelled:
+                    break
+                text, future = item
+                try:
+                    audio = future.result()
+                except CancelledError:
+                    break
+                except Exception as e:
+                    print(f"⚠️ Error sintetizando '{text[:30]}...': {e}")
+                    continue
+
+                if self.cancelled:
+                    break
+                if not started:
+                    started = True
+                    self.first_audio_ms = (time.perf_counter() - self.created_at) * 1000
+                    print(f"⏱️ Primera oración en {self.first_audio_ms:.0f} ms")
+                    if self.on_start:
+                        self.on_start()
+                self.tts.play_audio(audio)
+        finally:
+            if self.on_finish:
+                self.on_finish()
@@ -0,0 +1,87 @@
+# utils/audio_bridge.py
+import asyncio
+from collections import deque
+
+import numpy as np
+
+from config import BUS_AUDIO_CAPACITY
+
+
+class AudioBridge:
+    """
+    Cola acotada de audio PCM16 hacia un event loop de asyncio.
+    - push_threadsafe(): desde un hilo ajeno al loop (el callback de sounddevice). Solo copia
+      el bloque y lo agenda con call_soon_threadsafe: el callback nunca espera al loop.
+    - push(): desde el propio loop (p. ej. frames que llegan por WebSocket).
+    - get(): corrutina del consumidor (el reconocedor).
+    Si el consumidor se atrasa más que la capacidad se descarta lo más viejo (como el canal
+    de audio del MessageBus), así la memoria por sesión queda acotada.
+    """
+
+    def __init__(self, capacity=BUS_AUDIO_CAPACITY):
+        """capacity: bloques pendientes como máximo (50 bloques de 100 ms = 5 s)"""
+        self.capacity = capacity
+        self.loop = None
+        self.closed = False
+        self.stats = {"put": 0, "dropped": 0, "underruns": 0}
+        self._blocks = deque()
+        self._ready = asyncio.Event()
+
+    # -----------------------------
+    # Métodos públicos
+    # -----------------------------
+    def bind(self, loop=None):
+        """Fija el loop que consume el audio (por defecto, el que está corriendo)."""
+        self.loop = loop or asyncio.get_running_loop()
+
+    def push(self, samples):
+        """Encola un bloque (array int16 o bytes PCM16). Solo desde el hilo del loop."""
+        if self.closed:
+            return
+        self._blocks.append(samples if isinstance(samples, bytes) else _to_bytes(samples))
+        self.stats["put"] += 1
+        if len(self._blocks) > self.capacity:
+            self._blocks.popleft()
+            self.stats["dropped"] += 1
+        self._ready.set()
+
+    def push_threadsafe(self, samples):
+        """Igual que push(), desde cualquier hilo (el callback de audio)."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.push, _to_bytes(samples))
+        except RuntimeError:
+            pass  # el loop se cerró mientras llegaba el bloque
+
+    def close(self):
+        """Fin del audio: get() entrega lo que quede y después None."""
+        self.closed = True
+        self._ready.set()
+
+    def close_threadsafe(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.close)
+
+    def exhausted(self):
+        """Cerrado y sin nada pendiente (terminó la fuente o la sesión)."""
+        return self.closed and not self._blocks
+
+    async def get(self, timeout=None):
+        """Próximo bloque (bytes PCM16); None si no llegó en timeout segundos o si se agotó."""
+        while not self._blocks:
+            if self.closed:
+                return None
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.stats["underruns"] += 1
+                return None
+        return self._blocks.popleft()
+
+
+def _to_bytes(samples):
+    if isinstance(samples, (bytes, bytearray, memoryview)):
+        return bytes(samples)
+    return np.asarray(samples, dtype=np.int16).tobytes()
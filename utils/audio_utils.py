@@ -1,40 +1,87 @@
+from time import monotonic
+
 import numpy as np
-import sounddevice as sd
-from utils.shared_queue import SharedQueue  # usamos la cola global
+from config import AUDIO_CAPTURE_NATIVE, AUDIO_INPUT_DEVICE, AUDIO_RING_SECONDS
+from utils.message_bus import AudioFrame
+from utils.pcm_ring_buffer import PCMRingBuffer
+from utils.resampler import StreamingResampler
+
+
+def detect_silence(audio_chunk, threshold=500):
+    """Detecta si un bloque es silencio según RMS"""
+    rms = np.sqrt(np.mean(np.square(audio_chunk.astype(np.float32))))
+    return rms < threshold
+
 
 class AudioUtils:
-    def __init__(self, rate=16000, chunk=1024, channels=1):
+    def __init__(self, rate=16000, chunk=1024, channels=1, bus=None):
         """
         rate: Frecuencia de muestreo (16000 recomendado para STT)
         chunk: Tamaño del buffer de audio en frames
-        channels: Número de canales (1 = mono)
+        channels: Número de canales (1 = mono). En mono se captura en el formato nativo del
+                  dispositivo y se remuestrea/mezcla a rate mono (ver StreamingResampler)
         format: Formato de audio (paInt16 = PCM 16-bit)
+        bus: MessageBus opcional; si se indica, cada bloque se publica en bus.audio en vez del buffer circular
         """
         self.rate = rate
         self.chunk = chunk
         self.channels = channels
         self.stream = None
-        self.queue = SharedQueue.response_queue
+        self.bus = bus
+        self.resampler = None
+        # Buffer circular preasignado (AUDIO_RING_SECONDS): el callback convierte a PCM16 directo ahí
+        self.ring = PCMRingBuffer(capacity=rate * channels * AUDIO_RING_SECONDS, max_read=chunk * channels * 4)
+
+    @staticmethod
+    def native_input_format(device=AUDIO_INPUT_DEVICE):
+        """(frecuencia, canales) nativos del micrófono, para abrirlo sin remuestreo del driver."""
+        import sounddevice as sd
+        info = sd.query_devices(device, kind="input")
+        return int(info["default_samplerate"]), max(1, int(info["max_input_channels"]))
+
+    def _capture_format(self):
+        """(frecuencia, canales, blocksize) con los que abrir el micrófono; prepara el resampler."""
+        if self.channels != 1 or not AUDIO_CAPTURE_NATIVE:
+            self.resampler = None
+            return self.rate, self.channels, self.chunk
+        rate, channels = self.native_input_format()
+        self.resampler = StreamingResampler(rate, self.rate, channels)
+        return rate, channels, int(self.chunk * rate / self.rate)
 
     def _callback(self, indata, frames, time, status):
-        """Callback de sounddevice que guarda el audio en la cola"""
+        """Callback de sounddevice que guarda el audio en el buffer circular"""
         if status:
             print(f"⚠️ Status de audio: {status}")
-        # Convertir a PCM16 y encolar
-        audio_data = (indata * 32767).astype(np.int16).tobytes()
-        self.queue.put(audio_data)
+        if self.resampler is not None:
+            # Formato nativo -> rate mono (int16)
+            pcm = self.resampler.process(indata, scale=32767)
+            if self.bus is not None:
+                self.bus.audio.put(AudioFrame(pcm.tobytes(), self.rate, monotonic()))
+            else:
+                self.ring.write(pcm)
+            return
+        if self.bus is not None:
+            pcm = np.empty(indata.size, dtype=np.int16)
+            np.multiply(indata.reshape(-1), 32767, out=pcm, casting="unsafe")
+            self.bus.audio.put(AudioFrame(pcm.tobytes(), self.rate, monotonic()))
+            return
+        # Convertir a PCM16 en el lugar (sin arrays ni bytes intermedios)
+        self.ring.write(indata.reshape(-1), scale=32767)
 
     def start_recording(self):
         """Inicia grabación en segundo plano con callback"""
+        import sounddevice as sd
+        rate, channels, blocksize = self._capture_format()
         self.stream = sd.InputStream(
-            channels=self.channels,
-            samplerate=self.rate,
-            blocksize=self.chunk,
+            device=AUDIO_INPUT_DEVICE,
+            channels=channels,
+            samplerate=rate,
+            blocksize=blocksize,
             dtype="float32",
             callback=self._callback
         )
         self.stream.start()
-        print("🎙️ Grabación iniciada...")
+        print(f"🎙️ Grabación iniciada ({rate} Hz, {channels} canal(es))...")
 
     def stop_recording(self):
         """Detiene la grabación"""
@@ -45,22 +92,21 @@ class AudioUtils:
             print("🛑 Grabación detenida")
 
     def get_audio_chunk(self):
-        """Obtiene el siguiente bloque de audio desde la cola"""
-        try:
-            data = self.q.get(timeout=1)
-            return data.flatten()  # numpy array
-        except self.queue.Empty:
-            return None
+        """Obtiene el siguiente bloque de audio (array int16, vista sin copia) o None si no llegó a tiempo"""
+        return self.ring.read_samples(self.chunk * self.channels, timeout=1)
 
     def record_seconds(self, seconds=3):
         """Graba un audio corto y lo devuelve como array numpy"""
         print(f"🎤 Grabando {seconds} segundos...")
-        recording = sd.rec(int(seconds * self.rate), samplerate=self.rate,
-                           channels=self.channels, dtype="int16")
+        import sounddevice as sd
+        rate, channels, _ = self._capture_format()
+        recording = sd.rec(int(seconds * rate), samplerate=rate, channels=channels, dtype="int16",
+                           device=AUDIO_INPUT_DEVICE)
         sd.wait()
+        if self.resampler is not None:
+            return self.resampler.process(recording)
         return recording.flatten()
 
     def detect_silence(self, audio_chunk, threshold=500):
         """Detecta si un bloque es silencio según RMS"""
-        rms = np.sqrt(np.mean(np.square(audio_chunk.astype(np.float32))))
-        return rms < threshold
\ No newline at end of file
+        return detect_silence(audio_chunk, threshold)
\ No newline at end of file
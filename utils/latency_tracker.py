@@ -0,0 +1,34 @@
+# utils/latency_tracker.py
+import threading
+from collections import deque
+
+
+class LatencyTracker:
+    """Ventana deslizante de latencias (ms) con percentiles, segura entre hilos."""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, ms):
+        with self._lock:
+            self.samples.append(ms)
+            self.count += 1
+
+    def percentile(self, p):
+        """Percentil p (0-100) de la ventana actual, o None si no hay muestras."""
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self):
+        return {"count": self.count, "p50": self.percentile(50),
+                "p95": self.percentile(95), "p99": self.percentile(99)}
+
+    def __len__(self):
+        with self._lock:
+            return len(self.samples)
@@ -0,0 +1,163 @@
+# utils/message_bus.py
+import threading
+import time
+from collections import deque
+from typing import Any, NamedTuple, Optional
+
+from config import BUS_AUDIO_CAPACITY, BUS_TRANSCRIPTS_CAPACITY, BUS_REPLIES_CAPACITY, BUS_CONTROL_CAPACITY
+from utils.latency_tracker import LatencyTracker
+
+DROP_OLDEST = "drop_oldest"   # si está lleno se descarta lo más viejo (el productor nunca espera)
+BLOCK = "block"               # si está lleno el productor espera a que haya lugar
+
+
+# -----------------------------
+# Mensajes
+# -----------------------------
+class AudioFrame(NamedTuple):
+    pcm: bytes                 # PCM16 mono
+    rate: int
+    captured_at: float
+
+
+class Transcript(NamedTuple):
+    text: str
+    is_final: bool = True
+    source: str = "google"     # "google" (is_final del servidor) o "local" (endpointing)
+
+
+class Reply(NamedTuple):
+    text: str
+    es_larga: bool = False
+    frase_objetivo: Optional[str] = None
+
+
+class Control(NamedTuple):
+    command: str               # "stop", "barge_in", ...
+    payload: Any = None
+
+
+class ChannelClosed(Exception):
+    """Se intentó publicar en un canal cerrado."""
+
+
+class Channel:
+    """
+    Cola acotada y tipada con su propia política de desborde y métricas:
+    profundidad actual y máxima, descartes, tiempo bloqueado de los productores
+    y latencia de cada mensaje en la cola (de put a get).
+    """
+
+    def __init__(self, name, item_type, capacity, policy=BLOCK):
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"Política de desborde desconocida: {policy}")
+        self.name = name
+        self.item_type = item_type
+        self.capacity = capacity
+        self.policy = policy
+        self.closed = False
+        self.latency = LatencyTracker()
+        self.stats = {"put": 0, "get": 0, "dropped": 0, "max_depth": 0, "blocked_ms": 0.0}
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def put(self, item, timeout=None):
+        """
+        Publica un mensaje. Con BLOCK espera lugar (hasta timeout; devuelve False si vence).
+        Con DROP_OLDEST nunca espera. Lanza TypeError si el mensaje no es del tipo del canal.
+        """
+        if not isinstance(item, self.item_type):
+            raise TypeError(f"Canal '{self.name}' espera {self.item_type.__name__}, no {type(item).__name__}")
+        with self._lock:
+            if self.closed:
+                raise ChannelClosed(self.name)
+            if len(self._items) >= self.capacity:
+                if self.policy == DROP_OLDEST:
+                    self._items.popleft()
+                    self.stats["dropped"] += 1
+                else:
+                    start = time.perf_counter()
+                    ready = self._not_full.wait_for(lambda: len(self._items) < self.capacity or self.closed, timeout)
+                    self.stats["blocked_ms"] += (time.perf_counter() - start) * 1000
+                    if self.closed:
+                        raise ChannelClosed(self.name)
+                    if not ready:
+                        return False
+            self._items.append((time.perf_counter(), item))
+            self.stats["put"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], len(self._items))
+            self._not_empty.notify()
+        return True
+
+    def get(self, timeout=None):
+        """Espera el próximo mensaje. Devuelve None si vence el timeout o si el canal se cerró y está vacío."""
+        with self._lock:
+            if not self._not_empty.wait_for(lambda: self._items or self.closed, timeout):
+                return None
+            if not self._items:
+                return None
+            enqueued_at, item = self._items.popleft()
+            self.stats["get"] += 1
+            self._not_full.notify()
+        self.latency.add((time.perf_counter() - enqueued_at) * 1000)
+        return item
+
+    def drain(self):
+        """Descarta todo lo pendiente y devuelve cuántos mensajes había."""
+        with self._lock:
+            count = len(self._items)
+            self._items.clear()
+            self.stats["dropped"] += count
+            self._not_full.notify_all()
+        return count
+
+    def close(self):
+        """Despierta a productores y consumidores; get() devuelve None una vez vacío."""
+        with self._lock:
+            self.closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def depth(self):
+        with self._lock:
+            return len(self._items)
+
+    def summary(self):
+        return {"depth": self.depth(), **self.stats, "latency": self.latency.summary()}
+
+
+class MessageBus:
+    """
+    Bus de mensajes en el proceso, con un canal por tipo de mensaje:
+    - audio: frames de captura (DROP_OLDEST: el audio viejo no sirve si el consumidor se atrasa)
+    - transcripts: transcripts finales del alumno (BLOCK)
+    - replies: respuestas a reproducir (BLOCK: nunca se pierde una respuesta)
+    - control: órdenes entre hilos, p. ej. "stop" (BLOCK)
+    Cada asistente (o sesión) tiene su propio bus.
+    """
+
+    def __init__(self, audio_capacity=BUS_AUDIO_CAPACITY, transcripts_capacity=BUS_TRANSCRIPTS_CAPACITY,
+                 replies_capacity=BUS_REPLIES_CAPACITY, control_capacity=BUS_CONTROL_CAPACITY):
+        self.audio = Channel("audio", AudioFrame, audio_capacity, DROP_OLDEST)
+        self.transcripts = Channel("transcripts", Transcript, transcripts_capacity, BLOCK)
+        self.replies = Channel("replies", Reply, replies_capacity, BLOCK)
+        self.control = Channel("control", Control, control_capacity, BLOCK)
+        self.channels = (self.audio, self.transcripts, self.replies, self.control)
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+
+    def report(self):
+        """Profundidad y latencia por canal: muestra en qué etapa se está trabando un turno."""
+        print("📊 Bus de mensajes:")
+        for channel in self.channels:
+            s = channel.summary()
+            latency = s["latency"]
+            latency_text = (f"espera p50 {latency['p50']:.0f} ms | p95 {latency['p95']:.0f} ms"
+                            if latency["count"] else "sin mensajes")
+            print(f"   {channel.name:11s} profundidad {s['depth']}/{channel.capacity} (máx. {s['max_depth']}) | "
+                  f"{s['put']} publicados, {s['dropped']} descartados, {s['blocked_ms']:.0f} ms bloqueado | "
+                  f"{latency_text}")
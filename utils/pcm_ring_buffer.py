@@ -0,0 +1,169 @@
+# utils/pcm_ring_buffer.py
+import threading
+
+import numpy as np
+
+
+class PCMRingBuffer:
+    """
+    Buffer circular de PCM int16 preasignado, para un escritor (el callback de audio)
+    y un lector (el generador de STT).
+
+    - write() copia las muestras en su lugar (sin crear objetos bytes por callback) y
+      convierte float -> int16 sin arrays intermedios.
+    - read() devuelve un memoryview sobre el propio buffer (sin copias). Para que una lectura
+      que cruza el final del buffer también sea contigua, las primeras max_read muestras se
+      duplican en una zona espejo al final del array.
+    - Capacidad fija: si el lector se atrasa más que la capacidad se descarta lo más viejo
+      (overrun) en lugar de crecer sin límite; si pide datos que no llegan a tiempo es underrun.
+      Un escritor que no es de tiempo real (un archivo) puede pedir block=True y esperar lugar.
+
+    Las vistas devueltas por read() son válidas hasta que se escriban `capacity` muestras más;
+    quien necesite guardarlas más tiempo debe copiarlas.
+    """
+
+    def __init__(self, capacity, max_read=None):
+        """
+        capacity: muestras que entran en el buffer (p. ej. 10 s a 16 kHz = 160000)
+        max_read: lectura contigua máxima (por defecto, una décima de la capacidad)
+        """
+        self.capacity = capacity
+        self.max_read = min(capacity, max_read or capacity // 10)
+        self._buffer = np.zeros(capacity + self.max_read, dtype=np.int16)
+        self._bytes = memoryview(self._buffer).cast("B")
+        self.written = 0     # total de muestras escritas (posición absoluta del escritor)
+        self.read_pos = 0    # total de muestras leídas (posición absoluta del lector)
+        self.overruns = 0
+        self.dropped = 0     # muestras perdidas por overrun
+        self.underruns = 0
+        self.closed = False
+        self._lock = threading.Lock()
+        self._data_ready = threading.Condition(self._lock)
+        self._space_ready = threading.Condition(self._lock)
+
+    # -----------------------------
+    # Escritura (callback de audio)
+    # -----------------------------
+    def write(self, samples, scale=None, block=False, timeout=None):
+        """
+        Copia muestras al buffer. samples: array int16, o float con scale (p. ej. 32767
+        para el float32 de sounddevice). Devuelve la cantidad escrita.
+        block: esperar a que el lector libere lugar en vez de pisar lo más viejo (nunca desde
+        un callback de audio); devuelve 0 si se cierra el buffer o vence el timeout.
+        """
+        samples = np.asarray(samples).reshape(-1)
+        n = samples.size
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        if block:
+            # Se deja libre además la última lectura (max_read): su memoryview puede seguir en uso
+            n = min(n, self.capacity - self.max_read)
+            samples = samples[-n:]
+            with self._lock:
+                if not self._space_ready.wait_for(
+                        lambda: self.capacity - self.max_read - (self.written - self.read_pos) >= n or self.closed,
+                        timeout):
+                    return 0
+                if self.closed:
+                    return 0
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._copy(samples[:first], start, scale)
+        if first < n:
+            self._copy(samples[first:], 0, scale)
+
+        with self._data_ready:
+            self.written += n
+            behind = self.written - self.read_pos
+            if behind > self.capacity:
+                # El lector se atrasó más que la capacidad: se pierde lo más viejo
+                self.overruns += 1
+                self.dropped += behind - self.capacity
+                self.read_pos = self.written - self.capacity
+            self._data_ready.notify()
+        return n
+
+    def close(self):
+        """Despierta a lectores y escritores bloqueados; read() entrega lo que quede y después None."""
+        with self._lock:
+            self.closed = True
+            self._data_ready.notify_all()
+            self._space_ready.notify_all()
+
+    def reopen(self):
+        """Vuelve a aceptar lecturas bloqueantes después de close() (descarta lo pendiente)."""
+        with self._data_ready:
+            self.closed = False
+            self.read_pos = self.written
+
+    # -----------------------------
+    # Lectura
+    # -----------------------------
+    def available(self):
+        return self.written - self.read_pos
+
+    def exhausted(self):
+        """Cerrado y sin nada pendiente de leer (p. ej. terminó un archivo)."""
+        return self.closed and self.available() == 0
+
+    def read(self, n, timeout=None):
+        """
+        Espera hasta n muestras y devuelve un memoryview (bytes PCM16) sin copiar.
+        Si no llegan en timeout segundos cuenta un underrun y devuelve None.
+        Cerrado el buffer, entrega lo que quede aunque sea menos de n.
+        """
+        n = min(n, self.max_read)
+        with self._data_ready:
+            if not self._data_ready.wait_for(lambda: self.written - self.read_pos >= n or self.closed, timeout):
+                self.underruns += 1
+                return None
+            n = min(n, self.written - self.read_pos)
+            if n == 0:
+                return None  # cerrado y vacío
+            start = self.read_pos % self.capacity
+            self.read_pos += n
+            self._space_ready.notify()
+        return self._bytes[start * 2:(start + n) * 2]
+
+    def read_samples(self, n, timeout=None):
+        """Igual que read(), pero como array int16 (también sin copia)."""
+        view = self.read(n, timeout)
+        return None if view is None else np.frombuffer(view, dtype=np.int16)
+
+    def recent(self, n):
+        """
+        Copia (bytes PCM16) de las últimas n muestras ya leídas, p. ej. para reenviarlas a un
+        stream nuevo. Devuelve menos si el escritor ya las pisó o si aún no se leyeron tantas.
+        """
+        with self._data_ready:
+            n = max(0, min(n, self.read_pos, self.capacity - (self.written - self.read_pos)))
+            start = (self.read_pos - n) % self.capacity
+        first = min(n, self.capacity - start)
+        data = self._bytes[start * 2:(start + first) * 2].tobytes()
+        if first < n:
+            data += self._bytes[:(n - first) * 2].tobytes()
+        return data
+
+    def stats(self):
+        return {"capacity": self.capacity, "available": self.available(), "overruns": self.overruns,
+                "dropped": self.dropped, "underruns": self.underruns}
+
+    # -----------------------------
+    # Métodos internos
+    # -----------------------------
+    def _copy(self, samples, start, scale):
+        end = start + samples.size
+        self._store(samples, self._buffer[start:end], scale)
+        # Zona espejo: lo escrito al inicio se repite al final para lecturas contiguas
+        if start < self.max_read:
+            mirror_end = min(end, self.max_read)
+            self._store(samples[:mirror_end - start],
+                        self._buffer[self.capacity + start:self.capacity + mirror_end], scale)
+
+    @staticmethod
+    def _store(samples, out, scale):
+        if scale is None:
+            np.copyto(out, samples, casting="unsafe")
+        else:
+            np.multiply(samples, scale, out=out, casting="unsafe")
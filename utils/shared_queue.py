@@ -1,5 +0,0 @@
-# utils/shared_queue.py
-import queue
-
-class SharedQueue:
-    response_queue = queue.Queue()
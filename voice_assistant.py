@@ -1,34 +1,63 @@
-import queue
 import threading
-import time
 
 from stt.speech_recognition import SpeechRecognizer
 from tts.eleven_tts import ElevenLabsTTS
+from tts.google_tts import GoogleTTS
+from tts.hedged_tts import HedgedTTS
 from npl.dialog_manager import DialogManager
+from npl.speculative_dialog import SpeculativeDialog
 from npl.listening_test import ListeningTest
 from services.initial_test.initial_test_flow import InitialTestFlow
 from npl.gpt_client import GPTClient
-from utils.shared_queue import SharedQueue
+from utils.message_bus import MessageBus, Reply, Control
+from tts.tts_pipeline import TTSPipeline
+from tts.playback_engine import PlaybackEngine
+from npl.sentence_splitter import split_long_text
+from config import ELEVEN_TTS_STREAMING, DIALOG_STREAMING, TTS_HEDGING, GOOGLE_TTS_LANGUAGE, GOOGLE_TTS_VOICE
+from config import TTS_CHUNK_MAX_CHARS, TTS_CHUNK_WORKERS, SPECULATIVE_DIALOG, STT_ENCODING
 
 
 class VoiceAssistant:
-    def __init__(self, language_code="en-US", keywords_expansion=False, firestore=None):
+    def __init__(self, language_code="en-US", keywords_expansion=False, firestore=None, streaming_replies=DIALOG_STREAMING,
+                 speculative=SPECULATIVE_DIALOG, stt_encoding=STT_ENCODING):
+        """
+        streaming_replies: si es True, cada oración de la respuesta se sintetiza y reproduce
+        mientras el modelo sigue generando las siguientes.
+        speculative: si es True, la respuesta empieza a generarse con el transcript intermedio
+        estable (ver SpeculativeDialog); no aplica junto con streaming_replies.
+        stt_encoding: LINEAR16, FLAC u OGG_OPUS; con Wi-Fi congestionado conviene comprimir el audio subido.
+        """
         self.language_code = language_code
         self.keywords_expansion = keywords_expansion
+        self.streaming_replies = streaming_replies
 
         # Inicializa componentes
-        self.stt = SpeechRecognizer(language_code=language_code, rate=16000, chunk_duration_ms=100)
-        self.tts = ElevenLabsTTS()
+        self.stt = SpeechRecognizer(language_code=language_code, rate=16000, chunk_duration_ms=100,
+                                    encoding=stt_encoding)
+        self.tts = ElevenLabsTTS(streaming=ELEVEN_TTS_STREAMING)
+        if TTS_HEDGING:
+            # Google como respaldo cuando ElevenLabs tarda en entregar el primer audio
+            self.tts = HedgedTTS(self.tts, GoogleTTS(language_code=GOOGLE_TTS_LANGUAGE, voice_name=GOOGLE_TTS_VOICE))
         self.dialog_manager = DialogManager()
+        self.speculative = SpeculativeDialog(self.dialog_manager, tts=self.tts) if speculative and not streaming_replies else None
 
         self.listening_test = ListeningTest(tts=self.tts, stt=self.stt, firestore=firestore)
         self.initial_test = InitialTestFlow(firestore, self.tts, self.stt, GPTClient())
 
-        # Control de ejecución
-        self.response_queue = SharedQueue.response_queue
+        # Control de ejecución: transcripts y respuestas viajan por el bus del asistente
+        self.bus = MessageBus()
         self.speaking = False
+        # Una sola respuesta suena a la vez: la toman el hilo de respuestas (_speak, _speak_chunked)
+        # y el de transcripts (_respond_streaming); se libera al terminar de reproducir
+        self._speech_lock = threading.Lock()
         self.running = False
-        self.stt.callback = self.on_user_speech
+        self.player = PlaybackEngine.instance()
+        self.active_pipeline = None
+        self.stt.bus = self.bus
+        if self.speculative:
+            self.stt.interim_callback = self.speculative.on_interim
+        if self.stt.barge_in:
+            self.stt.barge_in_callback = self.on_barge_in
 
         # Hilos
         self.capture_thread = None
@@ -42,25 +71,40 @@ class VoiceAssistant:
 
         # Hilo para procesar respuestas y hablar
         threading.Thread(target=self._process_responses).start()
+        # Hilo de diálogo: consume los transcripts finales (el reconocimiento no espera al LLM)
+        threading.Thread(target=self._process_transcripts, daemon=True).start()
         # Hilos para STT
         self.capture_thread = threading.Thread(target=self.stt._capture_audio)
         self.recognition_thread = threading.Thread(target=self.stt._streaming_recognition)
         self.capture_thread.start()
         self.recognition_thread.start()
         try:
-            while self.running:
-                time.sleep(0.1)
+            # Espera órdenes (sin polling); stop() cierra el bus y también despierta esta espera
+            while True:
+                message = self.bus.control.get()
+                if message is None or message.command == "stop":
+                    break
         except KeyboardInterrupt:
-            self.stop()
+            pass
+        self.stop()
 
     def stop(self):
         """Detiene el asistente"""
+        if not self.running:
+            return
         self.running = False
         self.stt.stop()
+        if self.speculative:
+            self.speculative.report()
+        self.dialog_manager.context.report()
+        if self.stt.barge_in:
+            self.player.report_interruptions()
         if self.capture_thread:
             self.capture_thread.join()
         if self.recognition_thread:
             self.recognition_thread.join()
+        self.bus.report()
+        self.bus.close()
         print("🛑 Asistente detenido.")
 
     def on_user_speech(self, text):
@@ -73,50 +117,155 @@ class VoiceAssistant:
             return
 
         print(f"👤 Usuario: {text}")
+        # Nuevo turno del alumno: si interrumpió al asistente, la respuesta nueva ya puede sonar
+        self.player.resume()
 
         if text in ["salir", "exit", "quit"]:
-            self.stop()
+            if self.speculative:
+                self.speculative.cancel()
+            self.bus.control.put(Control("stop"))
             return
         
         if text in ("start listening test" , "empezar test inicial", "prueba inicial"):
+            if self.speculative:
+                self.speculative.cancel()
             print("Iniciando prueba de listening...")
-            self.response_queue.put(self.initial_test.show_welcome())
+            self.bus.replies.put(Reply(self.initial_test.show_welcome(), es_larga=True))
+            return
+
+        if self.streaming_replies:
+            self._respond_streaming(text)
             return
 
-        # Obtiene respuesta del diálogo
-        reply, frase_objetivo, es_larga = self.dialog_manager.generate_response(text)
+        # Obtiene respuesta del diálogo (reutilizando la especulativa si coincide con el final)
+        if self.speculative:
+            reply, frase_objetivo, es_larga = self.speculative.respond(text)
+        else:
+            reply, frase_objetivo, es_larga = self.dialog_manager.generate_response(text)
 
         # Guardamos frase objetivo si existe
         self.pending_target = frase_objetivo if frase_objetivo else None
-        self.response_queue.put(reply)
+        self.bus.replies.put(Reply(reply, es_larga, frase_objetivo))
+
+    def on_barge_in(self):
+        """
+        Callback del STT cuando el alumno habla encima del asistente: corta el audio,
+        descarta las respuestas encoladas y reanuda el reconocimiento de inmediato.
+        El motor descarta audio hasta el próximo turno o la próxima respuesta (player.resume()),
+        así que un falso barge-in (tos, ruido) sin transcript final no deja mudo al asistente.
+        """
+        self.stt.pause_processing = False
+        dropped = self.bus.replies.drain()
+        if self.active_pipeline:
+            self.active_pipeline.cancel()
+        measured = self.player.silence_latency.count
+        self.player.interrupt()
+        print(f"✋ Asistente interrumpido ({dropped} respuestas descartadas)")
+        threading.Thread(target=self._report_barge_in, args=(measured,), daemon=True).start()
+
+    def _report_barge_in(self, measured):
+        # La latencia la mide el motor de reproducción en el primer bloque en silencio
+        if self.player.silenced.wait(timeout=1.0) and self.player.silence_latency.count > measured:
+            print(f"🔇 Silencio {self.player.silence_latency.samples[-1]:.0f} ms después de la interrupción")
+
+    def _respond_streaming(self, text):
+        """
+        Genera la respuesta en streaming y la envía oración por oración al pipeline de TTS:
+        la oración 1 suena mientras las siguientes se generan y sintetizan.
+        Si todavía suena otra respuesta (p. ej. la bienvenida), el turno espera a que termine.
+        """
+        self._begin_speaking(text)
+        pipeline = TTSPipeline(self.tts, on_start=self._on_playback_start, on_finish=self._on_playback_finish,
+                               workers=TTS_CHUNK_WORKERS)
+        self.active_pipeline = pipeline
+        try:
+            reply, frase_objetivo, es_larga = self.dialog_manager.generate_response_stream(
+                text, on_sentence=pipeline.put
+            )
+            self.pending_target = frase_objetivo if frase_objetivo else None
+        finally:
+            pipeline.close()
+
+    def _on_playback_start(self):
+        # Pausar STT mientras suena la respuesta
+        self.stt.pause_processing = True
+
+    def _on_playback_finish(self):
+        # Reanudar STT
+        self.stt.pause_processing = False
+        self.active_pipeline = None
+        self._end_speaking()
+
+    def _begin_speaking(self, text):
+        """Espera a que termine la respuesta en curso (si la hay) y toma el turno de hablar."""
+        if not self._speech_lock.acquire(blocking=False):
+            print(f"⏳ Esperando a que termine la respuesta en curso para responder: {text[:30]}")
+            self._speech_lock.acquire()
+        self.speaking = True
+        # Una respuesta nueva siempre puede sonar, aunque el último barge-in no haya terminado en un turno
+        self.player.resume()
+
+    def _end_speaking(self):
+        self.speaking = False
+        self._speech_lock.release()
 
     def _process_responses(self):
         """
         Hilo que reproduce las respuestas del asistente una a una.
         """
-        while self.running:
-            try:
-                response = self.response_queue.get(timeout=0.1)
-            except queue.Empty:
+        while True:
+            reply = self.bus.replies.get()
+            if reply is None:
+                break  # bus cerrado
+            if not reply.text:
                 continue
+            if reply.es_larga:
+                self._speak_chunked(reply.text)
+            else:
+                self._speak(reply.text)
 
-            if response:
-                self._speak(response)
+    def _process_transcripts(self):
+        """
+        Hilo que procesa los transcripts finales del alumno, uno a uno.
+        """
+        while True:
+            transcript = self.bus.transcripts.get()
+            if transcript is None:
+                break  # bus cerrado
+            self.on_user_speech(transcript.text)
 
     def _speak(self, text):
         """
         Reproduce texto en voz.
-        Permite interrumpir si el usuario empieza a hablar.
+        Permite interrumpir si el usuario empieza a hablar (ver on_barge_in).
         """
-        if self.speaking:
-            return
-        self.speaking = True
-        # Pausar STT
-        self.stt.pause_processing = True
+        self._begin_speaking(text)
+        try:
+            # Pausar STT
+            self.stt.pause_processing = True
+            print(f"🤖 Asistente: {text}")
+            self.tts.speak(text)
+            # Esperar a que el motor termine de reproducir (evento, sin pausas fijas)
+            self.player.wait()
+        finally:
+            # Reanudar STT
+            self.stt.pause_processing = False
+            self._end_speaking()
+
+    def _speak_chunked(self, text):
+        """
+        Reproduce una respuesta larga partida en trozos (oraciones o cláusulas).
+        Los trozos se sintetizan en paralelo y suenan en orden; el primero empieza
+        apenas está listo. Cada trozo queda en caché por separado.
+        """
+        self._begin_speaking(text)
         print(f"🤖 Asistente: {text}")
-        self.tts.speak(text)
-        # Pequeño buffer para asegurar que el STT reciba audio después
-        time.sleep(0.1)
-        # Reanudar STT
-        self.stt.pause_processing = False
-        self.speaking = False
+        chunks = split_long_text(text, max_chars=TTS_CHUNK_MAX_CHARS)
+        print(f"✂️ Respuesta larga en {len(chunks)} trozos ({TTS_CHUNK_WORKERS} en paralelo)")
+        pipeline = TTSPipeline(self.tts, on_start=self._on_playback_start, on_finish=self._on_playback_finish,
+                               workers=TTS_CHUNK_WORKERS)
+        self.active_pipeline = pipeline
+        for chunk in chunks:
+            pipeline.put(chunk)
+        pipeline.close()
+        pipeline.wait()